@@ -0,0 +1,245 @@
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from datetime import datetime
+from typing import FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+# Async counterparts of the functions in `crud`, used by the `async def` endpoints.
+# Statement builders and pure helpers are shared with the sync module.
+from models import User, UserCreate, Match, MutualMatch, LikeInbox
+from hashing import password_hasher
+from candidate_index import candidate_index
+from zodiac import zodiac_table
+from compatibility import compatibility_matrix
+from serialization import USER_READ_COLUMNS, user_row
+from profile_cache import Profile, profile_cache
+from database import write_transaction
+from crud import (
+    SwipeResult,
+    like_inbox_rows,
+    like_inbox_upsert_statement,
+    mark_likes_read_statement,
+    mutual_match_insert_statement,
+    record_swipe_in_memory,
+    swipe_insert_statement,
+    swipe_result_from_row,
+    swipe_result_statement,
+)
+
+# --- User Functions ---
+
+async def get_user(db: AsyncSession, user_id: int) -> Optional[User]:
+    """Fetches a user by primary key."""
+    return await db.get(User, user_id)
+
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
+    """Fetches a user by their email address."""
+    statement = select(User).where(User.email == email)
+    return (await db.exec(statement)).first()
+
+async def get_user_ids(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[int]:
+    """Retrieves a page of user ids with OFFSET pagination (prefer `get_users_page`)."""
+    statement = select(User.id).order_by(User.id).offset(skip).limit(limit) # type: ignore
+    return list((await db.exec(statement)).all()) # type: ignore
+
+async def get_users_page(db: AsyncSession, after_id: Optional[int], limit: int) -> List[int]:
+    """Keyset page of user ids greater than `after_id`; the last id is the key of the next page."""
+    statement = select(User.id)
+    if after_id is not None:
+        statement = statement.where(User.id > after_id) # type: ignore
+    statement = statement.order_by(User.id).limit(limit) # type: ignore
+    return list((await db.exec(statement)).all()) # type: ignore
+
+async def get_users_by_ids(db: AsyncSession, user_ids: List[int]) -> List[User]:
+    """Fetches the given users in one query, preserving the order of `user_ids`."""
+    if not user_ids:
+        return []
+    users = (await db.exec(select(User).where(User.id.in_(user_ids)))).all() # type: ignore
+    users_by_id = {user.id: user for user in users}
+    return [users_by_id[user_id] for user_id in user_ids if user_id in users_by_id]
+
+async def get_profiles(db: AsyncSession, user_ids: Sequence[int]) -> List[Profile]:
+    """
+    Returns the `UserRead` profiles of the given users in the order of `user_ids`, skipping
+    unknown ids. Cached profiles are served from memory; the rest is loaded with a single
+    column query and written to the cache.
+    """
+    if not user_ids:
+        return []
+    found, missing = profile_cache.get_many(user_ids)
+    if missing:
+        if not zodiac_table.is_current:
+            await db.run_sync(zodiac_table.ensure_built)
+        rows = (await db.exec(select(*USER_READ_COLUMNS).where(User.id.in_(missing)))).all() # type: ignore
+        for profile in profile_cache.put_many(rows):
+            found[profile["id"]] = profile
+    return [found[user_id] for user_id in user_ids if user_id in found]
+
+async def get_profile(db: AsyncSession, user_id: int) -> Optional[Profile]:
+    profiles = await get_profiles(db, (user_id,))
+    return profiles[0] if profiles else None
+
+async def create_user(db: AsyncSession, user: UserCreate) -> User:
+    """Creates a new user; the zodiac sign comes from the precomputed lookup table."""
+    if not zodiac_table.is_current:
+        await db.run_sync(zodiac_table.ensure_built)
+
+    hashed_password = await password_hasher.hash(user.password)
+
+    db_user = User(
+        **user.model_dump(exclude={"password"}),
+        hashed_password=hashed_password,
+        zodiac_sign_id=zodiac_table.sign_id_for_date(user.birth_date)
+    )
+
+    async with write_transaction(db):
+        db.add(db_user)
+    if db_user.id is not None:
+        candidate_index.add_user(db_user.id, db_user.zodiac_sign_id)
+        profile_cache.put(user_row(db_user))
+    return db_user
+
+async def set_user_image(db: AsyncSession, user_id: int, image_filename: str) -> Optional[User]:
+    """Points the user's profile image at a stored file; returns None for unknown users."""
+    user = await db.get(User, user_id)
+    if user is None:
+        return None
+    async with write_transaction(db):
+        user.image_filename = image_filename
+        db.add(user)
+    profile_cache.put(user_row(user))
+    return user
+
+# --- Zodiac & Compatibility Functions ---
+
+async def get_compatible_sign_ids(db: AsyncSession, zodiac_sign_id: int) -> FrozenSet[int]:
+    """Returns the ids of all signs compatible with the given sign, from the compiled matrix."""
+    if not compatibility_matrix.is_current:
+        await db.run_sync(compatibility_matrix.ensure_built)
+    return compatibility_matrix.compatible_sign_ids(zodiac_sign_id)
+
+async def get_compatible_user(db: AsyncSession, current_user: User) -> Optional[User]:
+    """
+    Finds a random, compatible user who the current user has not yet swiped on.
+    """
+    candidate_ids = await get_compatible_user_ids(db, current_user, 1)
+    return await db.get(User, candidate_ids[0]) if candidate_ids else None
+
+async def get_compatible_user_ids(
+    db: AsyncSession, current_user: User, count: int, exclude: Iterable[int] = ()
+) -> List[int]:
+    """
+    Draws up to `count` distinct random ids of compatible users who the current user
+    has not yet swiped on. Ids in `exclude` are never returned.
+    """
+    if not current_user or not current_user.id or not current_user.zodiac_sign_id:
+        return []
+
+    compatible_sign_ids = await get_compatible_sign_ids(db, current_user.zodiac_sign_id)
+    if not compatible_sign_ids:
+        return []
+
+    if not candidate_index.loaded:
+        await db.run_sync(candidate_index.ensure_loaded)
+    await load_swipes(db, current_user.id)
+    return candidate_index.sample_candidates(current_user.id, compatible_sign_ids, count, exclude)
+
+async def load_swipes(db: AsyncSession, user_id: int) -> None:
+    """Makes sure the user's swiped ids are in the candidate index (one query on a miss)."""
+    if not candidate_index.swipes_loaded(user_id):
+        await db.run_sync(candidate_index.load_swipes, user_id)
+
+# --- Match (Like/Swipe) Functions ---
+
+async def swipe(db: AsyncSession, user_id_from: int, user_id_to: int, is_like: bool) -> Optional[SwipeResult]:
+    """
+    Records a swipe and detects a mutual like in a single transaction with two statements;
+    a mutual like adds one that stores the `MutualMatch`, a new like one that updates the
+    liked user's `LikeInbox` counters.
+    The first swipe on a user wins; repeating it returns the stored result.
+    Returns None if the target user does not exist.
+    """
+    async with write_transaction(db) as connection:
+        inserted = (await connection.execute(swipe_insert_statement(user_id_from, user_id_to, is_like))).rowcount == 1
+        result = swipe_result_from_row((await connection.execute(swipe_result_statement(user_id_from, user_id_to))).first())
+        if result is not None and result.is_mutual:
+            await connection.execute(mutual_match_insert_statement(user_id_from, user_id_to))
+        if inserted and result is not None and result.is_like:
+            await connection.execute(like_inbox_upsert_statement(), like_inbox_rows([(result.match_id, user_id_to)]))
+    if result is not None:
+        record_swipe_in_memory(user_id_from, user_id_to)
+    return result
+
+async def get_likers_page(
+    db: AsyncSession, current_user_id: int, after_match_id: Optional[int], limit: int
+) -> List[Tuple[int, int]]:
+    """
+    Keyset page of users who liked the current user, oldest like first.
+    Returns (match id, user id) pairs; pass the last match id as `after_match_id` for the next page.
+    """
+    statement = select(Match.id, Match.user_id_from).where(Match.user_id_to == current_user_id, Match.is_like == True)
+    if after_match_id is not None:
+        statement = statement.where(Match.id > after_match_id)
+    statement = statement.order_by(Match.id).limit(limit) # type: ignore
+    return [(match_id, user_id) for match_id, user_id in (await db.exec(statement)).all()]
+
+async def get_liked_users_page(
+    db: AsyncSession, current_user_id: int, after_match_id: Optional[int], limit: int
+) -> List[Tuple[int, int]]:
+    """
+    Keyset page of users the current user has liked, oldest like first.
+    Returns (match id, user id) pairs; pass the last match id as `after_match_id` for the next page.
+    """
+    statement = select(Match.id, Match.user_id_to).where(Match.user_id_from == current_user_id, Match.is_like == True)
+    if after_match_id is not None:
+        statement = statement.where(Match.id > after_match_id)
+    statement = statement.order_by(Match.id).limit(limit) # type: ignore
+    return [(match_id, user_id) for match_id, user_id in (await db.exec(statement)).all()]
+
+# --- Like Inbox Functions ---
+
+async def get_like_inbox(db: AsyncSession, user_id: int) -> Tuple[int, int, int]:
+    """Returns (total likes, unread likes, id of the newest like) with one primary key lookup."""
+    statement = select(LikeInbox.total_likes, LikeInbox.unread_likes, LikeInbox.last_like_id).where(LikeInbox.user_id == user_id)
+    row = (await db.exec(statement)).first()
+    return (row[0], row[1], row[2]) if row is not None else (0, 0, 0)
+
+async def get_likes_since(
+    db: AsyncSession, user_id: int, after_match_id: int, limit: int
+) -> List[Tuple[int, datetime, int]]:
+    """Likes received after `after_match_id`, oldest first, as (match id, created at, liker id)."""
+    statement = (
+        select(Match.id, Match.created_at, Match.user_id_from)
+        .where(Match.user_id_to == user_id, Match.is_like == True, Match.id > after_match_id)
+        .order_by(Match.id) # type: ignore
+        .limit(limit)
+    )
+    return [(match_id, created_at, liker_id) for match_id, created_at, liker_id in (await db.exec(statement)).all()]
+
+async def mark_likes_read(db: AsyncSession, user_id: int, up_to_match_id: int) -> Tuple[int, int]:
+    """Marks the likes up to `up_to_match_id` as read and returns (total likes, unread likes)."""
+    async with write_transaction(db) as connection:
+        await connection.execute(mark_likes_read_statement(user_id, up_to_match_id))
+    total, unread, _ = await get_like_inbox(db, user_id)
+    return total, unread
+
+async def get_mutual_matches(
+    db: AsyncSession, current_user_id: int, limit: int, before_id: Optional[int] = None
+) -> List[Tuple[MutualMatch, int]]:
+    """
+    Returns up to `limit` mutual matches of the user, newest first, each paired with the
+    id of the other user. Pass the id of the last returned match as `before_id` for the
+    next page. Both directions of the ordered pair are read through their own index.
+    """
+    pages = []
+    for own_column, other_column in (
+        (MutualMatch.user_id_low, MutualMatch.user_id_high),
+        (MutualMatch.user_id_high, MutualMatch.user_id_low),
+    ):
+        statement = select(MutualMatch, other_column).where(own_column == current_user_id)
+        if before_id is not None:
+            statement = statement.where(MutualMatch.id < before_id)
+        statement = statement.order_by(MutualMatch.id.desc()).limit(limit) # type: ignore
+        pages.extend((await db.exec(statement)).all())
+
+    pages.sort(key=lambda row: row[0].id, reverse=True)
+    return [(match, other_user_id) for match, other_user_id in pages[:limit]]
@@ -0,0 +1,22 @@
+"""
+Einmaliger Backfill-Job: legt für alle bereits vorhandenen gegenseitigen Likes in der
+Match-Tabelle die fehlenden MutualMatch-Einträge an. Kann gefahrlos mehrfach laufen.
+
+Aufruf aus dem `backend`-Verzeichnis:
+    python backfill_mutual_matches.py
+"""
+import time
+from sqlmodel import Session
+
+from database import engine, create_db_and_tables, apply_schema_migrations
+from crud import backfill_mutual_matches
+
+if __name__ == "__main__":
+    # Sicherstellen, dass Tabelle und Indizes existieren
+    create_db_and_tables()
+    apply_schema_migrations()
+
+    started = time.perf_counter()
+    with Session(engine) as session:
+        inserted = backfill_mutual_matches(session)
+    print(f"{inserted} gegenseitige Matches nachgetragen ({time.perf_counter() - started:.1f}s).")
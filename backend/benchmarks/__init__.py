@@ -0,0 +1,2 @@
+# Benchmarks for the AstroDate backend.
+# Run them from the `backend` directory, e.g. `python -m benchmarks.async_vs_threadpool`.
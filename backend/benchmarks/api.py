@@ -0,0 +1,301 @@
+"""
+End-to-end benchmark of the HTTP API. The FastAPI `app` is driven through an in-process
+ASGI client (httpx), so no server or network is involved.
+
+For every database size a dataset is generated once with `generate_dataset.py` and cached.
+Each run works on a fresh copy of that dataset and drives a mixed workload of virtual users
+at every concurrency level:
+- login
+- discover
+- swipe (on the last discovered candidate)
+- likes polling (the full `/users/likes` list, page by page)
+- inbox polling (`/users/likes/inbox` with the `since` cursor of the previous poll; not in the default mix)
+
+Per operation it reports p50/p95/p99 latency, requests per second and SQL queries per
+request, and it writes all results to a JSON file so runs can be diffed.
+
+Usage (from the `backend` directory):
+    python -m benchmarks.api --sizes 1000 100000 --concurrency 1 16 64 --requests 2000 --output bench.json
+    python -m benchmarks.api --db ./astrodate.db --password password123   # existing database, no generation
+
+Logins verify bcrypt hashes with the cost factor stored in the hash. Generated datasets use
+`ASTRODATE_BCRYPT_ROUNDS` from the environment of the generating process.
+"""
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from benchmarks.async_vs_threadpool import copy_database
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MIX = "login=5,discover=45,swipe=40,likes=10"
+# Number of virtual users (logged-in sessions) the workload rotates through
+DEFAULT_SESSIONS = 64
+# Page size of the likes polling request
+LIKES_PAGE_SIZE = 50
+
+
+def _parse_mix(mix: str) -> Dict[str, int]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ("login", "discover", "swipe", "likes", "inbox"):
+            raise SystemExit(f"Unknown operation in --mix: {name}")
+        weights[name.strip()] = int(weight)
+    return weights
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))]
+
+
+def _summarize(latencies: List[float], queries: List[int], errors: int, elapsed: float) -> Dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else 0.0,
+    }
+
+
+# --- Runner: executes inside a child process whose ASTRODATE_DB_FILE points at the dataset ---
+
+async def _run_workload(args: argparse.Namespace) -> Dict:
+    import httpx
+    from sqlalchemy import event
+    from sqlmodel import Session, select
+
+    from database import engine, async_engine
+    from main import app
+    from models import User
+
+    # Queries are attributed to the operation through a context variable; the ASGI app runs
+    # in the task that issued the request, so the engine events see the same context.
+    query_counter: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar("query_counter", default=None)
+
+    def count_query(*_args) -> None:
+        counter = query_counter.get()
+        if counter is not None:
+            counter[0] += 1
+
+    event.listen(engine, "before_cursor_execute", count_query)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_query)
+
+    with Session(engine) as session:
+        emails = list(session.exec(select(User.email).order_by(User.id).limit(args.sessions * 4)).all())  # type: ignore
+        all_user_ids = list(session.exec(select(User.id)).all())
+    if not emails:
+        raise SystemExit("The database has no users.")
+
+    weights = _parse_mix(args.mix)
+    operations, operation_weights = list(weights), list(weights.values())
+    results: Dict = {"users": len(all_user_ids), "levels": []}
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+            async def login(email: str) -> Optional[str]:
+                response = await client.post("/auth/login", data={"username": email, "password": args.password})
+                return response.json()["access_token"] if response.status_code == 200 else None
+
+            # Log in the virtual users up front; login latency is measured in the mix separately
+            tokens = [token for token in await asyncio.gather(*(login(email) for email in emails[:args.sessions])) if token]
+            if not tokens:
+                raise SystemExit(f"No user could log in with password {args.password!r}.")
+            last_candidate: Dict[int, int] = {}
+            inbox_cursors: Dict[int, str] = {}
+
+            for concurrency in args.concurrency:
+                rng = random.Random(args.seed)
+                plan = [
+                    (rng.choices(operations, operation_weights)[0], rng.randrange(len(tokens)), rng.choice(emails))
+                    for _ in range(args.requests)
+                ]
+                latencies: Dict[str, List[float]] = {name: [] for name in operations}
+                queries: Dict[str, List[int]] = {name: [] for name in operations}
+                errors: Dict[str, int] = {name: 0 for name in operations}
+                next_request = 0
+
+                async def execute(operation: str, session_number: int, email: str) -> bool:
+                    headers = {"Authorization": f"Bearer {tokens[session_number]}"}
+                    if operation == "login":
+                        return await login(email) is not None
+                    if operation == "discover":
+                        response = await client.get("/users/discover", headers=headers)
+                        if response.status_code == 200:
+                            last_candidate[session_number] = response.json()["id"]
+                        return response.status_code in (200, 404)
+                    if operation == "swipe":
+                        target = last_candidate.pop(session_number, None) or rng.choice(all_user_ids)
+                        response = await client.post(f"/users/swipe/{target}/{rng.random() < 0.5}".lower(), headers=headers)
+                        return response.status_code in (200, 400, 404)
+                    if operation == "inbox":
+                        params = {"since": inbox_cursors[session_number]} if session_number in inbox_cursors else {}
+                        response = await client.get("/users/likes/inbox", params=params, headers=headers)
+                        if response.status_code == 200:
+                            inbox_cursors[session_number] = response.json()["cursor"]
+                        return response.status_code == 200
+                    response = await client.get("/users/likes", params={"limit": LIKES_PAGE_SIZE}, headers=headers)
+                    return response.status_code == 200
+
+                async def worker() -> None:
+                    nonlocal next_request
+                    while next_request < len(plan):
+                        operation, session_number, email = plan[next_request]
+                        next_request += 1
+                        counter = [0]
+                        query_counter.set(counter)
+                        started = time.perf_counter()
+                        ok = await execute(operation, session_number, email)
+                        latencies[operation].append(time.perf_counter() - started)
+                        queries[operation].append(counter[0])
+                        if not ok:
+                            errors[operation] += 1
+
+                started = time.perf_counter()
+                await asyncio.gather(*(worker() for _ in range(concurrency)))
+                elapsed = time.perf_counter() - started
+
+                level = {
+                    "concurrency": concurrency,
+                    "total": _summarize(
+                        [latency for values in latencies.values() for latency in values],
+                        [count for values in queries.values() for count in values],
+                        sum(errors.values()), elapsed,
+                    ),
+                    "operations": {name: _summarize(latencies[name], queries[name], errors[name], elapsed) for name in operations},
+                }
+                results["levels"].append(level)
+                print(f"  concurrency {concurrency}: {level['total']['rps']} req/s", file=sys.stderr)
+
+    return results
+
+
+# --- Orchestrator ---
+
+def _dataset(size: int, args: argparse.Namespace) -> str:
+    """Returns the cached dataset for `size` users, generating it on first use."""
+    os.makedirs(args.cache_dir, exist_ok=True)
+    path = os.path.join(args.cache_dir, f"astrodate-{size}-{args.swipes}-{args.seed}.db")
+    if not os.path.exists(path):
+        print(f"Generating dataset with {size} users...", file=sys.stderr)
+        partial = f"{path}.partial"
+        for leftover in (partial, f"{partial}-wal", f"{partial}-shm"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        env = {**os.environ, "ASTRODATE_DB_FILE": partial}
+        subprocess.run(
+            [sys.executable, "generate_dataset.py", "--users", str(size), "--swipes", str(args.swipes),
+             "--seed", str(args.seed), "--password", args.password],
+            cwd=BACKEND_DIR, env=env, check=True,
+        )
+        # Fold the WAL into the main file before it is copied around
+        subprocess.run([sys.executable, "-c", "import sqlite3, sys; sqlite3.connect(sys.argv[1]).execute('VACUUM')", partial], check=True)
+        os.replace(partial, path)
+    return path
+
+
+def _run_in_child(database: str, args: argparse.Namespace) -> Dict:
+    """Runs the workload in a fresh interpreter; the engines bind the database path at import time."""
+    scratch_dir = tempfile.mkdtemp(prefix="astrodate-bench-")
+    try:
+        scratch = os.path.join(scratch_dir, "astrodate.db")
+        # Backup API instead of a file copy: a live `--db` database may still have pages in its -wal file
+        copy_database(database, scratch)
+        env = {**os.environ, "ASTRODATE_DB_FILE": scratch}
+        command = [
+            sys.executable, "-m", "benchmarks.api", "--run-one",
+            "--requests", str(args.requests), "--mix", args.mix, "--sessions", str(args.sessions),
+            "--password", args.password, "--seed", str(args.seed), "--concurrency", *map(str, args.concurrency),
+        ]
+        completed = subprocess.run(command, cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.PIPE, text=True)
+        return json.loads(completed.stdout)
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, check=True,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_table(runs: List[Dict]) -> None:
+    print(f"{'users':>9}{'conc':>6}  {'operation':<10}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'errors':>8}")
+    for run in runs:
+        for level in run["levels"]:
+            for name, summary in [*level["operations"].items(), ("total", level["total"])]:
+                print(f"{run['users']:>9}{level['concurrency']:>6}  {name:<10}{summary['rps']:>9}{summary['p50_ms']:>9}"
+                      f"{summary['p95_ms']:>9}{summary['p99_ms']:>9}{summary['queries_per_request']:>9}{summary['errors']:>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000], help="Dataset sizes (users)")
+    parser.add_argument("--db", help="Benchmark this database instead of generated datasets (it is copied first)")
+    parser.add_argument("--swipes", type=int, default=20, help="Mean swipes per user in generated datasets")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Operation weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--sessions", type=int, default=DEFAULT_SESSIONS, help="Number of logged-in virtual users")
+    parser.add_argument("--password", default="password123", help="Password of the benchmark users")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for datasets and request plans")
+    parser.add_argument("--cache-dir", default=os.path.join(tempfile.gettempdir(), "astrodate-bench-datasets"))
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--run-one", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    _parse_mix(args.mix)
+
+    if args.run_one:
+        sys.path.insert(0, BACKEND_DIR)
+        # stdout carries the JSON result; the application's own prints go to stderr
+        with contextlib.redirect_stdout(sys.stderr):
+            results = asyncio.run(_run_workload(args))
+        json.dump(results, sys.stdout)
+        return
+
+    runs = []
+    for database in ([os.path.abspath(args.db)] if args.db else [_dataset(size, args) for size in args.sizes]):
+        print(f"Benchmarking {database}...", file=sys.stderr)
+        runs.append({"database": database, **_run_in_child(database, args)})
+
+    _print_table(runs)
+    if args.output:
+        report = {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "settings": {key: value for key, value in vars(args).items() if key not in ("run_one", "output")},
+            "runs": runs,
+        }
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
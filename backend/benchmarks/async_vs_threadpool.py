@@ -0,0 +1,124 @@
+"""
+Compares request throughput of the async request path (AsyncSession on aiosqlite)
+with the previous threadpool model (sync Session inside `run_in_threadpool`).
+
+Each simulated request does what `/users/discover` does: resolve the caller by email,
+pick a compatible candidate and resolve the candidate's sign name.
+
+Usage (from the `backend` directory):
+    python -m benchmarks.async_vs_threadpool --requests 2000 --concurrency 1 16 64 256
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, List, Optional
+
+
+def copy_database(source: str, target: str, journal_mode: Optional[str] = None) -> None:
+    """
+    Copies a SQLite database with the backup API, so pages still in the source's `-wal` file
+    are included; a plain file copy would miss them. The journal mode is stored in the file,
+    so pass `journal_mode` to reset it on the copy (e.g. "DELETE" for a rollback journal).
+    """
+    source_connection = sqlite3.connect(source)
+    target_connection = sqlite3.connect(target)
+    try:
+        source_connection.backup(target_connection)
+        if journal_mode is not None:
+            target_connection.execute(f"PRAGMA journal_mode={journal_mode}")
+    finally:
+        target_connection.close()
+        source_connection.close()
+
+
+def _prepare_database(source: str) -> str:
+    """Copies the database to a scratch directory so the benchmark never touches the original."""
+    target_dir = tempfile.mkdtemp(prefix="astrodate-bench-")
+    target = os.path.join(target_dir, "astrodate.db")
+    copy_database(source, target)
+    return target
+
+
+async def _drive(handler: Callable[[int], Awaitable[None]], total_requests: int, concurrency: int) -> List[float]:
+    """Runs `total_requests` calls of `handler` with at most `concurrency` in flight."""
+    latencies: List[float] = []
+    next_request = 0
+
+    async def worker() -> None:
+        nonlocal next_request
+        while next_request < total_requests:
+            request_number = next_request
+            next_request += 1
+            started = time.perf_counter()
+            await handler(request_number)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="./astrodate.db", help="Source database (copied before the run)")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per mode and concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64, 256])
+    args = parser.parse_args()
+
+    # The engines read the database path at import time
+    os.environ["ASTRODATE_DB_FILE"] = _prepare_database(args.db)
+    from sqlmodel import Session, select
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    from starlette.concurrency import run_in_threadpool
+
+    import async_crud
+    import crud
+    from candidate_index import candidate_index
+    from database import async_engine, engine
+    from models import User, ZodiacSign
+
+    with Session(engine) as session:
+        emails = list(session.exec(select(User.email)).all())
+        candidate_index.ensure_loaded(session)
+    if not emails:
+        sys.exit("The database has no users; run seed.py first.")
+
+    def sync_request(request_number: int) -> None:
+        with Session(engine) as db:
+            user = crud.get_user_by_email(db, emails[request_number % len(emails)])
+            candidate = crud.get_compatible_user(db, user) if user else None
+            if candidate is not None and candidate.zodiac_sign_id:
+                db.get(ZodiacSign, candidate.zodiac_sign_id)
+
+    async def threadpool_request(request_number: int) -> None:
+        await run_in_threadpool(sync_request, request_number)
+
+    async def async_request(request_number: int) -> None:
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            user = await async_crud.get_user_by_email(db, emails[request_number % len(emails)])
+            candidate = await async_crud.get_compatible_user(db, user) if user else None
+            if candidate is not None and candidate.zodiac_sign_id:
+                await db.get(ZodiacSign, candidate.zodiac_sign_id)
+
+    modes = {"threadpool": threadpool_request, "async": async_request}
+    print(f"{'mode':<12}{'concurrency':>12}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for concurrency in args.concurrency:
+        for name, handler in modes.items():
+            await _drive(handler, min(50, args.requests), concurrency)  # warm-up
+            started = time.perf_counter()
+            latencies = await _drive(handler, args.requests, concurrency)
+            elapsed = time.perf_counter() - started
+            latencies.sort()
+            p50 = statistics.median(latencies) * 1000
+            p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+            print(f"{name:<12}{concurrency:>12}{args.requests / elapsed:>10.0f}{p50:>10.2f}{p99:>10.2f}")
+
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
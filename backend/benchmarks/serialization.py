@@ -0,0 +1,107 @@
+"""
+Microbenchmark for the user list response path.
+
+Compares, per page of users, the previous pipeline (ORM `User` objects, a sign-name
+query, `UserRead(**user.model_dump())`, then FastAPI's `response_model` validation and
+`JSONResponse` rendering) with the lean path the list endpoints now use (a column
+select, plain dicts and orjson). Fetching and encoding are timed separately.
+
+Usage (from the `backend` directory):
+    python -m benchmarks.serialization --page-sizes 10 100 500 --rounds 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+
+def _time_rounds(function: Callable[[int], Any], rounds: int) -> List[float]:
+    timings = []
+    for round_number in range(rounds):
+        started = time.perf_counter()
+        function(round_number)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def _time_rounds_async(function: Callable[[int], Any], rounds: int) -> List[float]:
+    timings = []
+    for round_number in range(rounds):
+        started = time.perf_counter()
+        await function(round_number)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="./astrodate.db", help="Database to read from (read-only)")
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--rounds", type=int, default=200, help="Pages fetched and encoded per size and path")
+    args = parser.parse_args()
+
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_model_field
+    from sqlmodel import Session, create_engine, func, select
+
+    from models import User, UserRead, ZodiacSign
+    from serialization import USER_READ_COLUMNS, dump_user_reads
+    from zodiac import zodiac_table
+
+    engine = create_engine(f"sqlite:///file:{os.path.abspath(args.db)}?mode=ro&uri=true")
+    response_field = create_model_field("Response_list_users", List[UserRead], mode="serialization")
+
+    with Session(engine) as db:
+        zodiac_table.ensure_built(db)
+        user_count = db.exec(select(func.count()).select_from(User)).one()
+        max_id = db.exec(select(func.max(User.id))).one() or 0
+
+        print(f"{user_count} users in {args.db}")
+        print(f"{'page':>6}  {'path':<8}{'fetch µs':>11}{'encode µs':>11}{'total µs':>11}{'speedup':>9}")
+        for page_size in args.page_sizes:
+            # Keyset pages spread over the whole table, identical for both paths
+            starts = [(round_number * 7919) % max(max_id - page_size, 1) for round_number in range(args.rounds)]
+
+            def fetch_legacy(round_number: int) -> Tuple[List[User], Dict[int, str]]:
+                users = db.exec(select(User).where(User.id > starts[round_number]).order_by(User.id).limit(page_size)).all()
+                signs = db.exec(select(ZodiacSign.id, ZodiacSign.german_name)).all()
+                db.expunge_all()
+                return list(users), {sign_id: name for sign_id, name in signs}
+
+            def fetch_lean(round_number: int) -> List[Any]:
+                statement = select(*USER_READ_COLUMNS).where(User.id > starts[round_number]).order_by(User.id).limit(page_size)
+                return list(db.exec(statement).all())
+
+            legacy_pages = [fetch_legacy(round_number) for round_number in range(args.rounds)]
+            lean_pages = [fetch_lean(round_number) for round_number in range(args.rounds)]
+
+            async def encode_legacy(round_number: int) -> bytes:
+                users, sign_names = legacy_pages[round_number]
+                items = [UserRead(**user.model_dump(), zodiac_sign_name=sign_names.get(user.zodiac_sign_id)) for user in users]
+                content = await serialize_response(field=response_field, response_content=items, is_coroutine=True)
+                return JSONResponse(content).body
+
+            def encode_lean(round_number: int) -> bytes:
+                return b"[" + dump_user_reads(lean_pages[round_number]) + b"]"
+
+            # Both paths must produce the same document
+            assert json.loads(await encode_legacy(0)) == json.loads(encode_lean(0))
+
+            results = {
+                "legacy": (_time_rounds(fetch_legacy, args.rounds), await _time_rounds_async(encode_legacy, args.rounds)),
+                "lean": (_time_rounds(fetch_lean, args.rounds), _time_rounds(encode_lean, args.rounds)),
+            }
+            legacy_total = statistics.median(results["legacy"][0]) + statistics.median(results["legacy"][1])
+            for path, (fetch_timings, encode_timings) in results.items():
+                fetch = statistics.median(fetch_timings)
+                encode = statistics.median(encode_timings)
+                speedup = legacy_total / (fetch + encode)
+                print(f"{page_size:>6}  {path:<8}{fetch * 1e6:>11.0f}{encode * 1e6:>11.0f}{(fetch + encode) * 1e6:>11.0f}{speedup:>8.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
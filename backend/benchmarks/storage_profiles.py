@@ -0,0 +1,98 @@
+"""
+Compares the SQLite storage profiles from `storage_profiles.py` on the swipe and
+discover workloads. Every profile runs against its own fresh copy of the database.
+
+Usage (from the `backend` directory):
+    python -m benchmarks.storage_profiles --profiles default wal wal-durable --requests 2000 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from typing import List
+
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import Session, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import async_crud
+from candidate_index import candidate_index
+from models import User
+from storage_profiles import STORAGE_PROFILES, apply_storage_profile, get_storage_profile
+from benchmarks.async_vs_threadpool import _drive, copy_database
+
+
+def _copy_database(source: str, profile_name: str) -> str:
+    target_dir = tempfile.mkdtemp(prefix=f"astrodate-{profile_name}-")
+    target = os.path.join(target_dir, "astrodate.db")
+    # WAL mode persists in the file; profiles without a journal mode start from SQLite's default
+    copy_database(source, target, journal_mode=get_storage_profile(profile_name).journal_mode or "DELETE")
+    return target
+
+
+def _create_engine(path: str, profile_name: str) -> AsyncEngine:
+    profile = get_storage_profile(profile_name)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", **profile.pool_options())
+    apply_storage_profile(async_engine.sync_engine, profile)
+    return async_engine
+
+
+def _summarize(name: str, profile_name: str, latencies: List[float], elapsed: float) -> str:
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000
+    return f"{profile_name:<14}{name:<10}{len(latencies) / elapsed:>10.0f}{p50:>10.2f}{p99:>10.2f}"
+
+
+async def _run_profile(source: str, profile_name: str, total_requests: int, concurrency: int, seed: int) -> None:
+    path = _copy_database(source, profile_name)
+    with Session(create_engine(f"sqlite:///{path}")) as session:
+        users = list(session.exec(select(User)).all())
+        candidate_index.reset()
+        candidate_index.ensure_loaded(session)
+    user_ids = [user.id for user in users if user.id is not None]
+    rng = random.Random(seed)
+    swipes = [(rng.choice(user_ids), rng.choice(user_ids), rng.random() < 0.5) for _ in range(total_requests)]
+
+    async_engine = _create_engine(path, profile_name)
+
+    async def swipe_request(request_number: int) -> None:
+        user_id_from, user_id_to, is_like = swipes[request_number]
+        if user_id_from == user_id_to:
+            return
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            await async_crud.swipe(db, user_id_from, user_id_to, is_like)
+
+    async def discover_request(request_number: int) -> None:
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            await async_crud.get_compatible_user(db, users[request_number % len(users)])
+
+    for name, handler in (("swipe", swipe_request), ("discover", discover_request)):
+        started = time.perf_counter()
+        latencies = await _drive(handler, total_requests, concurrency)
+        print(_summarize(name, profile_name, latencies, time.perf_counter() - started))
+
+    await async_engine.dispose()
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="./astrodate.db", help="Source database (copied for every profile)")
+    parser.add_argument("--profiles", nargs="+", default=list(STORAGE_PROFILES), choices=list(STORAGE_PROFILES))
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per workload and profile")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the swipe sequence (same for every profile)")
+    args = parser.parse_args()
+
+    print(f"{'profile':<14}{'workload':<10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for profile_name in args.profiles:
+        await _run_profile(args.db, profile_name, args.requests, args.concurrency, args.seed)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,197 @@
+"""
+Start der Anwendung: Datenbank bereitstellen, In-Memory-Tabellen aufbauen und die Dauer
+jeder Phase messen.
+
+Für eine noch nicht vorhandene Datenbank gibt es drei Startmodi (`ASTRODATE_STARTUP_MODE`):
+- `seed` (Standard): Tabellen, statische Daten und Test-Benutzer werden vor dem Start
+  angelegt. Der Server nimmt erst danach Anfragen an.
+- `snapshot`: Eine vorbereitete Vorlage (`ASTRODATE_DB_TEMPLATE`, erzeugt mit
+  `create_db_snapshot.py`) wird kopiert. Es wird weder gehasht noch geseedet.
+- `background`: Tabellen und statische Daten werden sofort angelegt, die Test-Benutzer erst
+  nach dem Start in einem Hintergrund-Task. Registrierung und Login funktionieren sofort,
+  die Test-Benutzer erscheinen wenige Sekunden später.
+
+Das Seeding-Modul (und damit Faker) wird nur importiert, wenn wirklich geseedet wird.
+"""
+import asyncio
+import os
+import shutil
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+from typing import Iterator, List, Tuple
+
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import (
+    engine, async_engine, write_transaction, DATABASE_FILE, create_db_and_tables, apply_schema_migrations,
+    seed_zodiac_signs, seed_zodiac_compatibility
+)
+from models import User
+from candidate_index import candidate_index
+from zodiac import zodiac_table
+from compatibility import compatibility_matrix
+from metrics import Gauge, registry
+
+STARTUP_MODES = ("seed", "snapshot", "background")
+# Wie eine fehlende Datenbank angelegt wird (siehe oben)
+STARTUP_MODE = os.environ.get("ASTRODATE_STARTUP_MODE", "seed").lower()
+# Vorlage für den Modus `snapshot`
+DB_TEMPLATE = os.environ.get("ASTRODATE_DB_TEMPLATE", "./astrodate.template.db")
+
+startup_phase_seconds = registry.register(Gauge(
+    "astrodate_startup_phase_seconds", "Duration of each startup phase of this process.", ("phase",)))
+
+
+class StartupReport:
+    """Sammelt die Dauer der einzelnen Startphasen und gibt sie als Tabelle aus."""
+
+    def __init__(self) -> None:
+        self.phases: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name: str, seconds: float) -> None:
+        self.phases.append((name, seconds))
+        startup_phase_seconds.set(name, value=seconds)
+
+    def render(self, title: str = "Startzeit nach Phasen") -> str:
+        lines = [f"{title}:"]
+        lines += [f"  {name:<26}{seconds * 1000:>10.1f} ms" for name, seconds in self.phases]
+        lines.append(f"  {'gesamt':<26}{sum(seconds for _, seconds in self.phases) * 1000:>10.1f} ms")
+        return "\n".join(lines)
+
+
+def copy_snapshot(template: str, target: str) -> None:
+    """
+    Legt `target` als Kopie der Vorlage an. Die Kopie wird erst vollständig geschrieben und
+    dann per `os.link` veröffentlicht: Starten mehrere Worker gleichzeitig, gewinnt genau
+    einer, und keiner öffnet je eine halb kopierte oder ersetzte Datei.
+    """
+    if not os.path.isfile(template):
+        raise FileNotFoundError(f"Datenbank-Vorlage nicht gefunden: {template} (ASTRODATE_DB_TEMPLATE)")
+    # Reste einer gelöschten Datenbank würden sonst auf die neue Datei angewendet
+    for suffix in ("-wal", "-shm", "-journal"):
+        if os.path.exists(target + suffix) and not os.path.exists(target):
+            os.remove(target + suffix)
+
+    temporary = f"{target}.{os.getpid()}.tmp"
+    shutil.copyfile(template, temporary)
+    try:
+        with open(temporary, "rb") as handle:
+            os.fsync(handle.fileno())
+        os.link(temporary, target)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(temporary)
+
+
+def write_snapshot(source: str, target: str) -> None:
+    """Schreibt eine kompakte, konsistente Kopie der Datenbank (`VACUUM INTO`), auch bei laufendem Server."""
+    temporary = f"{target}.tmp"
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    with closing(sqlite3.connect(source)) as connection:
+        connection.execute("VACUUM INTO ?", (temporary,))
+    os.replace(temporary, target)
+
+
+def seed_users() -> None:
+    """Legt die Fake- und Test-Benutzer an."""
+    # Erst hier importieren: Faker und das Seeding werden im normalen Serverbetrieb nicht gebraucht
+    from seed import create_fake_users, create_specific_test_users
+    with Session(engine) as session:
+        create_fake_users(session)
+        create_specific_test_users(session)
+
+
+def prepare_database(report: StartupReport, mode: str = STARTUP_MODE) -> bool:
+    """
+    Stellt die Datenbank bereit. Gibt True zurück, wenn die Benutzer noch im Hintergrund
+    angelegt werden müssen (`seed_users_in_background`).
+    """
+    if mode not in STARTUP_MODES:
+        raise ValueError(f"Unbekannter Startmodus {mode!r}, erlaubt sind: {', '.join(STARTUP_MODES)}")
+
+    if not os.path.exists(DATABASE_FILE):
+        if mode == "snapshot":
+            print(f"Datenbank nicht gefunden. Kopiere Vorlage {DB_TEMPLATE}...")
+            with report.phase("Vorlage kopieren"):
+                copy_snapshot(DB_TEMPLATE, DATABASE_FILE)
+        else:
+            print("Datenbank nicht gefunden. Initialisiere neue Datenbank...")
+            with report.phase("Tabellen anlegen"):
+                create_db_and_tables()
+            with report.phase("statische Daten"):
+                seed_zodiac_signs()
+                seed_zodiac_compatibility()
+            if mode == "background":
+                print("Benutzer werden nach dem Start im Hintergrund angelegt.")
+                return True
+            with report.phase("Benutzer-Seeding"):
+                seed_users()
+            print("================== DATENBANK-INITIALISIERUNG FERTIG ==================")
+            return False
+    else:
+        print(f"Verwende existierende Datenbank: {DATABASE_FILE}")
+
+    # Neue Tabellen und Indizes in bestehenden (oder aus einer älteren Vorlage kopierten) Datenbanken nachziehen
+    with report.phase("Schema-Migrationen"):
+        create_db_and_tables()
+        apply_schema_migrations()
+    # Abgleich der Kompatibilitätsdaten; schreibt nur, wenn sich etwas geändert hat
+    with report.phase("Kompatibilitätsabgleich"):
+        seed_zodiac_compatibility()
+    return False
+
+
+def warm_caches(report: StartupReport) -> None:
+    """
+    Kandidaten-Index und Kompatibilitätsmatrix für /users/discover sowie die Sternzeichen-Tabelle
+    für die Registrierung einmalig aufbauen, damit die ersten Anfragen nicht warten.
+    """
+    with Session(engine) as session:
+        with report.phase("Kandidaten-Index"):
+            candidate_index.ensure_loaded(session)
+        with report.phase("Sternzeichen-Tabellen"):
+            zodiac_table.ensure_built(session)
+            compatibility_matrix.ensure_built(session)
+
+
+def _build_seed_users() -> List[User]:
+    from seed import build_fake_users, build_specific_test_users
+    with Session(engine) as session:
+        return build_fake_users(session) + build_specific_test_users(session)
+
+
+async def _seed_and_index_users() -> None:
+    # Hashen und Aufbauen der Benutzer im Thread, damit die Event-Loop frei bleibt
+    users = await asyncio.to_thread(_build_seed_users)
+    # Geschrieben wird wie bei jedem API-Schreibzugriff unter `async_write_lock`, damit das
+    # Seeding nicht mit Registrierungen und Swipes im Busy-Handler von SQLite konkurriert
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        async with write_transaction(session):
+            session.add_all(users)
+    # Der Index wurde vor dem Seeding geladen; die neuen Benutzer nachtragen
+    for user in users:
+        candidate_index.add_user(user.id, user.zodiac_sign_id)
+
+
+async def seed_users_in_background(report: StartupReport) -> None:
+    """Seedet die Benutzer, während der Server bereits Anfragen beantwortet."""
+    started = time.perf_counter()
+    try:
+        await _seed_and_index_users()
+    except Exception as error:
+        print(f"Hintergrund-Seeding fehlgeschlagen: {error!r}")
+        return
+    report.record("Benutzer-Seeding (Hintergrund)", time.perf_counter() - started)
+    print(f"Hintergrund-Seeding abgeschlossen nach {(time.perf_counter() - started) * 1000:.0f} ms.")
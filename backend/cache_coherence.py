@@ -0,0 +1,287 @@
+"""
+Keeps the in-memory caches of several worker processes coherent over the shared SQLite file.
+
+Every process caches profiles, principals, the zodiac tables and the candidate index, but a
+write only touches the caches of the process that made it. Writers therefore append a row to
+the `CacheInvalidation` change log in the same transaction as the change itself, and every
+server process runs a `CacheWatcher` that polls `PRAGMA data_version` (a cheap counter that
+changes whenever another connection commits) and applies the new rows to its own caches.
+New users and swipes need no log rows: the watcher tails the `user` and `match` tables by id,
+which also covers bulk imports that bypass the ORM.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Set
+
+from sqlalchemy import event, insert
+from sqlalchemy.engine import Connection
+
+from models import CacheInvalidation, User, ZodiacSign, ZodiacCompatibility
+from candidate_index import candidate_index
+from compatibility import compatibility_matrix
+from decks import deck_store
+from metrics import Counter, registry
+from principal_cache import principal_cache
+from profile_cache import profile_cache
+from zodiac import zodiac_table
+
+# Seconds between two checks for changes made by other processes (0 disables the sync)
+CACHE_SYNC_INTERVAL = float(os.environ.get("ASTRODATE_CACHE_SYNC_INTERVAL", "0.25"))
+# Seconds change-log rows are kept; a process that falls further behind drops all its caches
+CHANGE_LOG_RETENTION_SECONDS = float(os.environ.get("ASTRODATE_CACHE_CHANGE_LOG_RETENTION", "600"))
+# Seconds between two clean-ups of the change log
+PRUNE_INTERVAL_SECONDS = 60.0
+# More new rows than this in one poll (e.g. a bulk import) reload the candidate index instead
+TAIL_LIMIT = 10000
+# Ids per `IN (...)` lookup, well below SQLite's variable limit
+LOOKUP_CHUNK_SIZE = 500
+
+TOPIC_USER = "user"
+TOPIC_ZODIAC = "zodiac"
+TOPIC_COMPATIBILITY = "compatibility"
+
+# Identifies this process in the change log, so it skips the rows it wrote itself
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+logger = logging.getLogger("astrodate.cache")
+
+invalidations_applied = registry.register(Counter(
+    "astrodate_cache_invalidations_total",
+    "Cache invalidations applied on behalf of other processes, by topic.",
+    ("topic",),
+))
+
+
+def sync_enabled() -> bool:
+    return CACHE_SYNC_INTERVAL > 0
+
+
+def publish_invalidation(connection: Connection, topic: str, entity_id: Optional[int] = None) -> None:
+    """
+    Records that the cached `topic` entry `entity_id` (None: all entries) changed. Must run
+    on the connection of the writing transaction, so the row commits or rolls back with it.
+    """
+    if not sync_enabled():
+        return
+    connection.execute(insert(CacheInvalidation).values(
+        topic=topic, entity_id=entity_id, origin=WORKER_ID, created_at=datetime.utcnow()))
+
+
+# New users are picked up by tailing the user table; only changes need a log row
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _publish_user_change(_mapper, connection: Connection, target: User) -> None:
+    if target.id is not None:
+        publish_invalidation(connection, TOPIC_USER, target.id)
+
+
+@event.listens_for(ZodiacSign, "after_insert")
+@event.listens_for(ZodiacSign, "after_update")
+@event.listens_for(ZodiacSign, "after_delete")
+def _publish_zodiac_change(_mapper, connection: Connection, _target: ZodiacSign) -> None:
+    publish_invalidation(connection, TOPIC_ZODIAC)
+
+
+@event.listens_for(ZodiacCompatibility, "after_insert")
+@event.listens_for(ZodiacCompatibility, "after_update")
+@event.listens_for(ZodiacCompatibility, "after_delete")
+def _publish_compatibility_change(_mapper, connection: Connection, _target: ZodiacCompatibility) -> None:
+    publish_invalidation(connection, TOPIC_COMPATIBILITY)
+
+
+def _chunks(values: List[int], size: int = LOOKUP_CHUNK_SIZE) -> Iterable[List[int]]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class CacheWatcher:
+    """
+    Applies changes committed by other processes to this process's caches.
+
+    The watcher owns a separate sqlite3 connection, so polling never waits for the
+    application's connection pool. `prime` must run before the caches are warmed: anything
+    committed after it is applied again, which is harmless because every step is idempotent.
+    """
+
+    def __init__(self, database_file: str, interval: float = CACHE_SYNC_INTERVAL) -> None:
+        self.database_file = database_file
+        self.interval = interval
+        self._connection: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        self._last_change_id = 0
+        self._last_user_id = 0
+        self._last_match_id = 0
+        self._next_prune = 0.0
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def prime(self) -> None:
+        """Opens the connection and starts following the change log from its current end."""
+        if self.interval <= 0:
+            return
+        self._connection = sqlite3.connect(self.database_file, timeout=1.0, isolation_level=None, check_same_thread=False)
+        self._data_version = self._scalar("PRAGMA data_version")
+        # The last id ever assigned, even if those rows were pruned already
+        self._last_change_id = self._scalar(
+            "SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'cacheinvalidation'), 0)")
+        self._last_user_id = self._scalar('SELECT COALESCE(MAX(id), 0) FROM "user"')
+        self._last_match_id = self._scalar('SELECT COALESCE(MAX(id), 0) FROM "match"')
+        self._next_prune = time.monotonic() + PRUNE_INTERVAL_SECONDS
+
+    def start(self) -> None:
+        if self._connection is not None and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.poll)
+                if time.monotonic() >= self._next_prune:
+                    self._next_prune = time.monotonic() + PRUNE_INTERVAL_SECONDS
+                    await asyncio.to_thread(self.prune)
+            except sqlite3.Error as error:
+                # Cursors only advance after a step was applied, so the next poll simply retries
+                self._data_version = None
+                logger.warning("Cache sync failed, retrying: %r", error)
+
+    def poll(self) -> bool:
+        """Applies all changes committed since the last poll. Returns False if nothing changed."""
+        data_version = self._scalar("PRAGMA data_version")
+        if data_version == self._data_version:
+            return False
+        self._data_version = data_version
+        self._apply_change_log()
+        self._apply_new_users()
+        self._apply_new_swipes()
+        return True
+
+    def prune(self) -> int:
+        """Deletes change-log rows older than the retention period."""
+        cutoff = datetime.utcnow() - timedelta(seconds=CHANGE_LOG_RETENTION_SECONDS)
+        cursor = self._execute(
+            "DELETE FROM cacheinvalidation WHERE created_at < ?", (cutoff.strftime("%Y-%m-%d %H:%M:%S.%f"),))
+        return cursor.rowcount
+
+    def resync(self) -> None:
+        """Drops every cache; they are rebuilt from the database on their next use."""
+        profile_cache.clear()
+        principal_cache.clear()
+        zodiac_table.invalidate()
+        compatibility_matrix.invalidate()
+        candidate_index.reset()
+        invalidations_applied.inc("resync")
+
+    def _apply_change_log(self) -> None:
+        rows = self._execute(
+            "SELECT id, topic, entity_id, origin FROM cacheinvalidation WHERE id > ? ORDER BY id",
+            (self._last_change_id,),
+        ).fetchall()
+        if not rows:
+            return
+        # Ids are never reused or skipped, so a gap means rows were pruned before we saw them
+        if rows[0][0] != self._last_change_id + 1:
+            logger.warning("Cache change log fell behind (next id %d, expected %d), dropping all caches",
+                           rows[0][0], self._last_change_id + 1)
+            self.resync()
+            self._last_change_id = rows[-1][0]
+            return
+
+        user_ids: Set[int] = set()
+        topics: Set[str] = set()
+        for _change_id, topic, entity_id, origin in rows:
+            if origin == WORKER_ID:
+                continue
+            if topic == TOPIC_USER and entity_id is not None:
+                user_ids.add(entity_id)
+            else:
+                topics.add(topic)
+
+        if TOPIC_ZODIAC in topics:
+            zodiac_table.invalidate()
+            # Profiles embed the sign name
+            profile_cache.clear()
+            invalidations_applied.inc(TOPIC_ZODIAC)
+        if TOPIC_COMPATIBILITY in topics:
+            compatibility_matrix.invalidate()
+            invalidations_applied.inc(TOPIC_COMPATIBILITY)
+        if user_ids:
+            self._invalidate_users(sorted(user_ids))
+        self._last_change_id = rows[-1][0]
+
+    def _invalidate_users(self, user_ids: List[int]) -> None:
+        for user_id in user_ids:
+            profile_cache.invalidate(user_id)
+            principal_cache.invalidate_user(user_id)
+        invalidations_applied.inc(TOPIC_USER, amount=len(user_ids))
+        if not candidate_index.loaded:
+            return
+        # Re-read the sign; deleted users (no row) leave the index
+        signs = {}
+        for chunk in _chunks(user_ids):
+            placeholders = ", ".join("?" * len(chunk))
+            signs.update(self._execute(
+                f'SELECT id, zodiac_sign_id FROM "user" WHERE id IN ({placeholders})', chunk).fetchall())
+        for user_id in user_ids:
+            candidate_index.add_user(user_id, signs.get(user_id))
+
+    def _apply_new_users(self) -> None:
+        rows = self._execute(
+            'SELECT id, zodiac_sign_id FROM "user" WHERE id > ? ORDER BY id LIMIT ?',
+            (self._last_user_id, TAIL_LIMIT + 1),
+        ).fetchall()
+        if not rows:
+            return
+        if len(rows) > TAIL_LIMIT:
+            self._reload_candidate_index()
+            return
+        for user_id, sign_id in rows:
+            candidate_index.add_user(user_id, sign_id)
+        self._last_user_id = rows[-1][0]
+
+    def _apply_new_swipes(self) -> None:
+        rows = self._execute(
+            'SELECT id, user_id_from, user_id_to FROM "match" WHERE id > ? ORDER BY id LIMIT ?',
+            (self._last_match_id, TAIL_LIMIT + 1),
+        ).fetchall()
+        if not rows:
+            return
+        if len(rows) > TAIL_LIMIT:
+            self._reload_candidate_index()
+            return
+        # Swipes made by this process are already recorded; recording them again is a no-op
+        for _match_id, user_id_from, user_id_to in rows:
+            candidate_index.record_swipe(user_id_from, user_id_to)
+            deck_store.discard(user_id_from, user_id_to)
+        self._last_match_id = rows[-1][0]
+
+    def _reload_candidate_index(self) -> None:
+        """Cheaper than replaying a bulk import row by row: the index reloads on its next use."""
+        candidate_index.reset()
+        invalidations_applied.inc("candidate_index")
+        self._last_user_id = self._scalar('SELECT COALESCE(MAX(id), 0) FROM "user"')
+        self._last_match_id = self._scalar('SELECT COALESCE(MAX(id), 0) FROM "match"')
+
+    def _execute(self, sql: str, parameters: Iterable = ()) -> sqlite3.Cursor:
+        if self._connection is None:
+            raise RuntimeError("CacheWatcher.prime() has not been called")
+        return self._connection.execute(sql, tuple(parameters))
+
+    def _scalar(self, sql: str) -> int:
+        return self._execute(sql).fetchone()[0]
@@ -0,0 +1,230 @@
+import os
+import random
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlmodel import Session, select
+
+from models import User, Match
+
+# Upper bound for the swiped ids kept in memory across all users (each costs roughly 60-100
+# bytes in a Python set); the sets of the least recently active users are dropped first and
+# reloaded from the database when those users discover again
+SWIPED_CACHE_SIZE = int(os.environ.get("ASTRODATE_SWIPED_CACHE_SIZE", "2000000"))
+
+class _Bucket:
+    """
+    A set of user ids that supports O(1) insertion, removal and random access.
+    The ids live in a list for random access; `positions` maps an id to its list slot.
+    """
+    __slots__ = ("ids", "positions")
+
+    def __init__(self) -> None:
+        self.ids: List[int] = []
+        self.positions: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, user_id: int) -> None:
+        if user_id in self.positions:
+            return
+        self.positions[user_id] = len(self.ids)
+        self.ids.append(user_id)
+
+    def remove(self, user_id: int) -> None:
+        position = self.positions.pop(user_id, None)
+        if position is None:
+            return
+        # Swap the last id into the freed slot so removal stays O(1)
+        last_id = self.ids.pop()
+        if last_id != user_id:
+            self.ids[position] = last_id
+            self.positions[last_id] = position
+
+
+class CandidateIndex:
+    """
+    Process-local index of discoverable users.
+
+    User ids are bucketed by `zodiac_sign_id`, so picking a random, compatible, not yet
+    swiped candidate does not need to load the candidate rows from the database. The buckets
+    are loaded lazily from the database once and then kept current through `add_user`.
+
+    A user's swiped set is loaded on demand with `load_swipes` and then kept current through
+    `record_swipe`. The sets are held in LRU order and bounded by `max_swiped` ids in total.
+    """
+
+    # Number of random draws before falling back to a full scan of the compatible buckets.
+    MAX_SAMPLE_ATTEMPTS = 32
+
+    def __init__(self, max_swiped: int = SWIPED_CACHE_SIZE) -> None:
+        self.max_swiped = max_swiped
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._buckets: Dict[int, _Bucket] = {}
+        self._sign_by_user: Dict[int, int] = {}
+        self._swiped: "OrderedDict[int, Set[int]]" = OrderedDict()
+        self._swiped_count = 0
+        # Swipes recorded while a user's set is being read from the database
+        self._loading: Dict[int, Set[int]] = {}
+        self._rng = random.Random()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def ensure_loaded(self, db: Session) -> None:
+        """Builds the sign buckets from the database on first use."""
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._load(db)
+
+    def _load(self, db: Session) -> None:
+        buckets: Dict[int, _Bucket] = {}
+        sign_by_user: Dict[int, int] = {}
+        for user_id, sign_id in db.exec(select(User.id, User.zodiac_sign_id)):
+            if user_id is None or sign_id is None:
+                continue
+            buckets.setdefault(sign_id, _Bucket()).add(user_id)
+            sign_by_user[user_id] = sign_id
+
+        self._buckets = buckets
+        self._sign_by_user = sign_by_user
+        self._loaded = True
+
+    def swipes_loaded(self, user_id: int) -> bool:
+        return user_id in self._swiped
+
+    def load_swipes(self, db: Session, user_id: int) -> None:
+        """Reads the ids `user_id` has swiped on, unless they are already in memory."""
+        if user_id in self._swiped:
+            return
+        with self._lock:
+            self._loading.setdefault(user_id, set())
+        # Read without holding the lock: through `run_sync` the query yields to the event loop
+        try:
+            swiped = set(db.exec(select(Match.user_id_to).where(Match.user_id_from == user_id)).all())
+        except BaseException:
+            with self._lock:
+                self._loading.pop(user_id, None)
+            raise
+        with self._lock:
+            swiped |= self._loading.pop(user_id, set())
+            existing = self._swiped.get(user_id)
+            if existing is not None:
+                # Loaded concurrently; keep the swipes recorded since then
+                self._swiped_count -= len(existing)
+                swiped |= existing
+            self._swiped[user_id] = swiped
+            self._swiped.move_to_end(user_id)
+            self._swiped_count += len(swiped)
+            # The set just loaded always stays, even if it alone exceeds the budget
+            while self._swiped_count > self.max_swiped and len(self._swiped) > 1:
+                _, evicted = self._swiped.popitem(last=False)
+                self._swiped_count -= len(evicted)
+
+    def reset(self) -> None:
+        """Drops all indexed data; the next `ensure_loaded` call rebuilds it."""
+        with self._lock:
+            self._buckets = {}
+            self._sign_by_user = {}
+            self._swiped = OrderedDict()
+            self._swiped_count = 0
+            self._loading = {}
+            self._loaded = False
+
+    def add_user(self, user_id: int, zodiac_sign_id: Optional[int]) -> None:
+        """Registers a new (or re-signed) user. A no-op until the index is loaded."""
+        if not self._loaded:
+            return
+        with self._lock:
+            previous_sign_id = self._sign_by_user.pop(user_id, None)
+            if previous_sign_id is not None:
+                self._buckets[previous_sign_id].remove(user_id)
+            if zodiac_sign_id is None:
+                return
+            self._buckets.setdefault(zodiac_sign_id, _Bucket()).add(user_id)
+            self._sign_by_user[user_id] = zodiac_sign_id
+
+    def record_swipe(self, user_id_from: int, user_id_to: int) -> None:
+        """Marks `user_id_to` as swiped by `user_id_from`. A no-op while their set is not loaded."""
+        with self._lock:
+            swiped = self._swiped.get(user_id_from)
+            if swiped is not None:
+                if user_id_to not in swiped:
+                    swiped.add(user_id_to)
+                    self._swiped_count += 1
+            elif user_id_from in self._loading:
+                self._loading[user_id_from].add(user_id_to)
+
+    def has_swiped(self, user_id_from: int, user_id_to: int) -> bool:
+        """Only meaningful after `load_swipes(user_id_from)`."""
+        return user_id_to in self._swiped.get(user_id_from, ())
+
+    def pick_candidate(self, user_id: int, compatible_sign_ids: Iterable[int]) -> Optional[int]:
+        """
+        Returns the id of a random user from the compatible sign buckets that `user_id`
+        has not swiped on yet, or None if there is no such user.
+        """
+        candidates = self.sample_candidates(user_id, compatible_sign_ids, 1)
+        return candidates[0] if candidates else None
+
+    def sample_candidates(
+        self,
+        user_id: int,
+        compatible_sign_ids: Iterable[int],
+        count: int,
+        exclude: Iterable[int] = (),
+    ) -> List[int]:
+        """
+        Returns up to `count` distinct random ids from the compatible sign buckets that
+        `user_id` has not swiped on yet and that are not in `exclude`. Call `load_swipes`
+        for the user first.
+
+        Drawing a position uniformly over the concatenated buckets is uniform over all
+        compatible users, so rejection sampling keeps the choice unbiased. Only when the
+        user has already swiped on most of the pool does it fall back to a scan.
+        """
+        with self._lock:
+            buckets = [self._buckets[sign_id] for sign_id in set(compatible_sign_ids)
+                       if sign_id in self._buckets and len(self._buckets[sign_id]) > 0]
+            total = sum(len(bucket) for bucket in buckets)
+            if total == 0 or count <= 0:
+                return []
+
+            swiped = self._swiped.get(user_id, set())
+            if user_id in self._swiped:
+                self._swiped.move_to_end(user_id)
+            rejected = set(exclude)
+            rejected.add(user_id)
+            picked: List[int] = []
+
+            for _ in range(count * 2 + self.MAX_SAMPLE_ATTEMPTS):
+                candidate_id = self._draw(buckets, self._rng.randrange(total))
+                if candidate_id not in rejected and candidate_id not in swiped:
+                    picked.append(candidate_id)
+                    rejected.add(candidate_id)
+                    if len(picked) >= count:
+                        return picked
+
+            remaining = [candidate_id for bucket in buckets for candidate_id in bucket.ids
+                         if candidate_id not in rejected and candidate_id not in swiped]
+            picked.extend(self._rng.sample(remaining, min(count - len(picked), len(remaining))))
+            return picked
+
+    @staticmethod
+    def _draw(buckets: List[_Bucket], position: int) -> int:
+        """Maps a position in the concatenated buckets to the user id stored there."""
+        for bucket in buckets:
+            if position < len(bucket):
+                return bucket.ids[position]
+            position -= len(bucket)
+        raise IndexError(position)
+
+
+# Shared instance used by the CRUD layer
+candidate_index = CandidateIndex()
@@ -0,0 +1,84 @@
+import threading
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from models import ZodiacCompatibility
+
+
+class CompatibilityMatrix:
+    """
+    In-memory form of the `ZodiacCompatibility` relation.
+
+    Row `i` is a bitmask whose bit `j` is set if sign `j` is compatible with sign `i`
+    (sign ids index the rows and bits directly). The relation is static, so it is compiled
+    once and the discover path never queries the table; ORM changes to
+    `ZodiacCompatibility` mark it stale and the next `ensure_built` call recompiles it.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._masks: List[int] = []
+        self._sign_ids: Dict[int, FrozenSet[int]] = {}
+        self._current = False
+
+    @property
+    def is_current(self) -> bool:
+        return self._current
+
+    def invalidate(self) -> None:
+        self._current = False
+
+    def ensure_built(self, db: Session) -> None:
+        """(Re)compiles the matrix from the database if it is missing or stale."""
+        if self._current:
+            return
+        # Read before taking the lock: through `run_sync` the query yields to the event loop,
+        # and a second coroutine on the same thread would block it on the held lock
+        pairs = db.exec(select(ZodiacCompatibility.sign_1_id, ZodiacCompatibility.sign_2_id)).all()
+        with self._lock:
+            if not self._current:
+                self.build(pairs)
+
+    def build(self, pairs: Iterable[Tuple[int, int]]) -> None:
+        """Compiles the matrix from (sign_1_id, sign_2_id) pairs."""
+        pairs = list(pairs)
+        size = max((max(pair) for pair in pairs), default=-1) + 1
+        masks = [0] * size
+        for sign_1_id, sign_2_id in pairs:
+            masks[sign_1_id] |= 1 << sign_2_id
+
+        self._masks = masks
+        # The id sets are what the candidate index consumes; precompute them per row
+        self._sign_ids = {
+            sign_id: frozenset(bit for bit in range(size) if mask >> bit & 1)
+            for sign_id, mask in enumerate(masks) if mask
+        }
+        self._current = True
+
+    def mask(self, sign_id: int) -> int:
+        """Returns the bitmask row of a sign (0 for unknown signs)."""
+        return self._masks[sign_id] if 0 <= sign_id < len(self._masks) else 0
+
+    def are_compatible(self, sign_id_a: int, sign_id_b: int) -> bool:
+        return bool(self.mask(sign_id_a) >> sign_id_b & 1) if sign_id_b >= 0 else False
+
+    def score(self, sign_id_a: int, sign_id_b: int) -> int:
+        """Compatibility score of two signs: 1 if compatible, otherwise 0."""
+        return int(self.are_compatible(sign_id_a, sign_id_b))
+
+    def compatible_sign_ids(self, sign_id: int) -> FrozenSet[int]:
+        """Returns the ids of all signs compatible with the given sign."""
+        return self._sign_ids.get(sign_id, frozenset())
+
+
+# Shared instance; built at startup
+compatibility_matrix = CompatibilityMatrix()
+
+
+@event.listens_for(ZodiacCompatibility, "after_insert")
+@event.listens_for(ZodiacCompatibility, "after_update")
+@event.listens_for(ZodiacCompatibility, "after_delete")
+def _invalidate_compatibility_matrix(_mapper, _connection, _target: ZodiacCompatibility) -> None:
+    compatibility_matrix.invalidate()
@@ -0,0 +1,41 @@
+"""
+Erzeugt die Vorlage-Datenbank für den schnellen Start (`ASTRODATE_STARTUP_MODE=snapshot`).
+
+Existiert die Datenbank aus `ASTRODATE_DB_FILE` noch nicht, wird sie zuerst vollständig
+angelegt (Tabellen, statische Daten, Test-Benutzer). Danach wird sie per `VACUUM INTO`
+kompakt und konsistent in die Vorlage geschrieben; das funktioniert auch, während ein
+Server auf der Datenbank läuft.
+
+Aufruf aus dem `backend`-Verzeichnis:
+    python create_db_snapshot.py
+    ASTRODATE_DB_FILE=/tmp/build.db python create_db_snapshot.py --output /srv/astrodate.template.db
+"""
+import argparse
+import os
+
+from database import DATABASE_FILE
+from bootstrap import DB_TEMPLATE, StartupReport, prepare_database, write_snapshot
+from hashing import password_hasher
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Erzeugt eine Vorlage-Datenbank für den Snapshot-Start.")
+    parser.add_argument("--output", default=DB_TEMPLATE, help=f"Zieldatei (Standard: {DB_TEMPLATE})")
+    args = parser.parse_args()
+
+    if os.path.abspath(args.output) == os.path.abspath(DATABASE_FILE):
+        parser.error("Die Vorlage darf nicht die Datenbank selbst sein.")
+
+    report = StartupReport()
+    try:
+        prepare_database(report, mode="seed")
+    finally:
+        password_hasher.shutdown()
+    with report.phase("Vorlage schreiben"):
+        write_snapshot(DATABASE_FILE, args.output)
+    print(report.render("Dauer nach Phasen"))
+    print(f"Vorlage geschrieben: {args.output} ({os.path.getsize(args.output) / 1024:.0f} KiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,17 @@
+from sqlalchemy import Boolean, DateTime, Integer, and_, column, exists, func, literal, tuple_, update, values
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import aliased
 from sqlmodel import Session, select
 from datetime import date, datetime
-import random
-from typing import List, Optional
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Sequence, Tuple
 
 # Corrected absolute imports
-from models import User, UserCreate, ZodiacSign, ZodiacCompatibility, Match
+from models import User, UserCreate, ZodiacSign, Match, MutualMatch, LikeInbox
 from security import get_password_hash
+from candidate_index import candidate_index
+from zodiac import zodiac_table
+from compatibility import compatibility_matrix
+from decks import deck_store
 
 # --- User Functions ---
 
@@ -19,27 +25,51 @@ def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[User]:
     statement = select(User).offset(skip).limit(limit)
     return db.exec(statement).all()
 
-def create_user(db: Session, user: UserCreate, all_signs: List[ZodiacSign]) -> User:
-    """Creates a new user, efficiently determining the zodiac sign from a pre-fetched list."""
+def create_user(db: Session, user: UserCreate) -> User:
+    """Creates a new user; the zodiac sign comes from the precomputed lookup table."""
     hashed_password = get_password_hash(user.password)
-    zodiac_sign = determine_zodiac_sign_for_date(user.birth_date, all_signs)
+    zodiac_table.ensure_built(db)
     
     db_user = User(
         **user.model_dump(exclude={"password"}),
         hashed_password=hashed_password,
-        zodiac_sign_id=zodiac_sign.id if zodiac_sign else None
+        zodiac_sign_id=zodiac_table.sign_id_for_date(user.birth_date)
     )
     
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    if db_user.id is not None:
+        candidate_index.add_user(db_user.id, db_user.zodiac_sign_id)
     return db_user
 
+def bulk_insert_users(db: Session, users: List[UserCreate], hashed_passwords: List[str]) -> int:
+    """
+    Inserts many users with a single executemany INSERT inside the caller's transaction.
+    Users whose email already exists are skipped. Returns the number of inserted rows;
+    the caller commits.
+    """
+    if not users:
+        return 0
+    zodiac_table.ensure_built(db)
+    sign_ids = zodiac_table.sign_ids_for_dates([user.birth_date for user in users])
+    rows = [
+        {
+            **user.model_dump(exclude={"password"}),
+            "hashed_password": hashed_password,
+            "zodiac_sign_id": sign_id,
+        }
+        for user, hashed_password, sign_id in zip(users, hashed_passwords, sign_ids)
+    ]
+    statement = sqlite_insert(User).on_conflict_do_nothing(index_elements=["email"])
+    return db.connection().execute(statement, rows).rowcount
+
 # --- Zodiac & Compatibility Functions ---
 
 def determine_zodiac_sign_for_date(birth_date: date, signs: List[ZodiacSign]) -> Optional[ZodiacSign]:
     """
     (Pure function) Determines the Western Zodiac sign for a birth date from a list of signs.
+    Hot paths should use `zodiac.zodiac_table`, which answers the same question in O(1).
     """
     for sign in signs:
         if sign.start_month <= sign.end_month:
@@ -55,48 +85,221 @@ def determine_zodiac_sign_for_date(birth_date: date, signs: List[ZodiacSign]) ->
                 return sign
     return None
 
+def get_compatible_sign_ids(db: Session, zodiac_sign_id: int) -> FrozenSet[int]:
+    """Returns the ids of all signs compatible with the given sign, from the compiled matrix."""
+    compatibility_matrix.ensure_built(db)
+    return compatibility_matrix.compatible_sign_ids(zodiac_sign_id)
+
 def get_compatible_user(db: Session, current_user: User) -> Optional[User]:
     """
     Finds a random, compatible user who the current user has not yet swiped on.
     """
-    if not current_user or not current_user.zodiac_sign_id:
-        return None
+    candidate_ids = get_compatible_user_ids(db, current_user, 1)
+    return db.get(User, candidate_ids[0]) if candidate_ids else None
 
-    compatible_sign_ids_query = select(ZodiacCompatibility.sign_2_id).where(
-        ZodiacCompatibility.sign_1_id == current_user.zodiac_sign_id
-    )
-    compatible_sign_ids = set(db.exec(compatible_sign_ids_query).all())
+def get_compatible_user_ids(
+    db: Session, current_user: User, count: int, exclude: Iterable[int] = ()
+) -> List[int]:
+    """
+    Draws up to `count` distinct random ids of compatible users who the current user
+    has not yet swiped on. Ids in `exclude` are never returned.
+    """
+    if not current_user or not current_user.id or not current_user.zodiac_sign_id:
+        return []
+
+    compatible_sign_ids = get_compatible_sign_ids(db, current_user.zodiac_sign_id)
     if not compatible_sign_ids:
+        return []
+
+    # Candidate selection runs against the in-memory index; only the picked rows are loaded.
+    candidate_index.ensure_loaded(db)
+    candidate_index.load_swipes(db, current_user.id)
+    return candidate_index.sample_candidates(current_user.id, compatible_sign_ids, count, exclude)
+
+def get_users_by_ids(db: Session, user_ids: List[int]) -> List[User]:
+    """Fetches the given users in one query, preserving the order of `user_ids`."""
+    if not user_ids:
+        return []
+    users = db.exec(select(User).where(User.id.in_(user_ids))).all() # type: ignore
+    users_by_id = {user.id: user for user in users}
+    return [users_by_id[user_id] for user_id in user_ids if user_id in users_by_id]
+
+# --- Match (Like/Swipe) Functions ---
+
+class SwipeResult(NamedTuple):
+    """
+    Outcome of a swipe: the stored match row and whether the like is mutual.
+    `match_id` is None while the swipe waits in the write-behind queue (see `swipe_queue`).
+    """
+    match_id: Optional[int]
+    is_like: bool
+    is_mutual: bool
+
+def swipe_insert_statement(user_id_from: int, user_id_to: int, is_like: bool):
+    """
+    INSERT ... SELECT that only inserts if the target user exists and becomes a no-op
+    (instead of a duplicate) if the swipe was already recorded.
+    """
+    source = select(
+        literal(user_id_from, Integer),
+        User.id,
+        literal(is_like, Boolean),
+        literal(datetime.utcnow(), DateTime),
+    ).where(User.id == user_id_to)
+    return (
+        sqlite_insert(Match)
+        .from_select(["user_id_from", "user_id_to", "is_like", "created_at"], source)
+        .on_conflict_do_nothing(index_elements=["user_id_from", "user_id_to"])
+    )
+
+def swipe_result_statement(user_id_from: int, user_id_to: int):
+    """Reads the stored swipe and whether the other user already liked back, in one statement."""
+    reverse_like = aliased(Match)
+    liked_back = exists().where(
+        reverse_like.user_id_from == user_id_to,
+        reverse_like.user_id_to == user_id_from,
+        reverse_like.is_like == True,
+    )
+    return select(Match.id, Match.is_like, liked_back.label("liked_back")).where(
+        Match.user_id_from == user_id_from, Match.user_id_to == user_id_to
+    )
+
+def swipe_result_from_row(row) -> Optional[SwipeResult]:
+    if row is None:
         return None
+    match_id, stored_is_like, liked_back = row
+    return SwipeResult(match_id=match_id, is_like=stored_is_like, is_mutual=bool(stored_is_like and liked_back))
 
-    swiped_user_ids_query = select(Match.user_id_to).where(Match.user_id_from == current_user.id)
-    swiped_user_ids = set(db.exec(swiped_user_ids_query).all())
-    swiped_user_ids.add(current_user.id)
+def mutual_match_insert_statement(user_id_a: int, user_id_b: int):
+    """Stores a mutual match as an ordered pair; a no-op if the pair is already stored."""
+    user_id_low, user_id_high = sorted((user_id_a, user_id_b))
+    return (
+        sqlite_insert(MutualMatch)
+        .values(user_id_low=user_id_low, user_id_high=user_id_high, created_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=["user_id_low", "user_id_high"])
+    )
 
-    candidates = db.exec(
-        select(User).where(
-            User.zodiac_sign_id.in_(compatible_sign_ids), # type: ignore
-            User.id.not_in(swiped_user_ids) # type: ignore
+def swipe_batch_insert_statement(swipes: Sequence[Tuple[int, int, bool, datetime]]):
+    """
+    Like `swipe_insert_statement` for a whole batch of (user_id_from, user_id_to, is_like,
+    created_at) swipes in one statement. Rows are inserted in batch order, so the first of
+    two swipes on the same user wins. Returns (id, user_id_to, is_like) of the rows that were
+    actually inserted; swipes on missing users and repeated swipes return nothing.
+    """
+    batch = values(
+        column("position", Integer),
+        column("user_id_from", Integer),
+        column("user_id_to", Integer),
+        column("is_like", Boolean),
+        column("created_at", DateTime),
+        name="batch",
+    ).data([(position, *swipe) for position, swipe in enumerate(swipes)]).cte()
+    source = (
+        select(batch.c.user_id_from, User.id, batch.c.is_like, batch.c.created_at)
+        .join_from(batch, User, User.id == batch.c.user_id_to)
+        .order_by(batch.c.position)
+    )
+    return (
+        sqlite_insert(Match)
+        .from_select(["user_id_from", "user_id_to", "is_like", "created_at"], source)
+        .on_conflict_do_nothing(index_elements=["user_id_from", "user_id_to"])
+        .returning(Match.id, Match.user_id_to, Match.is_like)
+    )
+
+def mutual_like_pairs_statement(pairs: Sequence[Tuple[int, int]]):
+    """Selects those (user_id_from, user_id_to) pairs whose stored swipe is a like that was liked back."""
+    forward, backward = aliased(Match), aliased(Match)
+    return (
+        select(forward.user_id_from, forward.user_id_to)
+        .join(backward, and_(
+            backward.user_id_from == forward.user_id_to,
+            backward.user_id_to == forward.user_id_from,
+        ))
+        .where(
+            tuple_(forward.user_id_from, forward.user_id_to).in_(pairs),
+            forward.is_like == True,
+            backward.is_like == True,
         )
-    ).all()
-    
-    return random.choice(candidates) if candidates else None
+    )
 
-# --- Match (Like/Swipe) Functions ---
+def mutual_match_batch_insert_statement():
+    """Executemany form of `mutual_match_insert_statement` (`user_id_low`, `user_id_high`, `created_at`)."""
+    return sqlite_insert(MutualMatch).on_conflict_do_nothing(index_elements=["user_id_low", "user_id_high"])
+
+def like_inbox_upsert_statement():
+    """
+    Adds newly received likes to the inbox counters. Executemany parameters: `user_id`,
+    `total_likes` and `unread_likes` (both the number of new likes), `last_like_id` and
+    `last_read_id` (0, only used when the row is created).
+    """
+    statement = sqlite_insert(LikeInbox)
+    return statement.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            "total_likes": LikeInbox.total_likes + statement.excluded.total_likes,
+            "unread_likes": LikeInbox.unread_likes + statement.excluded.unread_likes,
+            "last_like_id": func.max(LikeInbox.last_like_id, statement.excluded.last_like_id),
+        },
+    )
+
+def like_inbox_rows(new_likes: Iterable[Tuple[int, int]]) -> List[Dict[str, int]]:
+    """Aggregates newly stored likes, given as (match id, liked user id), into `like_inbox_upsert_statement` rows."""
+    counts: Dict[int, Tuple[int, int]] = {}
+    for match_id, user_id in new_likes:
+        count, last_like_id = counts.get(user_id, (0, 0))
+        counts[user_id] = (count + 1, max(last_like_id, match_id))
+    return [
+        {"user_id": user_id, "total_likes": count, "unread_likes": count, "last_like_id": last_like_id, "last_read_id": 0}
+        for user_id, (count, last_like_id) in counts.items()
+    ]
 
-def create_match(db: Session, user_id_from: int, user_id_to: int, is_like: bool) -> Match:
-    """Creates a new Match record in the database."""
-    existing_match = db.exec(
-        select(Match).where(Match.user_id_from == user_id_from, Match.user_id_to == user_id_to)
-    ).first()
-    if existing_match:
-        return existing_match
+def mark_likes_read_statement(user_id: int, up_to_match_id: int):
+    """
+    Marks the user's likes up to `up_to_match_id` (at most the newest like) as read. The unread
+    counter drops by the likes in between, counted over the (user_id_to, id) index range.
+    """
+    read_up_to = func.min(up_to_match_id, LikeInbox.last_like_id)
+    newly_read = (
+        select(func.count())
+        .select_from(Match)
+        .where(
+            Match.user_id_to == user_id,
+            Match.is_like == True,
+            Match.id > LikeInbox.last_read_id,
+            Match.id <= read_up_to,
+        )
+        .scalar_subquery()
+    )
+    return (
+        update(LikeInbox)
+        .where(LikeInbox.user_id == user_id, LikeInbox.last_read_id < read_up_to)
+        .values(unread_likes=LikeInbox.unread_likes - newly_read, last_read_id=read_up_to)
+    )
+
+def record_swipe_in_memory(user_id_from: int, user_id_to: int) -> None:
+    """Keeps the in-memory discover structures in sync with a recorded swipe."""
+    candidate_index.record_swipe(user_id_from, user_id_to)
+    deck_store.discard(user_id_from, user_id_to)
 
-    match = Match(user_id_from=user_id_from, user_id_to=user_id_to, is_like=is_like)
-    db.add(match)
+def swipe(db: Session, user_id_from: int, user_id_to: int, is_like: bool) -> Optional[SwipeResult]:
+    """
+    Records a swipe and detects a mutual like in a single transaction with two statements;
+    a mutual like adds one that stores the `MutualMatch`, a new like one that updates the
+    liked user's `LikeInbox` counters.
+    The first swipe on a user wins; repeating it returns the stored result.
+    Returns None if the target user does not exist.
+    """
+    connection = db.connection()
+    inserted = connection.execute(swipe_insert_statement(user_id_from, user_id_to, is_like)).rowcount == 1
+    result = swipe_result_from_row(connection.execute(swipe_result_statement(user_id_from, user_id_to)).first())
+    if result is not None and result.is_mutual:
+        connection.execute(mutual_match_insert_statement(user_id_from, user_id_to))
+    if inserted and result is not None and result.is_like:
+        connection.execute(like_inbox_upsert_statement(), like_inbox_rows([(result.match_id, user_id_to)]))
     db.commit()
-    db.refresh(match)
-    return match
+    if result is not None:
+        record_swipe_in_memory(user_id_from, user_id_to)
+    return result
 
 def get_users_who_liked_me(db: Session, current_user_id: int) -> List[User]:
     """Returns a list of users who have liked the current user."""
@@ -116,4 +319,52 @@ def get_users_i_liked(db: Session, current_user_id: int) -> List[User]:
     if not user_ids:
         return []
 
-    return db.exec(select(User).where(User.id.in_(user_ids))).all() # type: ignore
\ No newline at end of file
+    return db.exec(select(User).where(User.id.in_(user_ids))).all() # type: ignore
+
+def backfill_mutual_matches(db: Session, batch_size: int = 50_000) -> int:
+    """
+    Creates the missing `MutualMatch` rows for mutual likes recorded in `Match`.
+    Walks the swipes in keyset-paginated chunks of `batch_size` ids, so every statement
+    and transaction covers a bounded slice of the table, commits after each chunk and
+    returns the number of inserted pairs. Safe to run repeatedly and to resume.
+    """
+    forward, backward = aliased(Match), aliased(Match)
+    inserted = 0
+    last_id = 0
+    while True:
+        # The last id of the next chunk, read from the primary key; None for the final chunk
+        upper_id = db.exec(
+            select(Match.id).where(Match.id > last_id).order_by(Match.id).offset(batch_size - 1).limit(1)
+        ).first()
+        in_chunk = [forward.id > last_id]
+        if upper_id is not None:
+            in_chunk.append(forward.id <= upper_id)
+        pairs = (
+            select(
+                forward.user_id_from,
+                forward.user_id_to,
+                func.max(forward.created_at, backward.created_at),
+            )
+            .join(backward, and_(
+                backward.user_id_from == forward.user_id_to,
+                backward.user_id_to == forward.user_id_from,
+            ))
+            .where(
+                *in_chunk,
+                forward.user_id_from < forward.user_id_to,
+                forward.is_like == True,
+                backward.is_like == True,
+            )
+            .order_by(func.max(forward.created_at, backward.created_at))
+        )
+        statement = (
+            sqlite_insert(MutualMatch)
+            .from_select(["user_id_low", "user_id_high", "created_at"], pairs)
+            .on_conflict_do_nothing(index_elements=["user_id_low", "user_id_high"])
+        )
+        inserted += db.connection().execute(statement).rowcount
+        db.commit()
+        if upper_id is None:
+            break
+        last_id = upper_id
+    return inserted
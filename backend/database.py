@@ -1,20 +1,57 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
 from sqlmodel import create_engine, Session, SQLModel, select
-from typing import Generator
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import delete, insert, inspect, text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+from typing import AsyncGenerator, AsyncIterator, Generator
 
 # Wichtig: Importiere die Modelle, damit SQLModel sie "sieht",
 # bevor `create_all` aufgerufen wird.
 # noinspection PyUnresolvedReferences
 # pylint: disable=import-error
-from models import ZodiacSign, ZodiacCompatibility  # type: ignore
+from models import ZodiacSign, ZodiacCompatibility, Match, LikeInbox  # type: ignore
+from storage_profiles import get_storage_profile, apply_storage_profile
+from compatibility import compatibility_matrix
+# Registriert außerdem die ORM-Events, die Änderungen für die anderen Worker-Prozesse protokollieren
+from cache_coherence import TOPIC_COMPATIBILITY, publish_invalidation
+from metrics import instrument_engine
+from query_profiler import install_query_profiler
 
 
 # NOTE: Comments are in German as per DEVELOPMENT_GUIDELINES.md
 
-# Die SQLite Datenbank-URL
-DATABASE_URL = "sqlite:///./astrodate.db"
+# Pfad zur SQLite-Datei; kann z.B. für Benchmarks per Umgebungsvariable umgebogen werden
+DATABASE_FILE = os.environ.get("ASTRODATE_DB_FILE", "./astrodate.db")
+
+# Die SQLite Datenbank-URLs (synchron für Skripte, asynchron für die API)
+DATABASE_URL = f"sqlite:///{DATABASE_FILE}"
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DATABASE_FILE}"
+
+# Speicherprofil (Journal-Modus, Pragmas, Pool-Größe); auswählbar über ASTRODATE_DB_PROFILE
+storage_profile = get_storage_profile()
 
 # Erstelle die SQLAlchemy Engine
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, **storage_profile.pool_options())
+apply_storage_profile(engine, storage_profile)
+
+# Asynchrone Engine für die Request-Pfade: SQLite-I/O blockiert so keinen Threadpool-Slot
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **storage_profile.pool_options())
+apply_storage_profile(async_engine.sync_engine, storage_profile)
+
+# SQLite erlaubt nur einen Schreiber. Schreibtransaktionen der API warten deshalb hier in der
+# Event-Loop aufeinander, statt mit bis zu `pool_size + max_overflow` Verbindungen im Busy-Handler
+# von SQLite um die Schreibsperre zu kreiseln; diese hält eine Transaktion über mehrere awaits.
+async_write_lock = asyncio.Lock()
+
+# Ausführungszeit jeder SQL-Anweisung für /metrics erfassen
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+# Anweisungen pro Request zählen (N+1-Erkennung, Query-Budgets) und langsame Queries protokollieren
+install_query_profiler(engine)
+install_query_profiler(async_engine.sync_engine)
 
 def create_db_and_tables():
     """
@@ -23,6 +60,43 @@ def create_db_and_tables():
     """
     SQLModel.metadata.create_all(engine)
 
+def apply_schema_migrations():
+    """
+    Bringt eine bestehende Datenbank auf den aktuellen Stand des Schemas.
+    `create_all` legt nur fehlende Tabellen an; Indizes, die später zu bestehenden Tabellen
+    hinzugekommen sind, werden hier nachgezogen. Die Funktion ist idempotent.
+    """
+    with engine.begin() as connection:
+        # Doppelte Swipes (aus der Zeit vor dem Unique-Index) einmalig entfernen, der älteste gewinnt;
+        # der volle Scan läuft nur, solange der Index noch fehlt, nicht bei jedem Start
+        if not inspect(connection).has_index("match", "ux_match_user_id_from_user_id_to"):
+            connection.execute(text(
+                'DELETE FROM "match" WHERE id NOT IN '
+                '(SELECT MIN(id) FROM "match" GROUP BY user_id_from, user_id_to)'
+            ))
+        for table in SQLModel.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+        # Like-Zähler einmalig aus den vorhandenen Likes aufbauen (leere Tabelle = gerade angelegt)
+        if connection.execute(text("SELECT NOT EXISTS (SELECT 1 FROM likeinbox)")).scalar():
+            rebuild_like_inboxes(connection)
+
+def rebuild_like_inboxes(connection) -> int:
+    """
+    Berechnet die LikeInbox-Zähler aller Benutzer aus der Match-Tabelle neu, z.B. nach
+    Bulk-Inserts, die an `swipe` vorbeigehen. Benutzer ohne Zähler-Zeile gelten als
+    gelesen; bei bestehenden Zeilen bleibt die Lesemarke erhalten.
+    """
+    return connection.execute(text(
+        'INSERT INTO likeinbox (user_id, total_likes, unread_likes, last_like_id, last_read_id) '
+        'SELECT user_id_to, COUNT(*), 0, MAX(id), MAX(id) FROM "match" WHERE is_like GROUP BY user_id_to '
+        'ON CONFLICT (user_id) DO UPDATE SET '
+        'total_likes = excluded.total_likes, '
+        'last_like_id = excluded.last_like_id, '
+        'unread_likes = (SELECT COUNT(*) FROM "match" '
+        'WHERE user_id_to = likeinbox.user_id AND is_like AND id > likeinbox.last_read_id)'
+    )).rowcount
+
 def seed_zodiac_signs():
     """
     Füllt die ZodiacSign-Tabelle mit den 12 westlichen Tierkreiszeichen und ihren Datumsgrenzen,
@@ -54,69 +128,81 @@ def seed_zodiac_signs():
             session.commit()
             print("ZodiacSign-Tabelle erfolgreich gefüllt.")
 
+# Kompatibilitätsdaten basierend auf deutschen Namen
+ZODIAC_COMPATIBILITY = {
+    "Widder": ["Löwe", "Schütze", "Zwillinge", "Waage", "Wassermann"],
+    "Stier": ["Jungfrau", "Steinbock", "Krebs", "Skorpion", "Fische"],
+    "Zwillinge": ["Waage", "Wassermann", "Widder", "Löwe", "Schütze"],
+    "Krebs": ["Skorpion", "Fische", "Stier", "Jungfrau", "Steinbock"],
+    "Löwe": ["Widder", "Schütze", "Zwillinge", "Waage", "Wassermann"],
+    "Jungfrau": ["Stier", "Steinbock", "Krebs", "Skorpion", "Fische"],
+    "Waage": ["Zwillinge", "Wassermann", "Widder", "Löwe", "Schütze"],
+    "Skorpion": ["Krebs", "Fische", "Stier", "Jungfrau", "Steinbock"],
+    "Schütze": ["Widder", "Löwe", "Zwillinge", "Waage", "Wassermann"],
+    "Steinbock": ["Stier", "Jungfrau", "Krebs", "Skorpion", "Fische"],
+    "Wassermann": ["Zwillinge", "Waage", "Widder", "Löwe", "Schütze"],
+    "Fische": ["Krebs", "Skorpion", "Stier", "Jungfrau", "Steinbock"],
+}
+
 def seed_zodiac_compatibility():
     """
-    Füllt die ZodiacCompatibility-Tabelle mit den Kompatibilitätsdaten unter Verwendung von Fremdschlüsseln.
-    Die Tabelle wird bei jedem Start geleert und neu gefüllt, um Konsistenz zu gewährleisten.
+    Gleicht die ZodiacCompatibility-Tabelle mit `ZODIAC_COMPATIBILITY` ab.
     Jede Kompatibilität wird in beide Richtungen gespeichert (bidirektional).
+    Es werden nur fehlende Paare eingefügt und veraltete bzw. doppelte Zeilen gelöscht,
+    jeweils als ein Bulk-Statement; stimmt die Tabelle bereits, wird nichts geschrieben.
     """
     with Session(engine) as session:
-        # 1. Vorhandene Einträge löschen
-        existing_entries = session.exec(select(ZodiacCompatibility)).all()
-        if existing_entries:
-            print("Lösche vorhandene Kompatibilitätseinträge...")
-            for entry in existing_entries:
-                session.delete(entry)
-            session.commit()
-        
-        print("Fülle die ZodiacCompatibility-Tabelle mit den Kompatibilitätsdaten...")
-
-        # 2. Alle Sternzeichen abrufen, um eine Namens-zu-ID-Zuordnung zu erstellen
-        all_signs = session.exec(select(ZodiacSign)).all()
-        if not all_signs:
+        # 1. Alle Sternzeichen abrufen, um eine Namens-zu-ID-Zuordnung zu erstellen
+        signs_by_german_name = dict(session.exec(select(ZodiacSign.german_name, ZodiacSign.id)).all())
+        if not signs_by_german_name:
             print("Warnung: ZodiacSign-Tabelle ist leer. Überspringe das Seeding der Kompatibilität.")
             return
-            
-        signs_by_german_name = {sign.german_name: sign.id for sign in all_signs}
-
-        # 3. Kompatibilitätsdaten basierend auf deutschen Namen
-        compatibility_data = {
-            "Widder": ["Löwe", "Schütze", "Zwillinge", "Waage", "Wassermann"],
-            "Stier": ["Jungfrau", "Steinbock", "Krebs", "Skorpion", "Fische"],
-            "Zwillinge": ["Waage", "Wassermann", "Widder", "Löwe", "Schütze"],
-            "Krebs": ["Skorpion", "Fische", "Stier", "Jungfrau", "Steinbock"],
-            "Löwe": ["Widder", "Schütze", "Zwillinge", "Waage", "Wassermann"],
-            "Jungfrau": ["Stier", "Steinbock", "Krebs", "Skorpion", "Fische"],
-            "Waage": ["Zwillinge", "Wassermann", "Widder", "Löwe", "Schütze"],
-            "Skorpion": ["Krebs", "Fische", "Stier", "Jungfrau", "Steinbock"],
-            "Schütze": ["Widder", "Löwe", "Zwillinge", "Waage", "Wassermann"],
-            "Steinbock": ["Stier", "Jungfrau", "Krebs", "Skorpion", "Fische"],
-            "Wassermann": ["Zwillinge", "Waage", "Widder", "Löwe", "Schütze"],
-            "Fische": ["Krebs", "Skorpion", "Stier", "Jungfrau", "Steinbock"],
-        }
-        
-        # 4. Kompatibilitätseinträge mit IDs erstellen
-        compatibility_entries = []
-        seen_pairs = set()
 
-        for sign_1_name, compatible_signs_names in compatibility_data.items():
+        # 2. Soll-Zustand als Menge von (sign_1_id, sign_2_id)-Paaren, beide Richtungen
+        wanted_pairs = set()
+        for sign_1_name, compatible_signs_names in ZODIAC_COMPATIBILITY.items():
             for sign_2_name in compatible_signs_names:
                 sign_1_id = signs_by_german_name.get(sign_1_name)
                 sign_2_id = signs_by_german_name.get(sign_2_name)
-
                 if sign_1_id is None or sign_2_id is None:
                     continue
+                wanted_pairs.add((sign_1_id, sign_2_id))
+                wanted_pairs.add((sign_2_id, sign_1_id))
 
-                pair = tuple(sorted((sign_1_id, sign_2_id)))
-                if pair not in seen_pairs:
-                    seen_pairs.add(pair)
-                    # Fügt beide Richtungen hinzu, um die Abfrage zu vereinfachen
-                    compatibility_entries.append(ZodiacCompatibility(sign_1_id=sign_1_id, sign_2_id=sign_2_id))
-                    compatibility_entries.append(ZodiacCompatibility(sign_1_id=sign_2_id, sign_2_id=sign_1_id))
-        
-        session.add_all(compatibility_entries)
+        # 3. Ist-Zustand lesen; veraltete Paare und Duplikate werden zum Löschen vorgemerkt
+        existing_pairs = set()
+        stale_ids = []
+        rows = session.exec(select(ZodiacCompatibility.id, ZodiacCompatibility.sign_1_id, ZodiacCompatibility.sign_2_id)).all()
+        for entry_id, sign_1_id, sign_2_id in rows:
+            pair = (sign_1_id, sign_2_id)
+            if pair in wanted_pairs and pair not in existing_pairs:
+                existing_pairs.add(pair)
+            else:
+                stale_ids.append(entry_id)
+        missing_pairs = sorted(wanted_pairs - existing_pairs)
+
+        if not stale_ids and not missing_pairs:
+            print(f"ZodiacCompatibility-Tabelle ist aktuell ({len(existing_pairs)} Einträge).")
+            return
+
+        # 4. Differenz in einer Transaktion anwenden
+        connection = session.connection()
+        if stale_ids:
+            connection.execute(delete(ZodiacCompatibility).where(ZodiacCompatibility.id.in_(stale_ids)))  # type: ignore
+        if missing_pairs:
+            connection.execute(
+                insert(ZodiacCompatibility),
+                [{"sign_1_id": sign_1_id, "sign_2_id": sign_2_id} for sign_1_id, sign_2_id in missing_pairs],
+            )
+        # Core-Statements lösen keine ORM-Events aus: die anderen Worker per Änderungsprotokoll
+        # benachrichtigen und die eigene kompilierte Matrix selbst verwerfen
+        publish_invalidation(connection, TOPIC_COMPATIBILITY)
         session.commit()
-        print(f"ZodiacCompatibility-Tabelle erfolgreich gefüllt mit {len(compatibility_entries)} Einträgen.")
+        compatibility_matrix.invalidate()
+        print(
+            f"ZodiacCompatibility-Tabelle abgeglichen: {len(missing_pairs)} eingefügt, "
+            f"{len(stale_ids)} gelöscht, {len(wanted_pairs)} Einträge insgesamt."
+        )
 
 def get_session() -> Generator[Session, None, None]:
     """
@@ -125,3 +211,26 @@ def get_session() -> Generator[Session, None, None]:
     """
     with Session(engine) as session:
         yield session
+
+@asynccontextmanager
+async def write_transaction(session: AsyncSession) -> AsyncIterator[AsyncConnection]:
+    """
+    Schreibtransaktion auf einer asynchronen Session: wartet auf `async_write_lock`, liefert
+    die Verbindung der Session und committet am Ende. Bei einem Fehler wird noch unter der
+    Sperre zurückgerollt, damit keine offene Transaktion die Schreibsperre von SQLite behält.
+    """
+    async with async_write_lock:
+        try:
+            yield await session.connection()
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            raise
+
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Stellt eine asynchrone Datenbank-Session für `async def`-Endpunkte bereit.
+    `expire_on_commit=False`, damit Objekte nach dem Commit ohne erneutes Laden lesbar bleiben.
+    """
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
@@ -0,0 +1,173 @@
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+from pagination import InvalidCursorError, decode_cursor, encode_cursor
+
+# Number of candidates drawn when a deck is built or refilled
+DECK_SIZE = 50
+# Seconds after which a deck is dropped and rebuilt from scratch
+DECK_TTL_SECONDS = 300
+# A background refill is requested once fewer candidates than this are left
+DECK_REFILL_THRESHOLD = 15
+# Number of users whose deck is kept in memory; the oldest deck is evicted first
+DECK_STORE_SIZE = int(os.environ.get("ASTRODATE_DECK_STORE_SIZE", "20000"))
+
+
+class _Deck:
+    """
+    A shuffled list of candidate ids for one user.
+    Positions are absolute: `base` is the position of `user_ids[0]`, so dropping
+    consumed entries from the front does not invalidate cursors. `handed_out` remembers
+    the consumed ids so a refill never deals the same card twice in one generation.
+    """
+    __slots__ = ("generation", "user_ids", "base", "created_at", "refilling", "handed_out")
+
+    def __init__(self, generation: int, user_ids: List[int]) -> None:
+        self.generation = generation
+        self.user_ids = user_ids
+        self.base = 0
+        self.created_at = time.monotonic()
+        self.refilling = False
+        self.handed_out: set[int] = set()
+
+
+class DeckStore:
+    """
+    Process-local cache of pre-shuffled discover decks, keyed by user id.
+    Decks expire after `ttl_seconds`; pages are handed out through opaque cursors.
+    Decks are kept in creation order, so storing a new deck sweeps expired ones from the
+    front and evicts the oldest while more than `max_size` users have a deck.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = DECK_TTL_SECONDS,
+        refill_threshold: int = DECK_REFILL_THRESHOLD,
+        max_size: int = DECK_STORE_SIZE,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.refill_threshold = refill_threshold
+        self.max_size = max(1, max_size)
+        self._lock = threading.Lock()
+        self._decks: "OrderedDict[int, _Deck]" = OrderedDict()
+        self._generations = itertools.count(1)
+
+    def _get_live(self, user_id: int) -> Optional[_Deck]:
+        deck = self._decks.get(user_id)
+        if deck is not None and time.monotonic() - deck.created_at > self.ttl_seconds:
+            del self._decks[user_id]
+            return None
+        return deck
+
+    def has_deck(self, user_id: int) -> bool:
+        with self._lock:
+            return self._get_live(user_id) is not None
+
+    def replace(self, user_id: int, user_ids: List[int]) -> None:
+        """Stores a new deck for the user; cursors of the previous deck restart at its head."""
+        with self._lock:
+            self._decks.pop(user_id, None)
+            self._decks[user_id] = _Deck(next(self._generations), list(user_ids))
+            self._sweep()
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        while self._decks:
+            oldest = next(iter(self._decks.values()))
+            if len(self._decks) <= self.max_size and now - oldest.created_at <= self.ttl_seconds:
+                return
+            self._decks.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._decks)
+
+    def take(
+        self,
+        user_id: int,
+        cursor: Optional[str],
+        limit: int,
+        is_eligible: Callable[[int], bool],
+    ) -> Tuple[List[int], Optional[str], int]:
+        """
+        Hands out up to `limit` eligible candidate ids starting at `cursor`.
+        Returns the ids, the cursor for the next page and the number of entries left.
+        Raises InvalidCursorError for malformed cursors.
+        """
+        position = None
+        generation = None
+        if cursor:
+            generation, position = decode_cursor(cursor, 2)
+
+        with self._lock:
+            deck = self._get_live(user_id)
+            if deck is None:
+                return [], None, 0
+
+            if generation != deck.generation or position is None:
+                position = deck.base
+            position = min(max(position, deck.base), deck.base + len(deck.user_ids))
+
+            page: List[int] = []
+            index = position - deck.base
+            while index < len(deck.user_ids) and len(page) < limit:
+                candidate_id = deck.user_ids[index]
+                index += 1
+                if is_eligible(candidate_id):
+                    page.append(candidate_id)
+
+            # Everything up to the end of the handed out page is consumed and can be dropped
+            deck.handed_out.update(deck.user_ids[:index])
+            del deck.user_ids[:index]
+            deck.base += index
+            return page, encode_cursor(deck.generation, deck.base), len(deck.user_ids)
+
+    def needs_refill(self, user_id: int) -> bool:
+        """Returns True (once) if the deck runs low and no refill is pending."""
+        with self._lock:
+            deck = self._get_live(user_id)
+            if deck is None or deck.refilling or len(deck.user_ids) >= self.refill_threshold:
+                return False
+            deck.refilling = True
+            return True
+
+    def cancel_refill(self, user_id: int) -> None:
+        """Clears the refill flag without adding candidates, e.g. after a failed refill."""
+        with self._lock:
+            deck = self._decks.get(user_id)
+            if deck is not None:
+                deck.refilling = False
+
+    def known_ids(self, user_id: int) -> set[int]:
+        """Returns every id that is queued in or was already dealt from the user's deck."""
+        with self._lock:
+            deck = self._get_live(user_id)
+            return set(deck.user_ids) | deck.handed_out if deck else set()
+
+    def extend(self, user_id: int, user_ids: List[int]) -> None:
+        """Appends freshly drawn candidates to the user's deck and clears the refill flag."""
+        with self._lock:
+            deck = self._get_live(user_id)
+            if deck is None:
+                return
+            known = set(deck.user_ids)
+            deck.user_ids.extend(candidate_id for candidate_id in user_ids if candidate_id not in known)
+            deck.refilling = False
+
+    def discard(self, user_id: int, swiped_user_id: int) -> None:
+        """Drops a candidate from the user's deck after it was swiped elsewhere."""
+        with self._lock:
+            deck = self._decks.get(user_id)
+            if deck is not None and swiped_user_id in deck.user_ids:
+                deck.user_ids.remove(swiped_user_id)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._decks.pop(user_id, None)
+
+
+# Shared instance used by the CRUD layer and the users router
+deck_store = DeckStore()
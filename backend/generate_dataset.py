@@ -0,0 +1,262 @@
+"""
+Erzeugt reproduzierbare synthetische Testdaten für Lasttests von /discover und /swipe.
+
+Es werden `--users` Benutzer und pro Benutzer im Mittel `--swipes` Swipes auf kompatible
+Benutzer erzeugt (Anteil Likes über `--like-ratio`, Anteil erwiderter Likes über
+`--reciprocity`). Die Daten werden in Blöcken zu `--chunk-size` Benutzern parallel in
+`--workers` Prozessen generiert. Jeder Block hat seinen eigenen, aus `--seed` und der
+Blocknummer abgeleiteten Zufallsgenerator und die Blöcke werden in fester Reihenfolge
+geschrieben. Gleicher Seed ergibt daher unabhängig von der Prozessanzahl denselben
+Datenbestand.
+
+Geschrieben wird über Core-Bulk-Inserts (executemany, eine Transaktion pro Block). Alle
+synthetischen Benutzer teilen sich ein Passwort, das nur einmal gehasht wird.
+
+Aufruf aus dem `backend`-Verzeichnis:
+    python generate_dataset.py --users 100000 --swipes 50
+    ASTRODATE_DB_FILE=./loadtest.db ASTRODATE_DB_PROFILE=bulk-load \\
+        python generate_dataset.py --users 10000000 --workers 8 --seed 7
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+
+from database import (
+    engine, create_db_and_tables, apply_schema_migrations, rebuild_like_inboxes, seed_zodiac_signs, seed_zodiac_compatibility
+)
+from models import User, Match
+from hashing import password_hasher
+from zodiac import zodiac_table
+from compatibility import compatibility_matrix
+from crud import backfill_mutual_matches
+
+# Feste Bezugszeitpunkte, damit Geburtsdaten und Zeitstempel nicht vom Aufrufzeitpunkt abhängen
+REFERENCE_DATE = date(2025, 1, 1)
+SWIPE_PERIOD_START = datetime(2024, 1, 1)
+SWIPE_PERIOD_SECONDS = 365 * 24 * 3600
+# Anzahl vorab erzeugter Bio-Texte, aus denen die Benutzer zufällig wählen
+BIO_POOL_SIZE = 1_000
+# Versuche pro Swipe, einen kompatiblen, noch nicht gewählten Benutzer zu ziehen
+MAX_TARGET_ATTEMPTS = 20
+
+# Vom Worker-Initializer gesetzte Daten (ein Mal pro Prozess statt pro Block übertragen)
+_worker_state: Dict[str, object] = {}
+
+
+def _init_user_worker(bios: List[str], image_files: List[str]) -> None:
+    _worker_state["bios"] = bios
+    _worker_state["image_files"] = image_files
+
+
+def _init_swipe_worker(signs: bytes, masks: List[int]) -> None:
+    _worker_state["signs"] = signs
+    _worker_state["masks"] = masks
+
+
+def generate_user_chunk(seed: int, chunk: int, start: int, stop: int, base_id: int, hashed_password: str) -> List[Dict]:
+    """Erzeugt die Benutzerzeilen mit den Indizes start..stop-1 (ohne Sternzeichen)."""
+    rng = random.Random(f"{seed}-users-{chunk}")
+    bios: List[str] = _worker_state["bios"]  # type: ignore
+    image_files: List[str] = _worker_state["image_files"]  # type: ignore
+    youngest, oldest = 18 * 365, 65 * 365
+    return [
+        {
+            "id": base_id + index,
+            "email": f"synth{seed}-{index}@astrodate.test",
+            "hashed_password": hashed_password,
+            "birth_date": REFERENCE_DATE - timedelta(days=rng.randint(youngest, oldest)),
+            "bio": rng.choice(bios),
+            "image_filename": rng.choice(image_files) if image_files else None,
+        }
+        for index in range(start, stop)
+    ]
+
+
+def generate_swipe_chunk(
+    seed: int, chunk: int, start: int, stop: int, base_id: int,
+    swipes_per_user: int, like_ratio: float, reciprocity: float,
+) -> List[Dict]:
+    """
+    Erzeugt die Swipes der Benutzer start..stop-1. Ziele werden gleichverteilt gezogen und
+    verworfen, wenn ihr Sternzeichen nicht kompatibel ist (so wie /discover nur kompatible
+    Benutzer zeigt). Ein Like wird mit Wahrscheinlichkeit `reciprocity` erwidert.
+    """
+    rng = random.Random(f"{seed}-swipes-{chunk}")
+    signs: bytes = _worker_state["signs"]  # type: ignore
+    masks: List[int] = _worker_state["masks"]  # type: ignore
+    total = len(signs)
+    rows: List[Dict] = []
+    for index in range(start, stop):
+        mask = masks[signs[index]] if signs[index] < len(masks) else 0
+        if not mask:
+            continue
+        # Anzahl Swipes streut um den Mittelwert, damit es aktive und passive Benutzer gibt
+        count = min(int(rng.expovariate(1 / swipes_per_user)) if swipes_per_user else 0, total - 1)
+        chosen = set()
+        for _ in range(count):
+            for _ in range(MAX_TARGET_ATTEMPTS):
+                target = rng.randrange(total)
+                if target != index and target not in chosen and mask >> signs[target] & 1:
+                    break
+            else:
+                continue
+            chosen.add(target)
+            is_like = rng.random() < like_ratio
+            created_at = SWIPE_PERIOD_START + timedelta(seconds=rng.randrange(SWIPE_PERIOD_SECONDS))
+            rows.append({"user_id_from": base_id + index, "user_id_to": base_id + target, "is_like": is_like, "created_at": created_at})
+            if is_like and rng.random() < reciprocity:
+                rows.append({
+                    "user_id_from": base_id + target, "user_id_to": base_id + index, "is_like": True,
+                    "created_at": created_at + timedelta(seconds=rng.randrange(7 * 24 * 3600)),
+                })
+    return rows
+
+
+class ProgressBar:
+    """Einfacher Fortschrittsbalken auf stderr (ohne zusätzliche Abhängigkeit)."""
+
+    def __init__(self, label: str, total: int, width: int = 30) -> None:
+        self.label = label
+        self.total = max(total, 1)
+        self.width = width
+        self.done = 0
+        self.started = time.perf_counter()
+
+    def advance(self, amount: int) -> None:
+        self.done += amount
+        filled = int(self.width * self.done / self.total)
+        rate = self.done / max(time.perf_counter() - self.started, 1e-9)
+        sys.stderr.write(f"\r{self.label:<8} [{'#' * filled}{'.' * (self.width - filled)}] {self.done}/{self.total} ({rate:.0f}/s)")
+        sys.stderr.flush()
+
+    def close(self) -> None:
+        sys.stderr.write("\n")
+
+
+def build_bio_pool(seed: int) -> List[str]:
+    # Faker nur hier laden; die Worker bekommen die fertigen Texte
+    from faker import Faker
+    fake = Faker("de_DE")
+    fake.seed_instance(seed)
+    return [fake.paragraph(nb_sentences=3) for _ in range(BIO_POOL_SIZE)]
+
+
+def chunk_bounds(total: int, chunk_size: int) -> List[Tuple[int, int, int]]:
+    return [(chunk, start, min(start + chunk_size, total)) for chunk, start in enumerate(range(0, total, chunk_size))]
+
+
+def _pool(workers: int, initializer, initargs: Sequence) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=initializer, initargs=tuple(initargs))
+
+
+def ordered_results(pool: ProcessPoolExecutor, fn, jobs: Sequence[Tuple], window: int):
+    """
+    Liefert die Ergebnisse von `fn(*job)` in Auftragsreihenfolge. Es sind höchstens `window`
+    Aufträge gleichzeitig unterwegs, damit schnelle Worker den Speicher nicht volllaufen lassen.
+    """
+    pending = deque()
+    for job in jobs:
+        pending.append(pool.submit(fn, *job))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def generate(args: argparse.Namespace) -> None:
+    started = time.perf_counter()
+    with Session(engine) as session:
+        zodiac_table.ensure_built(session)
+        compatibility_matrix.ensure_built(session)
+        if session.exec(select(User.id).where(User.email == f"synth{args.seed}-0@astrodate.test")).first():
+            raise SystemExit(f"Datensatz mit Seed {args.seed} existiert bereits; anderen Seed wählen.")
+        base_id = (session.exec(select(func.max(User.id))).first() or 0) + 1
+
+    hashed_password = password_hasher.hash_many([args.password], share_identical=True)[0]
+    image_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "userImages")
+    image_files = sorted(name for name in os.listdir(image_directory) if name.endswith(".jpg")) if os.path.isdir(image_directory) else []
+    chunks = chunk_bounds(args.users, args.chunk_size)
+    signs = array("B", bytes(args.users))
+    window = args.workers * 2
+
+    # 1. Benutzer
+    progress = ProgressBar("Benutzer", args.users)
+    with _pool(args.workers, _init_user_worker, (build_bio_pool(args.seed), image_files)) as pool, Session(engine) as session:
+        jobs = [(args.seed, chunk, start, stop, base_id, hashed_password) for chunk, start, stop in chunks]
+        for (chunk, start, stop), rows in zip(chunks, ordered_results(pool, generate_user_chunk, jobs, window)):
+            sign_ids = zodiac_table.sign_ids_for_dates([row["birth_date"] for row in rows])
+            for offset, (row, sign_id) in enumerate(zip(rows, sign_ids)):
+                row["zodiac_sign_id"] = sign_id
+                signs[start + offset] = sign_id or 0
+            session.connection().execute(insert(User), rows)
+            session.commit()
+            progress.advance(len(rows))
+    progress.close()
+
+    # 2. Swipe-Graph; Blöcke werden in fester Reihenfolge geschrieben, damit doppelte Paare
+    # (Ziel hat schon selbst geswipt) immer gleich aufgelöst werden
+    swipes = 0
+    masks = [compatibility_matrix.mask(sign_id) for sign_id in range(max(signs, default=0) + 1)]
+    progress = ProgressBar("Swipes", args.users)
+    statement = sqlite_insert(Match).on_conflict_do_nothing(index_elements=["user_id_from", "user_id_to"])
+    with _pool(args.workers, _init_swipe_worker, (signs.tobytes(), masks)) as pool, Session(engine) as session:
+        jobs = [
+            (args.seed, chunk, start, stop, base_id, args.swipes, args.like_ratio, args.reciprocity)
+            for chunk, start, stop in chunks
+        ]
+        for (chunk, start, stop), rows in zip(chunks, ordered_results(pool, generate_swipe_chunk, jobs, window)):
+            if rows:
+                swipes += session.connection().execute(statement, rows).rowcount
+                session.commit()
+            progress.advance(stop - start)
+    progress.close()
+
+    # 3. Gegenseitige Matches aus den erwiderten Likes ableiten, Like-Zähler neu berechnen
+    with Session(engine) as session:
+        mutual_matches = backfill_mutual_matches(session)
+        rebuild_like_inboxes(session.connection())
+        session.commit()
+
+    elapsed = time.perf_counter() - started
+    print(f"{args.users} Benutzer, {swipes} Swipes und {mutual_matches} gegenseitige Matches in {elapsed:.1f}s erzeugt "
+          f"(IDs {base_id}..{base_id + args.users - 1}).")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Erzeugt reproduzierbare synthetische Benutzer und Swipes.")
+    parser.add_argument("--users", type=int, default=100_000, help="Anzahl Benutzer")
+    parser.add_argument("--swipes", type=int, default=20, help="Mittlere Anzahl Swipes pro Benutzer")
+    parser.add_argument("--like-ratio", type=float, default=0.5, help="Anteil der Swipes, die Likes sind")
+    parser.add_argument("--reciprocity", type=float, default=0.2, help="Wahrscheinlichkeit, dass ein Like erwidert wird")
+    parser.add_argument("--seed", type=int, default=42, help="Seed; gleicher Seed ergibt denselben Datenbestand")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Anzahl Generator-Prozesse")
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="Benutzer pro Block und Transaktion")
+    parser.add_argument("--password", default="password123", help="Gemeinsames Passwort aller synthetischen Benutzer")
+    args = parser.parse_args(argv)
+    args.chunk_size = max(1, args.chunk_size)
+
+    create_db_and_tables()
+    apply_schema_migrations()
+    seed_zodiac_signs()
+    seed_zodiac_compatibility()
+    try:
+        generate(args)
+    finally:
+        password_hasher.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Erzeugt alle Bildvarianten (thumb, card, full jeweils als JPEG und WebP) vorab, damit der
+erste Abruf eines Profilbilds nicht auf das Skalieren warten muss. Bereits vorhandene
+Varianten werden übersprungen, Varianten gelöschter oder ersetzter Originale entfernt; das
+Skript kann daher jederzeit erneut laufen. Hochgeladene Bilder im inhaltsadressierten Baum
+(`ab/cd/<hash>.ext`) werden ebenfalls erfasst.
+
+Aufruf aus dem `backend`-Verzeichnis:
+    python generate_image_variants.py
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from images import IMAGE_DIR, IMAGE_FORMATS, IMAGE_VARIANTS, ImageNotFoundError, image_store, source_filenames
+
+
+def render_all(filename: str) -> int:
+    """Erzeugt alle Varianten eines Bildes; liefert die Anzahl erzeugter Varianten."""
+    rendered = 0
+    for variant_name in IMAGE_VARIANTS:
+        for image_format in IMAGE_FORMATS:
+            try:
+                image_store.render_sync(filename, variant_name, image_format)
+                rendered += 1
+            except ImageNotFoundError:
+                print(f"Überspringe {filename}: kein lesbares Bild.")
+                return rendered
+    return rendered
+
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    # Varianten gelöschter oder ersetzter Originale zuerst entfernen
+    removed = image_store.prune(IMAGE_DIR)
+    if removed:
+        print(f"{removed} veraltete Varianten entfernt.")
+    filenames = sorted(source_filenames(IMAGE_DIR))
+    # Pillow gibt beim Skalieren und Kodieren den GIL frei, Threads reichen daher aus
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+        total = sum(pool.map(render_all, filenames))
+    print(f"{total} Varianten für {len(filenames)} Bilder bereit ({time.perf_counter() - started:.1f}s).")
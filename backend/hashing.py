@@ -0,0 +1,92 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from security import get_password_hash, verify_password
+from metrics import observe_password_operation
+
+# Number of worker processes doing bcrypt work
+HASHING_WORKERS = int(os.environ.get("ASTRODATE_HASHING_WORKERS", str(os.cpu_count() or 1)))
+# Maximum number of hashing jobs waiting or running before new ones are rejected
+HASHING_QUEUE_SIZE = int(os.environ.get("ASTRODATE_HASHING_QUEUE_SIZE", "64"))
+
+
+class HashingQueueFullError(RuntimeError):
+    """Raised when the hashing queue is full and the request should be retried later."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and verification in a process pool, so CPU-bound password work
+    neither blocks the event loop nor serializes behind the GIL.
+    The pool is started lazily and stopped with `shutdown`.
+    """
+
+    def __init__(self, workers: int = HASHING_WORKERS, queue_size: int = HASHING_QUEUE_SIZE) -> None:
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # "spawn" avoids forking a process that already runs event loop and aiosqlite threads
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+        return self._executor
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+    async def _submit(self, operation: str, fn, *args):
+        if self._pending >= self.queue_size:
+            raise HashingQueueFullError("Too many password operations in progress")
+        self._pending += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._pending -= 1
+            observe_password_operation(operation, time.perf_counter() - started)
+
+    async def hash(self, password: str) -> str:
+        """Hashes a plain password without blocking the event loop."""
+        return await self._submit("hash", get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Verifies a plain password against a hashed one without blocking the event loop."""
+        return await self._submit("verify", verify_password, plain_password, hashed_password)
+
+    def hash_many(self, passwords: List[str], share_identical: bool = False) -> List[str]:
+        """
+        Bulk-hashes passwords for seeding and imports (blocking), in parallel across the pool.
+        Every password gets its own salt. With `share_identical`, identical passwords are hashed
+        only once and share the resulting hash; only use it for synthetic users.
+        """
+        if share_identical:
+            distinct = list(dict.fromkeys(passwords))
+            hashes: Dict[str, str] = dict(zip(distinct, self._hash_all(distinct)))
+            return [hashes[password] for password in passwords]
+        return self._hash_all(passwords)
+
+    def _hash_all(self, passwords: List[str]) -> List[str]:
+        if len(passwords) <= 1:
+            return [get_password_hash(password) for password in passwords]
+        # Batch the jobs so large imports do not pay one pickling round trip per password
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self._get_executor().map(get_password_hash, passwords, chunksize=chunksize))
+
+# Shared instance used by the auth routes and the seeding scripts
+password_hasher = PasswordHasher()
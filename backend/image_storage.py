@@ -0,0 +1,134 @@
+import hashlib
+import os
+import uuid
+from typing import AsyncIterator, BinaryIO, List, NamedTuple, Optional
+
+from PIL import Image
+from starlette.concurrency import run_in_threadpool
+
+from images import IMAGE_DIR
+
+# Largest accepted upload in bytes
+MAX_UPLOAD_BYTES = int(os.environ.get("ASTRODATE_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+# Uploads are written here first and moved into the content-addressed tree once complete
+INCOMING_DIR = os.path.join(IMAGE_DIR, ".incoming")
+# Received chunks are collected into blocks of this size before one threadpool write
+WRITE_BLOCK_BYTES = 1024 * 1024
+
+# Magic numbers of the accepted formats and the extension they are stored with
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+)
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES."""
+
+
+class UnsupportedImageError(ValueError):
+    """Raised when an upload is not a readable JPEG, PNG or WebP image."""
+
+
+class StoredImage(NamedTuple):
+    filename: str  # relative to IMAGE_DIR, usable as `User.image_filename`
+    size: int
+    deduplicated: bool
+
+
+def _detect_extension(head: bytes) -> Optional[str]:
+    for signature, extension in _SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def content_addressed_name(digest: str, extension: str) -> str:
+    """Shards by the first two byte pairs of the hash: 65536 directories keep each one small."""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{extension}"
+
+
+def _verify_image(path: str) -> None:
+    try:
+        with Image.open(path) as image:
+            image.verify()
+    except (OSError, ValueError, SyntaxError) as error:
+        raise UnsupportedImageError("The upload is not a readable image.") from error
+
+
+def _open_incoming(path: str) -> BinaryIO:
+    os.makedirs(INCOMING_DIR, exist_ok=True)
+    return open(path, "wb")
+
+
+def _write_block(handle: BinaryIO, digest: "hashlib._Hash", data: bytes) -> None:
+    # Hashing large blocks releases the GIL, so it runs in the worker thread with the write
+    digest.update(data)
+    handle.write(data)
+
+
+def _remove_if_exists(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _finalize(temporary: str, filename: str) -> bool:
+    """Moves the upload into place; returns True if identical content was already stored."""
+    target = os.path.join(IMAGE_DIR, filename)
+    if os.path.exists(target):
+        os.remove(temporary)
+        return True
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    # Files are fsynced before the rename so a crash never leaves a truncated image under a valid hash
+    with open(temporary, "rb") as handle:
+        os.fsync(handle.fileno())
+    os.replace(temporary, target)
+    return False
+
+
+async def store_image_stream(chunks: AsyncIterator[bytes], max_bytes: int = MAX_UPLOAD_BYTES) -> StoredImage:
+    """
+    Streams an upload to disk chunk by chunk while hashing it, then stores it under its
+    SHA-256. Identical uploads share one file. All file I/O runs in the threadpool, in
+    blocks of WRITE_BLOCK_BYTES, so the event loop never waits on the disk. Raises
+    UploadTooLargeError or UnsupportedImageError; partial files are always removed.
+    """
+    temporary = os.path.join(INCOMING_DIR, f"{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    try:
+        handle = await run_in_threadpool(_open_incoming, temporary)
+        try:
+            buffered: List[bytes] = []
+            buffered_size = 0
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"Uploads are limited to {max_bytes} bytes.")
+                if len(head) < 12:
+                    head += chunk[:12 - len(head)]
+                buffered.append(chunk)
+                buffered_size += len(chunk)
+                if buffered_size >= WRITE_BLOCK_BYTES:
+                    await run_in_threadpool(_write_block, handle, digest, b"".join(buffered))
+                    buffered, buffered_size = [], 0
+            if buffered:
+                await run_in_threadpool(_write_block, handle, digest, b"".join(buffered))
+        finally:
+            await run_in_threadpool(handle.close)
+
+        extension = _detect_extension(head)
+        if extension is None:
+            raise UnsupportedImageError("Only JPEG, PNG and WebP images are accepted.")
+        await run_in_threadpool(_verify_image, temporary)
+
+        filename = content_addressed_name(digest.hexdigest(), extension)
+        deduplicated = await run_in_threadpool(_finalize, temporary, filename)
+        return StoredImage(filename=filename, size=size, deduplicated=deduplicated)
+    finally:
+        await run_in_threadpool(_remove_if_exists, temporary)
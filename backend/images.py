@@ -0,0 +1,261 @@
+import asyncio
+import hashlib
+import os
+import re
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+# Directory with the original profile images
+IMAGE_DIR = os.environ.get("ASTRODATE_IMAGE_DIR", "userImages")
+# Directory for generated variants; safe to delete, variants are regenerated on demand
+IMAGE_CACHE_DIR = os.environ.get("ASTRODATE_IMAGE_CACHE_DIR", os.path.join(IMAGE_DIR, ".variants"))
+# Content-addressed uploads never change under their name, so their responses may be cached forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Plain names (e.g. `12.jpg`) can be replaced in place: cache briefly, then revalidate with the ETag
+MUTABLE_CACHE_CONTROL = "public, max-age=300"
+
+# Plain names (e.g. `12.jpg`) or content-addressed uploads (`ab/cd/<sha256>.jpg`)
+_ALLOWED_FILENAME = re.compile(r"^(?:[0-9a-f]{2}/[0-9a-f]{2}/)?[A-Za-z0-9_-][A-Za-z0-9_.-]*\.(?:jpe?g|png|webp)$", re.IGNORECASE)
+_CONTENT_ADDRESSED_FILENAME = re.compile(r"^([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}\.(?:jpg|png|webp)$")
+# Version part of a cached variant's filename (source mtime and size in hex)
+_VERSION_TOKEN = re.compile(r"^[0-9a-f]+$")
+
+
+class ImageVariant(NamedTuple):
+    """A size class: the longer edge is scaled down to `max_edge` pixels."""
+    max_edge: int
+    jpeg_quality: int
+    webp_quality: int
+
+
+IMAGE_VARIANTS: Dict[str, ImageVariant] = {
+    "thumb": ImageVariant(max_edge=160, jpeg_quality=72, webp_quality=70),
+    "card": ImageVariant(max_edge=480, jpeg_quality=80, webp_quality=78),
+    "full": ImageVariant(max_edge=1024, jpeg_quality=85, webp_quality=82),
+}
+IMAGE_FORMATS = {"jpeg": "image/jpeg", "webp": "image/webp"}
+
+
+class ImageNotFoundError(LookupError):
+    """Raised for unknown, invalid or unreadable source images."""
+
+
+class RenderedVariant(NamedTuple):
+    path: str
+    etag: str
+    media_type: str
+
+
+def cache_control(filename: str) -> str:
+    """Cache-Control for a profile image: only hash-named files are immutable."""
+    return IMMUTABLE_CACHE_CONTROL if _CONTENT_ADDRESSED_FILENAME.match(filename) else MUTABLE_CACHE_CONTROL
+
+
+def source_filenames(image_dir: str = IMAGE_DIR) -> List[str]:
+    """
+    All original images relative to `image_dir`: plain names at the top level and
+    content-addressed uploads in `ab/cd/<hash>.ext`. Hidden directories such as `.variants`
+    and `.incoming` are skipped.
+    """
+    filenames = []
+    for directory, subdirectories, files in os.walk(image_dir):
+        subdirectories[:] = [name for name in subdirectories if not name.startswith(".")]
+        relative = os.path.relpath(directory, image_dir)
+        for name in files:
+            path = name if relative == "." else os.path.join(relative, name)
+            filenames.append(path.replace(os.sep, "/"))
+    return filenames
+
+
+def _source_path(filename: str) -> str:
+    if not _ALLOWED_FILENAME.match(filename):
+        raise ImageNotFoundError(filename)
+    path = os.path.join(IMAGE_DIR, filename)
+    if not os.path.isfile(path):
+        raise ImageNotFoundError(filename)
+    return path
+
+
+def _render(source: str, target: str, variant: ImageVariant, image_format: str) -> None:
+    """Resizes and recompresses one image; the result is written atomically."""
+    try:
+        with Image.open(source) as original:
+            image = ImageOps.exif_transpose(original).convert("RGB")
+    except (OSError, ValueError) as error:
+        raise ImageNotFoundError(source) from error
+    image.thumbnail((variant.max_edge, variant.max_edge), Image.LANCZOS)
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temporary = _temporary_path(target)
+    if image_format == "webp":
+        image.save(temporary, "WEBP", quality=variant.webp_quality, method=4)
+    else:
+        image.save(temporary, "JPEG", quality=variant.jpeg_quality, optimize=True, progressive=True)
+    # The ETag file goes first, so it exists whenever the variant does
+    _write_etag(target, _file_etag(temporary))
+    os.replace(temporary, target)
+    _remove_stale_versions(target)
+
+
+def _split_variant_name(name: str) -> Optional[Tuple[str, str, str]]:
+    """Splits `<stem>.<version>.<extension>` of a cached variant; None for other files."""
+    parts = name.rsplit(".", 2)
+    if len(parts) != 3 or not _VERSION_TOKEN.match(parts[1]) or parts[2] not in ("jpg", "webp"):
+        return None
+    return parts[0], parts[1], parts[2]
+
+
+def _remove_variant(path: str) -> None:
+    for stale in (path, _etag_path(path)):
+        try:
+            os.remove(stale)
+        except FileNotFoundError:
+            pass
+
+
+def _remove_stale_versions(target: str) -> None:
+    """Deletes the variants rendered from earlier versions of the same source image."""
+    directory, name = os.path.split(target)
+    parts = _split_variant_name(name)
+    if parts is None:
+        return
+    stem, version, extension = parts
+    for sibling in os.listdir(directory):
+        sibling_parts = _split_variant_name(sibling)
+        if sibling_parts is not None and sibling_parts[0] == stem and sibling_parts[2] == extension \
+                and sibling_parts[1] != version:
+            _remove_variant(os.path.join(directory, sibling))
+
+
+def _source_version(source: str) -> str:
+    """Changes whenever the source file is replaced; part of the cached variant's filename."""
+    stat = os.stat(source)
+    return f"{stat.st_mtime_ns:x}{stat.st_size:x}"
+
+
+def _temporary_path(path: str) -> str:
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def _file_etag(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(65536), b""):
+            digest.update(block)
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def _etag_path(target: str) -> str:
+    return f"{target}.etag"
+
+
+def _write_etag(target: str, etag: str) -> None:
+    """Stores a variant's ETag in a sidecar file next to it, written atomically."""
+    temporary = _temporary_path(_etag_path(target))
+    with open(temporary, "w", encoding="ascii") as handle:
+        handle.write(etag)
+    os.replace(temporary, _etag_path(target))
+
+
+def _read_etag(target: str) -> str:
+    """Reads a variant's ETag; variants cached without a sidecar get one on first use."""
+    try:
+        with open(_etag_path(target), encoding="ascii") as handle:
+            return handle.read()
+    except FileNotFoundError:
+        etag = _file_etag(target)
+        _write_etag(target, etag)
+        return etag
+
+
+class ImageVariantStore:
+    """
+    Produces and caches image variants on disk.
+
+    A cached variant's filename contains the source file's mtime and size, so replacing a
+    source never serves a stale variant; rendering the new version deletes the old ones, and
+    `prune` removes the variants of deleted sources. ETags are content hashes of the variant bytes
+    (strong validators), kept in an `.etag` sidecar file next to each cached variant so
+    memory does not grow with the number of variants. Concurrent first requests for the
+    same variant render it only once.
+    """
+
+    def __init__(self, cache_dir: str = IMAGE_CACHE_DIR) -> None:
+        self.cache_dir = cache_dir
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    def variant_path(self, filename: str, variant_name: str, image_format: str) -> Tuple[str, str]:
+        """Returns (source path, cache path) for a variant. Raises ImageNotFoundError."""
+        source = _source_path(filename)
+        stem = os.path.splitext(filename)[0]
+        extension = "webp" if image_format == "webp" else "jpg"
+        target = os.path.join(self.cache_dir, variant_name, f"{stem}.{_source_version(source)}.{extension}")
+        return source, target
+
+    def prune(self, image_dir: str = IMAGE_DIR) -> int:
+        """
+        Deletes cached variants whose source image was deleted or replaced since they were
+        rendered. Returns the number of removed variants.
+        """
+        current = set()
+        for filename in source_filenames(image_dir):
+            try:
+                current.add((os.path.splitext(filename)[0], _source_version(os.path.join(image_dir, filename))))
+            except FileNotFoundError:
+                continue
+        removed = 0
+        for variant_name in IMAGE_VARIANTS:
+            variant_dir = os.path.join(self.cache_dir, variant_name)
+            for directory, _subdirectories, files in os.walk(variant_dir):
+                relative = os.path.relpath(directory, variant_dir)
+                for name in files:
+                    parts = _split_variant_name(name)
+                    if parts is None:
+                        continue
+                    stem = parts[0] if relative == "." else os.path.join(relative, parts[0]).replace(os.sep, "/")
+                    if (stem, parts[1]) not in current:
+                        _remove_variant(os.path.join(directory, name))
+                        removed += 1
+        return removed
+
+    def render_sync(self, filename: str, variant_name: str, image_format: str) -> RenderedVariant:
+        """Blocking variant lookup/generation, used by the pre-generation script."""
+        source, target = self.variant_path(filename, variant_name, image_format)
+        if not os.path.exists(target):
+            _render(source, target, IMAGE_VARIANTS[variant_name], image_format)
+        return self._rendered(target, image_format)
+
+    async def get(self, filename: str, variant_name: str, image_format: str) -> RenderedVariant:
+        """Returns the cached variant, rendering it in a worker thread on first request."""
+        source, target = self.variant_path(filename, variant_name, image_format)
+        if os.path.exists(target):
+            return self._rendered(target, image_format)
+
+        pending = self._pending.get(target)
+        if pending is None:
+            pending = asyncio.get_running_loop().run_in_executor(
+                None, _render, source, target, IMAGE_VARIANTS[variant_name], image_format
+            )
+            self._pending[target] = pending
+            pending.add_done_callback(lambda _future: self._pending.pop(target, None))
+        await asyncio.shield(pending)
+        return self._rendered(target, image_format)
+
+    def _rendered(self, target: str, image_format: str) -> RenderedVariant:
+        return RenderedVariant(target, _read_etag(target), IMAGE_FORMATS[image_format])
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluates an If-None-Match header (weak comparison, as RFC 9110 requires for GET)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+# Shared instance used by the images router
+image_store = ImageVariantStore()
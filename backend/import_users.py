@@ -0,0 +1,231 @@
+"""
+Bulk-Import von Benutzern aus CSV- oder JSONL-Dateien.
+
+Die Eingabe wird zeilenweise gestreamt und gegen `UserCreate` validiert. Passwörter werden
+pro Batch parallel gehasht, die Sternzeichen über die vorberechnete Tabelle bestimmt und
+die Zeilen als ein executemany-INSERT pro Batch geschrieben (eine Transaktion pro Batch).
+Nach jedem Commit wird ein Checkpoint geschrieben; ein abgebrochener Import setzt beim
+nächsten Aufruf dort fort. Bereits vorhandene E-Mail-Adressen werden übersprungen, ein
+erneuter Lauf ist daher unschädlich.
+
+CSV-Dateien brauchen die Spalten email, password, birth_date (YYYY-MM-DD) und optional
+bio und image_filename; JSONL-Zeilen sind Objekte mit denselben Feldern.
+
+Aufruf aus dem `backend`-Verzeichnis:
+    python import_users.py members.csv
+    ASTRODATE_DB_PROFILE=bulk-load python import_users.py members.jsonl --batch-size 10000
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from pydantic import ValidationError
+from sqlmodel import Session, select
+
+from database import engine, create_db_and_tables, apply_schema_migrations
+from models import User, UserCreate
+from hashing import password_hasher
+from crud import bulk_insert_users
+
+# Anzahl Datensätze pro Batch (= pro Transaktion und Checkpoint)
+DEFAULT_BATCH_SIZE = 5_000
+# Höchstens so viele Validierungsfehler werden einzeln ausgegeben
+MAX_REPORTED_ERRORS = 20
+# Leere optionale Felder (z.B. leere CSV-Zellen) werden als None importiert
+OPTIONAL_FIELDS = ("bio", "image_filename")
+# Anzahl E-Mails pro IN-Abfrage (unter dem Parameterlimit älterer SQLite-Versionen)
+EMAIL_LOOKUP_CHUNK = 900
+
+
+class UnreadableRecord(NamedTuple):
+    """Platzhalter für eine JSONL-Zeile, die kein JSON-Objekt ist; zählt als ungültiger Datensatz."""
+    line_number: int
+    reason: str
+
+
+def read_records(path: str, file_format: str) -> Iterator[Union[Dict, UnreadableRecord]]:
+    """
+    Liest die Eingabedatei Datensatz für Datensatz, ohne sie komplett zu laden.
+    Kaputte JSONL-Zeilen brechen den Import nicht ab, sondern werden als `UnreadableRecord`
+    geliefert; so bleibt auch die Zählung für den Checkpoint stabil.
+    """
+    with open(path, newline="", encoding="utf-8") as handle:
+        if file_format == "csv":
+            yield from csv.DictReader(handle)
+        else:
+            for line_number, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    yield UnreadableRecord(line_number, "kein gültiges JSON")
+                    continue
+                if isinstance(record, dict):
+                    yield record
+                else:
+                    yield UnreadableRecord(line_number, "kein JSON-Objekt")
+
+
+def detect_format(path: str) -> str:
+    return "jsonl" if path.lower().endswith((".jsonl", ".ndjson")) else "csv"
+
+
+def validate_batch(
+    records: List[Union[Dict, UnreadableRecord]], first_number: int
+) -> Tuple[List[UserCreate], List[str]]:
+    """Validiert einen Batch gegen `UserCreate`; liefert die gültigen Benutzer und Fehlermeldungen."""
+    users: List[UserCreate] = []
+    errors: List[str] = []
+    for number, record in enumerate(records, start=first_number):
+        if isinstance(record, UnreadableRecord):
+            errors.append(f"Datensatz {number} (Zeile {record.line_number}): {record.reason}")
+            continue
+        for field in OPTIONAL_FIELDS:
+            if record.get(field) == "":
+                record[field] = None
+        try:
+            users.append(UserCreate.model_validate(record))
+        except ValidationError as error:
+            fields = ", ".join(".".join(str(part) for part in detail["loc"]) for detail in error.errors())
+            errors.append(f"Datensatz {number}: ungültige Felder ({fields})")
+    return users, errors
+
+
+def drop_existing(session: Session, users: List[UserCreate]) -> List[UserCreate]:
+    """Entfernt Benutzer, deren E-Mail bereits in der Datenbank oder früher im Batch vorkommt."""
+    emails = list(dict.fromkeys(user.email for user in users))
+    existing = set()
+    for start in range(0, len(emails), EMAIL_LOOKUP_CHUNK):
+        chunk = emails[start:start + EMAIL_LOOKUP_CHUNK]
+        existing.update(session.exec(select(User.email).where(User.email.in_(chunk))).all())  # type: ignore
+    kept = []
+    for user in users:
+        if user.email not in existing:
+            existing.add(user.email)
+            kept.append(user)
+    return kept
+
+
+class Checkpoint:
+    """Merkt sich, wie viele Datensätze einer Eingabedatei bereits verarbeitet sind."""
+
+    def __init__(self, path: str, source: str) -> None:
+        self.path = path
+        self.source = os.path.abspath(source)
+        self.records_done = 0
+        self.inserted = 0
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as handle:
+            state = json.load(handle)
+        if state.get("source") != self.source:
+            raise SystemExit(f"Checkpoint {self.path} gehört zu {state.get('source')}; mit --restart neu beginnen.")
+        self.records_done = state["records_done"]
+        self.inserted = state["inserted"]
+
+    def save(self) -> None:
+        # Erst in eine temporäre Datei schreiben, dann atomar ersetzen
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as handle:
+            json.dump({"source": self.source, "records_done": self.records_done, "inserted": self.inserted}, handle)
+        os.replace(temporary_path, self.path)
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def import_users(path: str, file_format: str, batch_size: int, checkpoint: Checkpoint) -> None:
+    records = read_records(path, file_format)
+    if checkpoint.records_done:
+        print(f"Setze nach {checkpoint.records_done} bereits verarbeiteten Datensätzen fort...")
+        # Verarbeitete Datensätze nur überspringen; das ist billig im Vergleich zum Hashen
+        for _ in islice(records, checkpoint.records_done):
+            pass
+
+    started = time.perf_counter()
+    hashing_seconds = 0.0
+    insert_seconds = 0.0
+    processed = 0
+    inserted = 0
+    invalid = 0
+
+    with Session(engine) as session:
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+
+            users, errors = validate_batch(batch, checkpoint.records_done + 1)
+            for message in errors:
+                if invalid < MAX_REPORTED_ERRORS:
+                    print(message, file=sys.stderr)
+                invalid += 1
+
+            # Vorhandene E-Mails vor dem teuren Hashen aussortieren (z.B. nach einem Wiederaufsetzen)
+            users = drop_existing(session, users)
+
+            hashing_started = time.perf_counter()
+            # Echte Mitglieder: jedes Passwort mit eigenem Salt hashen, auch wenn sich Passwörter gleichen
+            hashed_passwords = password_hasher.hash_many([user.password for user in users], share_identical=False)
+            insert_started = time.perf_counter()
+            batch_inserted = bulk_insert_users(session, users, hashed_passwords)
+            session.commit()
+            hashing_seconds += insert_started - hashing_started
+            insert_seconds += time.perf_counter() - insert_started
+
+            # Checkpoint erst nach dem Commit; ein Absturz dazwischen wiederholt nur einen Batch
+            checkpoint.records_done += len(batch)
+            checkpoint.inserted += batch_inserted
+            checkpoint.save()
+
+            processed += len(batch)
+            inserted += batch_inserted
+            elapsed = time.perf_counter() - started
+            print(f"{checkpoint.records_done} Datensätze verarbeitet, {inserted} importiert ({processed / elapsed:.0f} Datensätze/s)")
+
+    elapsed = time.perf_counter() - started
+    print("\n================== Import abgeschlossen ==================")
+    print(f"Verarbeitet:       {processed} Datensätze in {elapsed:.1f}s ({processed / max(elapsed, 1e-9):.0f} Datensätze/s)")
+    print(f"Importiert:        {inserted} (insgesamt {checkpoint.inserted})")
+    print(f"Bereits vorhanden: {processed - invalid - inserted}")
+    print(f"Ungültig:          {invalid}")
+    print(f"Zeitanteile:       Hashing {hashing_seconds:.1f}s, Einfügen {insert_seconds:.1f}s")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Importiert Benutzer aus einer CSV- oder JSONL-Datei.")
+    parser.add_argument("path", help="Eingabedatei (.csv oder .jsonl)")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="Eingabeformat (Standard: anhand der Dateiendung)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Datensätze pro Transaktion")
+    parser.add_argument("--checkpoint", help="Checkpoint-Datei (Standard: <Eingabedatei>.checkpoint.json)")
+    parser.add_argument("--restart", action="store_true", help="Vorhandenen Checkpoint verwerfen und von vorne beginnen")
+    args = parser.parse_args(argv)
+
+    checkpoint = Checkpoint(args.checkpoint or f"{args.path}.checkpoint.json", args.path)
+    if args.restart:
+        checkpoint.remove()
+    checkpoint.load()
+
+    # Sicherstellen, dass Tabellen und Indizes (u.a. der Unique-Index auf email) existieren
+    create_db_and_tables()
+    apply_schema_migrations()
+
+    try:
+        import_users(args.path, args.format or detect_format(args.path), max(1, args.batch_size), checkpoint)
+    finally:
+        password_hasher.shutdown()
+    # Vollständig importiert: der Checkpoint wird nicht mehr gebraucht
+    checkpoint.remove()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,56 +1,68 @@
-import os
+import time
+
+# Startzeitpunkt für die Import-Phase des Startberichts
+IMPORTS_STARTED = time.perf_counter()
+
+import asyncio
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
-from sqlmodel import Session, select
-from models import ZodiacSign
 
 # Importiere die notwendigen Funktionen und Router
-from database import engine, create_db_and_tables, seed_zodiac_signs, seed_zodiac_compatibility
-from routers import auth, users
-from seed import create_fake_users, create_specific_test_users
+from database import async_engine, DATABASE_FILE
+from routers import auth, images, users
+from bootstrap import StartupReport, prepare_database, seed_users_in_background, warm_caches
+from hashing import password_hasher
+from query_profiler import QueryProfilerMiddleware, profiling_enabled
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, registry as metrics_registry
+from profile_cache import profile_cache
+from cache_coherence import CacheWatcher
+from swipe_queue import swipe_queue, write_behind_enabled
 
 # NOTE: Comments are in German as per DEVELOPMENT_GUIDELINES.md
-DB_FILE = "./astrodate.db"
+IMPORTS_FINISHED = time.perf_counter()
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI):
     """
     Handles application startup.
-    If the database does not exist, it creates it and seeds it with initial data.
-    If the database already exists, it uses the existing one.
+    A missing database is created according to ASTRODATE_STARTUP_MODE (see `bootstrap.py`);
+    an existing one is migrated. The duration of every phase is printed and exported as metrics.
     """
     print("================== Anwendung startet ==================")
-    if not os.path.exists(DB_FILE):
-        print("Datenbank nicht gefunden. Initialisiere neue Datenbank...")
-        
-        # 1. Datenbank und Tabellen erstellen
-        print("Erstelle Datenbank und Tabellen...")
-        create_db_and_tables()
-        
-        # 2. Statische Daten füllen
-        print("Fülle statische Daten (Tierkreiszeichen und Kompatibilität)...")
-        seed_zodiac_signs()
-        seed_zodiac_compatibility()
-        
-        # 3. Test-Benutzerdaten füllen (Seeding)
-        print("Fülle Benutzerdaten (Seeding)...")
-        with Session(engine) as session:
-            all_zodiac_signs = session.exec(select(ZodiacSign)).all()
-            create_fake_users(session, all_zodiac_signs)
-            create_specific_test_users(session, all_zodiac_signs)
-        
-        print("================== DATENBANK-INITIALISIERUNG FERTIG ==================")
-    else:
-        print(f"Verwende existierende Datenbank: {DB_FILE}")
-        
+    report = StartupReport()
+    report.record("Imports", IMPORTS_FINISHED - IMPORTS_STARTED)
+    seed_in_background = prepare_database(report)
+    # Änderungen anderer Worker-Prozesse ab hier verfolgen, damit beim Aufwärmen nichts verloren geht
+    cache_watcher = CacheWatcher(DATABASE_FILE)
+    cache_watcher.prime()
+    if write_behind_enabled():
+        # Swipes aus dem Journal eines abgestürzten Prozesses zuerst schreiben
+        with report.phase("Swipe-Journal"):
+            await swipe_queue.start()
+    warm_caches(report)
+    cache_watcher.start()
+    print(report.render())
+
+    # Startet erst, wenn der Server Anfragen annimmt
+    seeding_task = asyncio.create_task(seed_users_in_background(report)) if seed_in_background else None
+
     yield
+    if seeding_task is not None:
+        # Das Seeding läuft in einer Transaktion in einem Thread; nicht mittendrin abbrechen
+        await seeding_task
+    # Alle bestätigten Swipes schreiben, bevor die Verbindungen geschlossen werden
+    await swipe_queue.close()
+    await cache_watcher.stop()
+    await async_engine.dispose()
+    password_hasher.shutdown()
     print("Anwendung heruntergefahren.")
 
 app = FastAPI(lifespan=lifespan, title="AstroDate API")
 
-# Mount the directory for serving user images
+# Mount the directory for serving user images (Originale; skalierte Varianten unter /images)
 app.mount("/userImages", StaticFiles(directory="userImages"), name="userImages")
 
 # Set up CORS (Cross-Origin Resource Sharing)
@@ -64,15 +76,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Der Cursor der nächsten Seite wird bei Listen-Endpunkten als Header geliefert
+    expose_headers=["X-Next-Cursor"],
 )
 
+# SQL-Profiling pro Request (ASTRODATE_SQL_PROFILE=log|strict)
+if profiling_enabled():
+    app.add_middleware(QueryProfilerMiddleware)
+
+# Latenz-, Status- und DB/bcrypt-Metriken pro Route; als äußerste Middleware registriert
+app.add_middleware(MetricsMiddleware)
+# Treffer, Fehlschläge und Verdrängungen des Profil-Caches unter /metrics
+metrics_registry.register(profile_cache)
+
 # Binde die Router in die Hauptanwendung ein
 app.include_router(auth.router)
 app.include_router(users.router)
+app.include_router(images.router)
 
 @app.get("/")
-def read_root():
+async def read_root():
     """
     Ein einfacher Endpunkt zur Überprüfung, ob die API läuft.
     """
-    return {"message": "Willkommen zur AstroDate API!"}
\ No newline at end of file
+    return {"message": "Willkommen zur AstroDate API!"}
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    """
+    Liefert die gesammelten Metriken im Prometheus-Textformat.
+    """
+    return PlainTextResponse(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
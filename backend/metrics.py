@@ -0,0 +1,243 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Latency buckets in seconds (Prometheus defaults, extended downwards for fast queries)
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+PASSWORD_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Label used for requests that matched no route, so unknown paths cannot blow up cardinality
+UNMATCHED_ROUTE = "unmatched"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            yield f"{self.name}{_format_labels(self.label_names, label_values)} {value}"
+
+
+class Gauge(Counter):
+    def dec(self, *label_values: str, amount: float = 1.0) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, *label_values: str, value: float) -> None:
+        with self._lock:
+            self._values[label_values] = value
+
+    def collect(self) -> Iterable[str]:
+        lines = list(super().collect())
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram; observing is a bisect and three additions under a lock."""
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = (), buckets: Tuple[float, ...] = REQUEST_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        # Per label set: bucket counts (last slot is +Inf), sum and count
+        self._series: Dict[LabelValues, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            snapshot = [(label_values, list(counts), total, count) for label_values, (counts, total, count) in self._series.items()]
+        for label_values, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, label_values, f'le="{bound}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.label_names, label_values)
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: List = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format."""
+        return "\n".join(line for metric in self._metrics for line in metric.collect()) + "\n"
+
+
+registry = MetricsRegistry()
+
+request_duration = registry.register(Histogram(
+    "astrodate_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")))
+requests_total = registry.register(Counter(
+    "astrodate_http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status")))
+requests_in_flight = registry.register(Gauge(
+    "astrodate_http_requests_in_flight", "HTTP requests currently being processed."))
+request_db_seconds = registry.register(Counter(
+    "astrodate_http_request_db_seconds_total", "Time spent executing SQL, by route.", ("method", "route")))
+request_password_seconds = registry.register(Counter(
+    "astrodate_http_request_password_seconds_total", "Time spent waiting for bcrypt, by route.", ("method", "route")))
+query_duration = registry.register(Histogram(
+    "astrodate_db_query_duration_seconds", "SQL statement execution time.", buckets=QUERY_BUCKETS))
+password_duration = registry.register(Histogram(
+    "astrodate_password_operation_duration_seconds", "bcrypt hash/verify time including queueing.", ("operation",),
+    buckets=PASSWORD_BUCKETS))
+
+
+class _RequestTimings:
+    """Time spent in the database and in bcrypt by the request that owns the context."""
+    __slots__ = ("db_seconds", "password_seconds")
+
+    def __init__(self) -> None:
+        self.db_seconds = 0.0
+        self.password_seconds = 0.0
+
+
+_request_timings: contextvars.ContextVar[Optional[_RequestTimings]] = contextvars.ContextVar("request_timings", default=None)
+
+
+def observe_password_operation(operation: str, seconds: float) -> None:
+    """Records a bcrypt hash/verify; called by the password hasher."""
+    password_duration.observe(seconds, operation)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.password_seconds += seconds
+
+
+# Called as observer(connection, statement, parameters, executemany, seconds) for every timed statement
+QueryObserver = Callable[[Any, str, Any, bool, float], None]
+_query_observers: List[QueryObserver] = []
+
+
+def add_query_observer(observer: QueryObserver) -> None:
+    """Lets other modules (e.g. the query profiler) reuse the statement timing of `instrument_engine`."""
+    if observer not in _query_observers:
+        _query_observers.append(observer)
+
+
+def _before_cursor_execute(_connection, _cursor, _statement, _parameters, context, _executemany) -> None:
+    context._astrodate_started = time.perf_counter()
+
+
+def _after_cursor_execute(connection, _cursor, statement, parameters, context, executemany) -> None:
+    started = getattr(context, "_astrodate_started", None)
+    if started is None:
+        return
+    seconds = time.perf_counter() - started
+    query_duration.observe(seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.db_seconds += seconds
+    for observer in _query_observers:
+        observer(connection, statement, parameters, executemany, seconds)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Times every statement executed on the (sync or async-backing) engine. This is the only
+    timing hook on the engines; everything else that needs statement durations registers
+    with `add_query_observer`. Installing it twice on one engine is a no-op.
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    if not event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _route_label(scope, root_path: str) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Mounts (e.g. the static images) only extend root_path
+    mounted_at = scope.get("root_path", "")[len(root_path):]
+    return f"{mounted_at}/{{path}}" if mounted_at else UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware task/stream overhead) that records latency,
+    status codes, in-flight requests and the DB/bcrypt share of every HTTP request.
+    The route label is the path template, e.g. `/users/swipe/{user_id}/{is_like}`.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        root_path = scope.get("root_path", "")
+
+        async def send_wrapper(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        timings = _RequestTimings()
+        token = _request_timings.set(timings)
+        requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            requests_in_flight.dec()
+            _request_timings.reset(token)
+            method = scope["method"]
+            route = _route_label(scope, root_path)
+            request_duration.observe(elapsed, method, route)
+            requests_total.inc(method, route, str(status_code))
+            if timings.db_seconds:
+                request_db_seconds.inc(method, route, amount=timings.db_seconds)
+            if timings.password_seconds:
+                request_password_seconds.inc(method, route, amount=timings.password_seconds)
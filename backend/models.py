@@ -1,5 +1,6 @@
 from typing import Optional
 from datetime import datetime, date
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel, Relationship
 
 # ======================================================================================
@@ -65,6 +66,11 @@ class Match(SQLModel, table=True):
     Stellt eine Swipe-Aktion von einem Benutzer zum anderen dar.
     Ein gegenseitiges Match tritt auf, wenn zwei Benutzer einen 'like'-Eintrag für den anderen haben.
     """
+    # Ein Benutzer kann jeden anderen nur einmal swipen; der Index dient auch als Upsert-Ziel
+    __table_args__ = (
+        Index("ux_match_user_id_from_user_id_to", "user_id_from", "user_id_to", unique=True),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     
     # Der Benutzer, der die Swipe-Aktion durchgeführt hat
@@ -76,6 +82,89 @@ class Match(SQLModel, table=True):
     is_like: bool = Field(nullable=False)
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
 
+class MutualMatch(SQLModel, table=True):
+    """
+    Ein gegenseitiges Match zweier Benutzer, gespeichert als geordnetes Paar
+    (`user_id_low` < `user_id_high`). Wird in derselben Transaktion geschrieben wie das zweite Like.
+    """
+    __table_args__ = (
+        Index("ux_mutualmatch_user_id_low_user_id_high", "user_id_low", "user_id_high", unique=True),
+        # Für die seitenweise Abfrage "meine Matches, neueste zuerst" aus beiden Richtungen
+        Index("ix_mutualmatch_user_id_low_id", "user_id_low", "id"),
+        Index("ix_mutualmatch_user_id_high_id", "user_id_high", "id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id_low: int = Field(foreign_key="user.id", nullable=False)
+    user_id_high: int = Field(foreign_key="user.id", nullable=False)
+    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+
+class LikeInbox(SQLModel, table=True):
+    """
+    Zähler der erhaltenen Likes pro Benutzer. Wird in derselben Transaktion wie der Swipe
+    gepflegt, damit ein Poll des Posteingangs ohne neue Likes nur diese eine Zeile liest.
+    """
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    total_likes: int = Field(default=0, nullable=False)
+    # Likes mit einer Match-ID größer als `last_read_id`
+    unread_likes: int = Field(default=0, nullable=False)
+    # Match-ID des neuesten erhaltenen Likes
+    last_like_id: int = Field(default=0, nullable=False)
+    # Bis zu dieser Match-ID hat der Benutzer seine Likes als gelesen markiert
+    last_read_id: int = Field(default=0, nullable=False)
+
+class CacheInvalidation(SQLModel, table=True):
+    """
+    Änderungsprotokoll für die In-Memory-Caches: Laufen mehrere Worker-Prozesse auf derselben
+    Datenbank, liest jeder Prozess hier mit, welche Einträge andere Prozesse geändert haben
+    (siehe `cache_coherence.py`). Alte Zeilen werden regelmäßig gelöscht.
+    """
+    # AUTOINCREMENT: IDs werden nie wiederverwendet, auch nicht nach dem Aufräumen der Tabelle
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    # Betroffener Cache: "user", "zodiac" oder "compatibility"
+    topic: str = Field(nullable=False)
+    # Betroffener Schlüssel (z.B. die Benutzer-ID); leer heißt "alles"
+    entity_id: Optional[int] = None
+    # Prozess, der die Änderung geschrieben hat; er überspringt seine eigenen Einträge
+    origin: str = Field(nullable=False)
+    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False, index=True)
+
+# Ein gegenseitiges Match aus Sicht des aktuellen Benutzers
+class MutualMatchRead(SQLModel):
+    id: int
+    created_at: datetime
+    user: UserRead
+
+# Eine Seite der Match-Liste
+class MutualMatchPage(SQLModel):
+    matches: list[MutualMatchRead]
+    next_cursor: Optional[str] = None
+
+# Ein erhaltenes Like: Match-ID, Zeitpunkt und der Benutzer, der geliked hat
+class LikeInboxItem(SQLModel):
+    id: int
+    created_at: datetime
+    user: UserRead
+
+# Zähler des Like-Posteingangs
+class LikeInboxCounts(SQLModel):
+    unread: int = 0
+    total: int = 0
+
+# Neue Likes seit einem Cursor; `cursor` wird beim nächsten Poll als `since` übergeben
+class LikeInboxPage(LikeInboxCounts):
+    likes: list[LikeInboxItem]
+    cursor: str
+    has_more: bool = False
+
+# Eine Seite aus dem vorgemischten Discover-Stapel
+class DiscoverDeckPage(SQLModel):
+    users: list[UserRead]
+    next_cursor: Optional[str] = None
+    remaining: int = 0
+
 # Schema für die Login-Antwort
 class Token(SQLModel):
     access_token: str
@@ -84,5 +173,6 @@ class Token(SQLModel):
 # Schema für die im JWT kodierten Daten
 class TokenData(SQLModel):
     email: str | None = None
+    user_id: int | None = None
 
 
@@ -0,0 +1,23 @@
+import base64
+import binascii
+from typing import Tuple
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(*parts: int) -> str:
+    """Encodes integer keys (e.g. the last id of a page) into an opaque, URL-safe cursor."""
+    raw = ":".join(str(part) for part in parts).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> Tuple[int, ...]:
+    """Decodes a cursor produced by `encode_cursor` that holds exactly `size` integers."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        parts = tuple(int(part) for part in base64.urlsafe_b64decode(padded).decode().split(":"))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursorError("Invalid cursor") from e
+    if len(parts) != size:
+        raise InvalidCursorError("Invalid cursor")
+    return parts
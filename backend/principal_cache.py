@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Set
+
+from sqlalchemy import event
+
+from models import User
+
+# Maximum number of cached tokens
+PRINCIPAL_CACHE_SIZE = int(os.environ.get("ASTRODATE_PRINCIPAL_CACHE_SIZE", "10000"))
+# Seconds a cached principal stays valid (never longer than the token itself)
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.environ.get("ASTRODATE_PRINCIPAL_CACHE_TTL", "60"))
+
+
+class Principal(NamedTuple):
+    """The decoded token claims and the user they belong to."""
+    claims: Dict[str, Any]
+    user: User
+    expires_at: float
+
+
+class PrincipalCache:
+    """
+    LRU/TTL cache of authenticated principals, keyed by the raw bearer token.
+    A hit skips both the JWT decode and the user lookup. Entries are dropped when
+    their user changes (see `invalidate_user`).
+    """
+
+    def __init__(self, max_size: int = PRINCIPAL_CACHE_SIZE, ttl_seconds: float = PRINCIPAL_CACHE_TTL_SECONDS) -> None:
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Principal]" = OrderedDict()
+        self._tokens_by_user: Dict[int, Set[str]] = {}
+
+    def get(self, token: str) -> Optional[Principal]:
+        with self._lock:
+            principal = self._entries.get(token)
+            if principal is None:
+                return None
+            if principal.expires_at <= time.time():
+                self._remove(token)
+                return None
+            self._entries.move_to_end(token)
+            return principal
+
+    def put(self, token: str, claims: Dict[str, Any], user: User) -> None:
+        if self.max_size <= 0 or user.id is None:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        token_expiry = claims.get("exp")
+        if isinstance(token_expiry, (int, float)):
+            expires_at = min(expires_at, float(token_expiry))
+
+        # Cache a detached copy, so the entry never refers to a request's session
+        detached_user = User(**user.model_dump())
+        with self._lock:
+            self._remove(token)
+            self._entries[token] = Principal(claims, detached_user, expires_at)
+            self._tokens_by_user.setdefault(user.id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                oldest_token = next(iter(self._entries))
+                self._remove(oldest_token)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Drops every cached token of the given user."""
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(token)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def _remove(self, token: str) -> None:
+        principal = self._entries.pop(token, None)
+        if principal is None or principal.user.id is None:
+            return
+        tokens = self._tokens_by_user.get(principal.user.id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[principal.user.id]
+
+
+# Shared instance used by the auth dependency
+principal_cache = PrincipalCache()
+
+
+# Every ORM-level change to a user invalidates that user's cached principals
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(_mapper, _connection, target: User) -> None:
+    if target.id is not None:
+        principal_cache.invalidate_user(target.id)
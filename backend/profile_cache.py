@@ -0,0 +1,141 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+from models import User, ZodiacSign
+from serialization import user_read_dict
+
+# Maximum number of cached profiles (0 disables the cache)
+PROFILE_CACHE_SIZE = int(os.environ.get("ASTRODATE_PROFILE_CACHE_SIZE", "50000"))
+
+# A ready-to-serve `UserRead` JSON object (see `serialization.user_read_dict`); never mutated
+Profile = Dict[str, Any]
+
+
+class ProfileCacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    max_size: int
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ProfileCache:
+    """
+    Bounded LRU cache of public user profiles, keyed by user id.
+
+    Entries already carry the resolved sign name, so list endpoints only need the ids of
+    a page and then hydrate them with one `get_many`. Registration and profile changes
+    write through with `put`; ORM updates and deletes of a user (and any change to the
+    sign names) invalidate the affected entries.
+    """
+
+    def __init__(self, max_size: int = PROFILE_CACHE_SIZE) -> None:
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Profile]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, user_id: int) -> Optional[Profile]:
+        profiles, _ = self.get_many((user_id,))
+        return profiles.get(user_id)
+
+    def get_many(self, user_ids: Iterable[int]) -> Tuple[Dict[int, Profile], List[int]]:
+        """Returns the cached profiles by id and the ids that have to be loaded."""
+        found: Dict[int, Profile] = {}
+        missing: List[int] = []
+        with self._lock:
+            for user_id in user_ids:
+                profile = self._entries.get(user_id)
+                if profile is None:
+                    missing.append(user_id)
+                else:
+                    self._entries.move_to_end(user_id)
+                    found[user_id] = profile
+            self._hits += len(found)
+            self._misses += len(missing)
+        return found, missing
+
+    def put(self, row: Sequence[Any]) -> Profile:
+        """Caches a USER_READ_COLUMNS row and returns its profile."""
+        return self.put_many((row,))[0]
+
+    def put_many(self, rows: Iterable[Sequence[Any]]) -> List[Profile]:
+        profiles = [user_read_dict(row) for row in rows]
+        if self.max_size <= 0:
+            return profiles
+        with self._lock:
+            for profile in profiles:
+                self._entries[profile["id"]] = profile
+                self._entries.move_to_end(profile["id"])
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+        return profiles
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> ProfileCacheStats:
+        with self._lock:
+            return ProfileCacheStats(self._hits, self._misses, self._evictions, len(self._entries), self.max_size)
+
+    def collect(self) -> Iterable[str]:
+        """Prometheus exposition, so the cache can be registered with the metrics registry."""
+        stats = self.stats()
+        yield "# HELP astrodate_profile_cache_lookups_total Profile cache lookups by result."
+        yield "# TYPE astrodate_profile_cache_lookups_total counter"
+        yield f'astrodate_profile_cache_lookups_total{{result="hit"}} {stats.hits}'
+        yield f'astrodate_profile_cache_lookups_total{{result="miss"}} {stats.misses}'
+        yield "# HELP astrodate_profile_cache_evictions_total Profiles evicted to stay within the size limit."
+        yield "# TYPE astrodate_profile_cache_evictions_total counter"
+        yield f"astrodate_profile_cache_evictions_total {stats.evictions}"
+        yield "# HELP astrodate_profile_cache_size Profiles currently cached."
+        yield "# TYPE astrodate_profile_cache_size gauge"
+        yield f"astrodate_profile_cache_size {stats.size}"
+
+
+def user_from_profile(profile: Profile) -> User:
+    """Builds a detached `User` (without password hash) from a profile, e.g. for the auth dependency."""
+    return User(
+        id=profile["id"],
+        email=profile["email"],
+        birth_date=profile["birth_date"],
+        bio=profile["bio"],
+        image_filename=profile["image_filename"],
+        zodiac_sign_id=profile["zodiac_sign_id"],
+    )
+
+
+# Shared instance used by the list endpoints and the auth dependency
+profile_cache = ProfileCache()
+
+
+# Write-through covers the API; these catch every other ORM-level change
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_profile(_mapper, _connection, target: User) -> None:
+    if target.id is not None:
+        profile_cache.invalidate(target.id)
+
+
+# Profiles embed the sign name
+@event.listens_for(ZodiacSign, "after_update")
+@event.listens_for(ZodiacSign, "after_delete")
+def _invalidate_all_profiles(_mapper, _connection, _target: ZodiacSign) -> None:
+    profile_cache.clear()
@@ -0,0 +1,180 @@
+import contextvars
+import logging
+import os
+import re
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy.engine import Engine
+
+from metrics import add_query_observer, instrument_engine
+
+# "off" (default), "log" (log N+1 suspects and per-request totals) or "strict"
+# (additionally raise QueryBudgetExceeded when a request exceeds its query budget)
+SQL_PROFILE_MODE = os.environ.get("ASTRODATE_SQL_PROFILE", "off").lower()
+# Statements slower than this are logged together with their EXPLAIN QUERY PLAN
+SLOW_QUERY_MS = float(os.environ.get("ASTRODATE_SLOW_QUERY_MS", "250"))
+# Executing the same statement shape this often in one request is reported as a probable N+1
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("ASTRODATE_N_PLUS_ONE_THRESHOLD", "5"))
+# Query budget for requests without an explicit `QueryBudget` dependency (0 = unlimited)
+DEFAULT_QUERY_BUDGET = int(os.environ.get("ASTRODATE_SQL_QUERY_BUDGET", "0"))
+
+logger = logging.getLogger("astrodate.sql")
+
+# Expanded IN lists differ in length only; collapse them so they count as one shape
+_IN_LIST = re.compile(r"\((?:\?, )+\?\)")
+_WHITESPACE = re.compile(r"\s+")
+# Only DML has a query plan; DDL and PRAGMAs are logged without one
+_EXPLAINABLE = re.compile(r"\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in strict mode (and by `query_budget`) when more statements ran than allowed."""
+
+
+def statement_shape(statement: str) -> str:
+    """Normalizes a statement so executions that differ only in parameters compare equal."""
+    return _IN_LIST.sub("(?...)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class QueryProfile:
+    """Statements executed inside one `profile_queries` block (typically one request)."""
+
+    def __init__(self, label: str = "", budget: int = 0) -> None:
+        self.label = label
+        self.budget = budget
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated_shapes(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int]]:
+        """Statement shapes executed at least `threshold` times: probable N+1 queries."""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+    def over_budget(self) -> bool:
+        return bool(self.budget) and self.count > self.budget
+
+    def summary(self) -> str:
+        return f"{self.label or 'block'}: {self.count} statements in {self.seconds * 1000:.1f} ms"
+
+
+_current_profile: contextvars.ContextVar[Optional[QueryProfile]] = contextvars.ContextVar("query_profile", default=None)
+
+
+@contextmanager
+def profile_queries(label: str = "", budget: int = 0) -> Iterator[QueryProfile]:
+    """Collects every statement executed in this context (including awaited async code)."""
+    profile = QueryProfile(label, budget)
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+
+
+@contextmanager
+def query_budget(max_queries: int, allow_n_plus_one: bool = False) -> Iterator[QueryProfile]:
+    """
+    Test helper: fails with QueryBudgetExceeded if the block runs more than `max_queries`
+    statements or, unless allowed, repeats a statement shape like an N+1 loop.
+    """
+    with profile_queries("query_budget", max_queries) as profile:
+        yield profile
+    check_profile(profile, allow_n_plus_one)
+
+
+def check_profile(profile: QueryProfile, allow_n_plus_one: bool = True) -> None:
+    if profile.over_budget():
+        raise QueryBudgetExceeded(f"{profile.summary()}, budget is {profile.budget}")
+    repeated = profile.repeated_shapes()
+    if repeated and not allow_n_plus_one:
+        shape, count = repeated[0]
+        raise QueryBudgetExceeded(f"{profile.summary()}; probable N+1: {count}x {shape}")
+
+
+class QueryBudget:
+    """
+    FastAPI dependency that sets the query budget of the current request, e.g.
+    `@router.get(..., dependencies=[Depends(QueryBudget(6))])`. Only enforced while profiling.
+    """
+
+    def __init__(self, max_queries: int) -> None:
+        self.max_queries = max_queries
+
+    async def __call__(self) -> None:
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.budget = self.max_queries
+
+
+def _explain(connection, statement: str, parameters) -> str:
+    if not _EXPLAINABLE.match(statement):
+        return "(n/a)"
+    try:
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    except Exception as error:  # the plan is diagnostic only
+        return f"(no plan: {type(error).__name__})"
+    return "; ".join(str(row[-1]) for row in rows)
+
+
+def _observe_query(connection, statement: str, parameters, executemany: bool, seconds: float) -> None:
+    # The plans this module requests itself are neither counted nor explained again
+    if statement.startswith("EXPLAIN"):
+        return
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.record(statement, seconds)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        plan = "(executemany)" if executemany else _explain(connection, statement, parameters)
+        logger.warning("Slow query (%.1f ms): %s | plan: %s", seconds * 1000, statement_shape(statement), plan)
+
+
+def install_query_profiler(engine: Engine) -> None:
+    """
+    Hooks the profiler into an engine (for async engines pass `async_engine.sync_engine`).
+    It reuses the statement timing of `metrics.instrument_engine` instead of adding its own.
+    """
+    instrument_engine(engine)
+    add_query_observer(_observe_query)
+
+
+class QueryProfilerMiddleware:
+    """
+    Pure ASGI middleware that profiles every HTTP request: it logs probable N+1 patterns and
+    budget violations, and in strict mode raises QueryBudgetExceeded so tests fail loudly.
+    """
+
+    def __init__(self, app, strict: bool = SQL_PROFILE_MODE == "strict", default_budget: int = DEFAULT_QUERY_BUDGET) -> None:
+        self.app = app
+        self.strict = strict
+        self.default_budget = default_budget
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with profile_queries(f"{scope['method']} {scope['path']}", self.default_budget) as profile:
+            await self.app(scope, receive, send)
+
+        route = scope.get("route")
+        if route is not None:
+            profile.label = f"{scope['method']} {route.path}"
+        for shape, count in profile.repeated_shapes():
+            logger.warning("Probable N+1 in %s: %dx %s", profile.label, count, shape)
+        if profile.over_budget():
+            logger.warning("Query budget exceeded: %s, budget is %d", profile.summary(), profile.budget)
+            if self.strict:
+                raise QueryBudgetExceeded(f"{profile.summary()}, budget is {profile.budget}")
+        logger.debug(profile.summary())
+
+
+def profiling_enabled() -> bool:
+    return SQL_PROFILE_MODE in ("log", "strict")
+
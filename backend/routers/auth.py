@@ -1,12 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from datetime import timedelta
 
-from database import get_session
+from database import get_async_session
 from models import UserCreate, UserRead, Token
-from crud import get_user_by_email, create_user # Corrected import
-from security import verify_password, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from async_crud import get_user_by_email, create_user, get_profile
+from security import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from hashing import password_hasher, HashingQueueFullError
+from query_profiler import QueryBudget
+from serialization import json_response
 
 # English comments are used in the code as requested.
 router = APIRouter(
@@ -14,33 +17,50 @@ router = APIRouter(
     tags=["Authentication"],
 )
 
+def _server_busy_exception() -> HTTPException:
+    """The password hashing queue is full; the client should retry shortly."""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy, please try again.",
+        headers={"Retry-After": "1"},
+    )
+
 @router.post("/register", response_model=UserRead, status_code=status.HTTP_201_CREATED)
-def register_new_user(*, session: Session = Depends(get_session), user_in: UserCreate):
+async def register_new_user(*, session: AsyncSession = Depends(get_async_session), user_in: UserCreate):
     """
     Create a new user.
     """
-    user = get_user_by_email(db=session, email=user_in.email) # Use email for check
+    user = await get_user_by_email(db=session, email=user_in.email) # Use email for check
     if user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="A user with this email already exists in the system.", # Corrected error message
         )
     
-    new_user = create_user(db=session, user=user_in)
-    return new_user
+    try:
+        new_user = await create_user(db=session, user=user_in)
+    except HashingQueueFullError:
+        raise _server_busy_exception()
+    # Registration wrote the profile through to the cache, including the sign name
+    assert new_user.id is not None
+    return json_response(await get_profile(session, new_user.id), status_code=status.HTTP_201_CREATED)
 
-@router.post("/login", response_model=Token)
-def login_for_access_token(
+@router.post("/login", response_model=Token, dependencies=[Depends(QueryBudget(3))])
+async def login_for_access_token(
     *,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     form_data: OAuth2PasswordRequestForm = Depends()
 ):
     """
     OAuth2 compatible token login, get an access token for future requests.
     The form's 'username' field is used to send the user's email.
     """
-    user = get_user_by_email(db=session, email=form_data.username) # Use email for lookup
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = await get_user_by_email(db=session, email=form_data.username) # Use email for lookup
+    try:
+        password_ok = user is not None and await password_hasher.verify(form_data.password, user.hashed_password)
+    except HashingQueueFullError:
+        raise _server_busy_exception()
+    if not user or not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password", # Corrected error message
@@ -48,15 +68,15 @@ def login_for_access_token(
         )
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    # The 'sub' of the token should be the user's email
+    # The 'sub' of the token should be the user's email; 'uid' allows primary-key lookups
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": user.email, "uid": user.id}, expires_delta=access_token_expires
     )
     
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/logout")
-def logout():
+async def logout():
     """
     Placeholder for logout. In a stateless token-based auth,
     the client just needs to delete the token.
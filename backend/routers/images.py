@@ -0,0 +1,46 @@
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import FileResponse
+
+from images import IMAGE_VARIANTS, ImageNotFoundError, cache_control, etag_matches, image_store
+
+router = APIRouter(prefix="/images", tags=["Images"])
+
+
+def _negotiate_format(requested: Optional[str], accept: str) -> str:
+    if requested:
+        return requested
+    return "webp" if "image/webp" in accept else "jpeg"
+
+
+@router.get("/{variant}/{filename:path}")
+async def get_image_variant(
+    variant: str,
+    filename: str,
+    request: Request,
+    image_format: Optional[Literal["jpeg", "webp"]] = Query(None, alias="format"),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Serves a resized profile image: `thumb` (160px), `card` (480px) or `full` (1024px).
+    Without `format` the response is WebP for clients that accept it, otherwise JPEG.
+    Variants are rendered on first request and then served from the disk cache. Content-addressed
+    uploads are cached as immutable; plain filenames only briefly, then revalidated by ETag.
+    """
+    if variant not in IMAGE_VARIANTS:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown image variant.")
+
+    chosen_format = _negotiate_format(image_format, request.headers.get("accept", ""))
+    try:
+        rendered = await image_store.get(filename, variant, chosen_format)
+    except ImageNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found.")
+
+    headers = {"ETag": rendered.etag, "Cache-Control": cache_control(filename)}
+    if image_format is None:
+        # The representation depends on the Accept header, so shared caches must key on it
+        headers["Vary"] = "Accept"
+    if etag_matches(if_none_match, rendered.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(rendered.path, media_type=rendered.media_type, headers=headers)
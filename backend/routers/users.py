@@ -1,88 +1,162 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlmodel import Session, select
-from typing import List
+from pydantic import ValidationError
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Optional
 
-from database import get_session
-from models import UserRead, User, ZodiacSign, Match # Added Match import
+from database import async_engine, get_async_session
+from models import UserRead, User, DiscoverDeckPage, LikeInboxCounts, LikeInboxPage, MutualMatchPage, TokenData
 from security import decode_access_token
-import crud
+from candidate_index import candidate_index
+from principal_cache import principal_cache
+from decks import deck_store, DECK_SIZE
+from pagination import InvalidCursorError, decode_cursor, encode_cursor
+from streaming import keyed_by_user_id, stream_user_list
+from serialization import json_response
+from profile_cache import user_from_profile
+from query_profiler import QueryBudget
+from swipe_queue import swipe_queue
+from image_storage import MAX_UPLOAD_BYTES, UnsupportedImageError, UploadTooLargeError, store_image_stream
+import async_crud as crud
 
 # This router handles user interaction endpoints like discover, swipe, and matches.
 router = APIRouter(prefix="/users", tags=["Users & Matching"])
 
+# Upper bound for the `limit` of paginated list endpoints
+MAX_PAGE_SIZE = 1000
+
 # Security scheme for authorization
 security = HTTPBearer()
 
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_session)
+    db: AsyncSession = Depends(get_async_session)
 ) -> User:
     """Dependency to get the current user from a JWT token."""
     token = credentials.credentials
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal.user
+
     payload = decode_access_token(token)
-    email: str | None = payload.get("sub")
+    try:
+        token_data = TokenData(email=payload.get("sub"), user_id=payload.get("uid"))
+    except ValidationError:
+        token_data = TokenData()
     
-    if email is None:
+    if token_data.email is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
     
-    user = crud.get_user_by_email(db=db, email=email)
+    # Tokens carry the user id, so a cache miss is a profile cache lookup; older tokens fall back to the email
+    if token_data.user_id is not None:
+        profile = await crud.get_profile(db, token_data.user_id)
+        user = user_from_profile(profile) if profile is not None and profile["email"] == token_data.email else None
+    else:
+        user = await crud.get_user_by_email(db=db, email=token_data.email)
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
     
+    principal_cache.put(token, payload, user)
     return user
 
-# --- Helper function to reduce code duplication and fix N+1 query problem ---
-def _convert_users_to_user_read_list(db: Session, users: List[User]) -> List[UserRead]:
+# --- API Endpoints ---
+
+def _decode_list_cursor(cursor: Optional[str]) -> Optional[int]:
+    """Decodes the keyset cursor of the list endpoints (None means: start at the beginning)."""
+    if not cursor:
+        return None
+    try:
+        (after_key,) = decode_cursor(cursor, 1)
+    except InvalidCursorError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+    return after_key
+
+@router.get("/all", response_model=List[UserRead])
+async def read_all_users(
+    db: AsyncSession = Depends(get_async_session),
+    cursor: Optional[str] = None,
+    limit: int = Query(default=100, ge=1, le=MAX_PAGE_SIZE),
+    skip: int = Query(default=0, ge=0, deprecated=True),
+):
     """
-    Efficiently converts a list of User objects to a list of UserRead objects,
-    avoiding N+1 queries for zodiac signs.
+    Retrieves a page of all users ordered by id.
+    The cursor for the next page is returned in the X-Next-Cursor header.
     """
-    if not users:
-        return []
+    if skip and not cursor:
+        # Legacy OFFSET paging, kept for existing clients
+        user_ids = await crud.get_user_ids(db, skip=skip, limit=limit)
+        return json_response(await crud.get_profiles(db, user_ids))
+    return await stream_user_list(db, keyed_by_user_id(crud.get_users_page), _decode_list_cursor(cursor), limit)
 
-    sign_ids = {user.zodiac_sign_id for user in users if user.zodiac_sign_id}
-    
-    if not sign_ids: # Handle case where no users have a zodiac sign
-        return [UserRead(**user.model_dump()) for user in users]
+@router.get("/discover", response_model=UserRead, dependencies=[Depends(QueryBudget(6))])
+async def discover_compatible_user(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_session)):
+    """Returns a random, compatible user for the current user to swipe on."""
+    candidate_ids = await crud.get_compatible_user_ids(db, current_user, 1)
+    profile = await crud.get_profile(db, candidate_ids[0]) if candidate_ids else None
 
-    signs = db.exec(select(ZodiacSign).where(ZodiacSign.id.in_(sign_ids))).all() # type: ignore
-    signs_map = {sign.id: sign.german_name for sign in signs}
-    
-    user_read_list = []
-    for user in users:
-        user_read_list.append(
-            UserRead(
-                **user.model_dump(),
-                zodiac_sign_name=signs_map.get(user.zodiac_sign_id)
-            )
-        )
-    return user_read_list
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No compatible users found at the moment.")
 
-# --- API Endpoints ---
+    return json_response(profile)
 
-@router.get("/all", response_model=List[UserRead])
-def read_all_users(db: Session = Depends(get_session), skip: int = 0, limit: int = 100):
-    """Retrieves a list of all users."""
-    users = crud.get_users(db, skip=skip, limit=limit)
-    return _convert_users_to_user_read_list(db, users)
+async def _refill_discover_deck(user_id: int) -> None:
+    """Background task: tops up a user's discover deck with fresh candidates."""
+    try:
+        async with AsyncSession(async_engine) as db:
+            user = await crud.get_user(db, user_id)
+            if user is None:
+                return
+            candidate_ids = await crud.get_compatible_user_ids(db, user, DECK_SIZE, exclude=deck_store.known_ids(user_id))
+            deck_store.extend(user_id, candidate_ids)
+    finally:
+        # `extend` already cleared it; otherwise a failed refill would block refills until the deck expires
+        deck_store.cancel_refill(user_id)
 
-@router.get("/discover", response_model=UserRead)
-def discover_compatible_user(current_user: User = Depends(get_current_user), db: Session = Depends(get_session)):
-    """Returns a random, compatible user for the current user to swipe on."""
-    compatible_user = crud.get_compatible_user(db=db, current_user=current_user)
-    
-    if compatible_user is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No compatible users found at the moment.")
-    
-    return _convert_users_to_user_read_list(db, [compatible_user])[0]
+@router.get("/discover/deck", response_model=DiscoverDeckPage)
+async def discover_deck(
+    background_tasks: BackgroundTasks,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=10, ge=1, le=DECK_SIZE),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """
+    Returns the next page of the current user's pre-shuffled discover deck.
+    Pass the returned `next_cursor` to get the following page. The deck is refilled
+    in the background when it runs low, so paging never waits on candidate selection.
+    """
+    assert current_user.id is not None
+    user_id = current_user.id
+
+    if not deck_store.has_deck(user_id):
+        deck_store.replace(user_id, await crud.get_compatible_user_ids(db, current_user, DECK_SIZE))
+    else:
+        # The swiped set may have been evicted since the deck was built
+        await crud.load_swipes(db, user_id)
+
+    try:
+        page_ids, next_cursor, remaining = deck_store.take(
+            user_id, cursor, limit, is_eligible=lambda candidate_id: not candidate_index.has_swiped(user_id, candidate_id)
+        )
+    except InvalidCursorError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid deck cursor.")
 
-@router.post("/swipe/{user_id}/{is_like}")
-def swipe_user(
+    if deck_store.needs_refill(user_id):
+        background_tasks.add_task(_refill_discover_deck, user_id)
+
+    # Same shape as DiscoverDeckPage
+    return json_response({
+        "users": await crud.get_profiles(db, page_ids),
+        "next_cursor": next_cursor,
+        "remaining": remaining,
+    })
+
+@router.post("/swipe/{user_id}/{is_like}", dependencies=[Depends(QueryBudget(6))])
+async def swipe_user(
     user_id: int,
     is_like: bool,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_session)
+    db: AsyncSession = Depends(get_async_session)
 ):
     """Records a swipe (like or dislike) on another user."""
     # Assert that the current user has an ID for type safety
@@ -91,35 +165,165 @@ def swipe_user(
     if current_user.id == user_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You cannot swipe on yourself.")
     
-    target_user = db.get(User, user_id)
-    if not target_user:
+    # In write-behind mode the swipe is acknowledged once journaled; `match_id` is then None
+    if swipe_queue.running:
+        result = await swipe_queue.submit(db, user_id_from=current_user.id, user_id_to=user_id, is_like=is_like)
+    else:
+        result = await crud.swipe(db, user_id_from=current_user.id, user_id_to=user_id, is_like=is_like)
+    if result is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User to swipe on not found.")
     
-    match = crud.create_match(db=db, user_id_from=current_user.id, user_id_to=user_id, is_like=is_like)
-    
-    if is_like:
-        reverse_match = db.exec(
-            select(Match).where(
-                Match.user_id_from == user_id, 
-                Match.user_id_to == current_user.id, 
-                Match.is_like == True
-            )
-        ).first()
-        if reverse_match:
-            return {"message": "It's a mutual match!", "match_id": match.id}
+    if result.is_mutual:
+        return {"message": "It's a mutual match!", "match_id": result.match_id}
             
-    return {"message": "Swipe recorded successfully.", "match_id": match.id}
+    return {"message": "Swipe recorded successfully.", "match_id": result.match_id}
+
+@router.put("/me/image", response_model=UserRead)
+async def upload_profile_image(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """
+    Replaces the current user's profile image with the raw request body (JPEG, PNG or WebP).
+    The body is streamed to disk and stored under its content hash; identical images are stored once.
+    """
+    assert current_user.id is not None
+
+    declared_length = request.headers.get("content-length")
+    if declared_length and declared_length.isdigit() and int(declared_length) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Image is too large.")
+    try:
+        stored = await store_image_stream(request.stream())
+    except UploadTooLargeError:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Image is too large.")
+    except UnsupportedImageError as error:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(error))
+
+    user = await crud.set_user_image(db, current_user.id, stored.filename)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return json_response(await crud.get_profile(db, current_user.id))
 
 @router.get("/likes", response_model=List[UserRead])
-def get_users_who_liked_me(current_user: User = Depends(get_current_user), db: Session = Depends(get_session)):
-    """Returns a list of users who have liked the current user."""
+async def get_users_who_liked_me(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """
+    Returns the users who have liked the current user, oldest like first.
+    Without a limit the full list is streamed; with a limit, the cursor for the next
+    page is returned in the X-Next-Cursor header.
+    """
+    assert current_user.id is not None
+    user_id = current_user.id
+
+    async def fetch_page(session: AsyncSession, after_key: Optional[int], size: int):
+        return await crud.get_likers_page(session, user_id, after_key, size)
+
+    return await stream_user_list(db, fetch_page, _decode_list_cursor(cursor), limit)
+
+@router.get("/likes/inbox", response_model=LikeInboxPage, dependencies=[Depends(QueryBudget(4))])
+async def get_likes_inbox(
+    since: Optional[str] = None,
+    limit: int = Query(default=50, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """
+    Returns the likes received after the `since` cursor, oldest first, together with the
+    unread and total counters. Pass the returned `cursor` as `since` in the next poll; as long
+    as nothing new arrived, a poll only reads the counter row. Without `since` the inbox
+    starts at the first like ever received.
+    """
+    assert current_user.id is not None
+    after_match_id = _decode_list_cursor(since) or 0
+    total, unread, last_like_id = await crud.get_like_inbox(db, current_user.id)
+
+    rows = []
+    if last_like_id > after_match_id:
+        # One row more than requested tells whether there is more to fetch right away
+        rows = await crud.get_likes_since(db, current_user.id, after_match_id, limit + 1)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    profiles = await crud.get_profiles(db, [liker_id for _, _, liker_id in rows]) if rows else []
+    users_by_id = {profile["id"]: profile for profile in profiles}
+    # Same shape as LikeInboxPage / LikeInboxItem
+    likes = [
+        {"id": match_id, "created_at": created_at, "user": users_by_id[liker_id]}
+        for match_id, created_at, liker_id in rows if liker_id in users_by_id
+    ]
+    return json_response({
+        "unread": unread,
+        "total": total,
+        "likes": likes,
+        "cursor": encode_cursor(rows[-1][0] if rows else after_match_id),
+        "has_more": has_more,
+    })
+
+@router.post("/likes/inbox/read", response_model=LikeInboxCounts)
+async def mark_likes_read(
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Marks the received likes up to `cursor` (an inbox cursor; default: all) as read and returns the counters."""
     assert current_user.id is not None
-    users = crud.get_users_who_liked_me(db=db, current_user_id=current_user.id)
-    return _convert_users_to_user_read_list(db, users)
+    up_to_match_id = _decode_list_cursor(cursor)
+    if up_to_match_id is None:
+        _, _, up_to_match_id = await crud.get_like_inbox(db, current_user.id)
+    total, unread = await crud.mark_likes_read(db, current_user.id, up_to_match_id)
+    return json_response({"unread": unread, "total": total})
 
 @router.get("/my-likes", response_model=List[UserRead])
-def get_users_i_liked(current_user: User = Depends(get_current_user), db: Session = Depends(get_session)):
-    """Returns a list of users that the current user has liked."""
+async def get_users_i_liked(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """
+    Returns the users that the current user has liked, oldest like first.
+    Paging works like in `/likes`.
+    """
     assert current_user.id is not None
-    users = crud.get_users_i_liked(db=db, current_user_id=current_user.id)
-    return _convert_users_to_user_read_list(db, users)
+    user_id = current_user.id
+
+    async def fetch_page(session: AsyncSession, after_key: Optional[int], size: int):
+        return await crud.get_liked_users_page(session, user_id, after_key, size)
+
+    return await stream_user_list(db, fetch_page, _decode_list_cursor(cursor), limit)
+
+@router.get("/matches", response_model=MutualMatchPage)
+async def get_my_matches(
+    cursor: Optional[str] = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Returns the current user's mutual matches, newest first. Pass `next_cursor` to get the next page."""
+    assert current_user.id is not None
+    before_id = None
+    if cursor:
+        try:
+            (before_id,) = decode_cursor(cursor, 1)
+        except InvalidCursorError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+
+    # One row more than requested tells whether there is a next page
+    rows = await crud.get_mutual_matches(db, current_user.id, limit + 1, before_id)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    profiles = await crud.get_profiles(db, [other_user_id for _, other_user_id in rows])
+    users_by_id = {profile["id"]: profile for profile in profiles}
+    # Same shape as MutualMatchPage / MutualMatchRead
+    matches = [
+        {"id": match.id, "created_at": match.created_at, "user": users_by_id[other_user_id]}
+        for match, other_user_id in rows if other_user_id in users_by_id
+    ]
+    next_cursor = encode_cursor(rows[-1][0].id) if has_more and rows else None
+    return json_response({"matches": matches, "next_cursor": next_cursor})
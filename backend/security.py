@@ -1,3 +1,4 @@
+import os
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 from typing import Any
@@ -7,7 +8,10 @@ from jose import JWTError, jwt
 # English comments are used in the code as requested.
 
 # --- Password Hashing ---
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost factor (log2 of the number of rounds); lower it for load tests and local development.
+BCRYPT_ROUNDS = int(os.environ.get("ASTRODATE_BCRYPT_ROUNDS", "12"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifies a plain password against a hashed one."""
@@ -2,20 +2,23 @@
 
 import random
 from faker import Faker
-from sqlmodel import Session, select
+from sqlmodel import Session
 from datetime import date
+from typing import List
 
 from database import engine, create_db_and_tables, seed_zodiac_signs, seed_zodiac_compatibility
-from models import User, ZodiacSign
-from security import get_password_hash
-from crud import determine_zodiac_sign_for_date, get_user_by_email
+from models import User
+from hashing import password_hasher
+from crud import get_user_by_email
+from zodiac import zodiac_table
 
 # Initialisiert den Faker-Generator für deutsche Daten
 fake = Faker("de_DE")
 
-def create_specific_test_users(db: Session, all_signs: list[ZodiacSign]):
+def build_specific_test_users(db: Session) -> List[User]:
     """
-    Erstellt 4 vordefinierte, untereinander kompatible Test-Benutzer.
+    Baut die 4 vordefinierten, untereinander kompatiblen Test-Benutzer, die noch nicht
+    existieren. Die Session wird nur gelesen; gespeichert wird beim Aufrufer.
     """
     print("\nPrüfe und erstelle 4 spezifische Test-Benutzer...")
 
@@ -26,56 +29,78 @@ def create_specific_test_users(db: Session, all_signs: list[ZodiacSign]):
         {"email": "d@d.d", "password": "d", "birth_date": date(1992, 6, 5), "bio": "Mächtiger Astrologe", "image_filename": "user_d.jpg"}
     ]
 
-    for user_data in users_data:
+    # Passwörter gesammelt und parallel hashen statt einzeln im Schleifendurchlauf
+    hashed_passwords = password_hasher.hash_many([user_data["password"] for user_data in users_data])
+    # Sternzeichen aller Geburtsdaten in einem Durchlauf über die vorberechnete Tabelle bestimmen
+    zodiac_table.ensure_built(db)
+    sign_ids = zodiac_table.sign_ids_for_dates([user_data["birth_date"] for user_data in users_data])
+
+    users_to_create = []
+    for user_data, hashed_password, sign_id in zip(users_data, hashed_passwords, sign_ids):
         if get_user_by_email(db, user_data["email"]):
             print(f"Spezifischer Benutzer {user_data['email']} existiert bereits. Überspringe...")
             continue
         
-        zodiac_sign = determine_zodiac_sign_for_date(user_data["birth_date"], all_signs)
-        
         user = User(
             email=user_data["email"],
-            hashed_password=get_password_hash(user_data["password"]),
+            hashed_password=hashed_password,
             birth_date=user_data["birth_date"],
             bio=user_data["bio"],
             image_filename=user_data["image_filename"],
-            zodiac_sign=zodiac_sign
+            zodiac_sign_id=sign_id
         )
-        db.add(user)
-        sign_name = zodiac_sign.german_name if zodiac_sign else 'N/A'
+        users_to_create.append(user)
+        sign_name = zodiac_table.sign_name(sign_id) or 'N/A'
         print(f"Spezifischer Benutzer erstellt: {user.email} ({sign_name})")
+    return users_to_create
 
+
+def create_specific_test_users(db: Session):
+    """
+    Erstellt 4 vordefinierte, untereinander kompatible Test-Benutzer.
+    """
+    db.add_all(build_specific_test_users(db))
     db.commit()
     print("Spezifisches Test-Benutzer-Seeding abgeschlossen.")
 
 
-def create_fake_users(db: Session, all_signs: list[ZodiacSign]):
+def build_fake_users(db: Session) -> List[User]:
     """
-    Erstellt 100 gefälschte, zufällige Benutzer.
+    Baut 100 gefälschte, zufällige Benutzer. Die Session wird nur gelesen; gespeichert wird beim Aufrufer.
     """
     print("\nStarte das Seeding von 100 zufälligen Benutzern...")
     
     image_files = [f"{i}.jpg" for i in range(1, 101)]
     random.shuffle(image_files)
 
+    # Alle Fake-Benutzer teilen sich dasselbe Passwort: der Bulk-Hash berechnet es nur einmal
+    hashed_passwords = password_hasher.hash_many(["password123"] * len(image_files), share_identical=True)
+
+    birth_dates = [fake.date_between(start_date='-65y', end_date='-18y') for _ in image_files]
+    zodiac_table.ensure_built(db)
+    sign_ids = zodiac_table.sign_ids_for_dates(birth_dates)
+
     users_to_create = []
-    for i, image_file in enumerate(image_files): # Add enumerate to get index for progress
-        birth_date = fake.date_between(start_date='-65y', end_date='-18y')
-        zodiac_sign = determine_zodiac_sign_for_date(birth_date, all_signs)
-        
+    for i, (image_file, hashed_password, birth_date, sign_id) in enumerate(zip(image_files, hashed_passwords, birth_dates, sign_ids)): # Add enumerate to get index for progress
         user = User(
             email=fake.email(),
-            hashed_password=get_password_hash("password123"),
+            hashed_password=hashed_password,
             birth_date=birth_date,
             bio=fake.paragraph(nb_sentences=3),
             image_filename=image_file,
-            zodiac_sign=zodiac_sign
+            zodiac_sign_id=sign_id
         )
         users_to_create.append(user)
-        sign_name = zodiac_sign.german_name if zodiac_sign else 'N/A'
+        sign_name = zodiac_table.sign_name(sign_id) or 'N/A'
         print(f"Benutzer {i+1}/{len(image_files)} erstellt: {user.email} ({sign_name})") # Progress indicator
+    return users_to_create
+
 
-    db.add_all(users_to_create)
+def create_fake_users(db: Session):
+    """
+    Erstellt 100 gefälschte, zufällige Benutzer.
+    """
+    db.add_all(build_fake_users(db))
     db.commit()
     print("Seeding von 100 zufälligen Benutzern erfolgreich abgeschlossen.")
 
@@ -90,9 +115,6 @@ if __name__ == "__main__":
     print("Datenbank initialisiert.")
 
     with Session(engine) as session:
-        # Lade alle Sternzeichen einmal, um sie an die Seeding-Funktionen zu übergeben
-        all_zodiac_signs = session.exec(select(ZodiacSign)).all()
-
         print("\nWähle eine Seeding-Methode:")
         print("1: 4 spezifische Test-Benutzer erstellen")
         print("2: 100 zufällige Fake-Benutzer erstellen")
@@ -100,11 +122,11 @@ if __name__ == "__main__":
         choice = input("Auswahl (1, 2, oder 3): ")
         
         if choice == '1':
-            create_specific_test_users(session, all_zodiac_signs)
+            create_specific_test_users(session)
         elif choice == '2':
-            create_fake_users(session, all_zodiac_signs)
+            create_fake_users(session)
         elif choice == '3':
-            create_fake_users(session, all_zodiac_signs)
-            create_specific_test_users(session, all_zodiac_signs)
+            create_fake_users(session)
+            create_specific_test_users(session)
         else:
             print("Ungültige Auswahl.")
@@ -0,0 +1,52 @@
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+import orjson
+from fastapi.responses import ORJSONResponse
+
+from models import User
+from zodiac import zodiac_table
+
+# User columns needed to render a `UserRead`, in row order. Selecting only these skips ORM
+# hydration and never loads the password hash.
+USER_READ_COLUMNS = (User.id, User.email, User.birth_date, User.bio, User.image_filename, User.zodiac_sign_id)
+
+
+def user_row(user: User) -> Tuple:
+    """Converts an ORM user to a USER_READ_COLUMNS row."""
+    return (user.id, user.email, user.birth_date, user.bio, user.image_filename, user.zodiac_sign_id)
+
+
+def user_read_dict(row: Sequence[Any]) -> Dict[str, Any]:
+    """
+    Builds the `UserRead` JSON object for a USER_READ_COLUMNS row without running pydantic
+    validation. Rows are unpacked by position (attribute access on SQLAlchemy rows is far
+    slower); the key order matches `UserRead`.
+    """
+    user_id, email, birth_date, bio, image_filename, zodiac_sign_id = row
+    return {
+        "email": email,
+        "birth_date": birth_date,
+        "bio": bio,
+        "image_filename": image_filename,
+        "id": user_id,
+        "zodiac_sign_id": zodiac_sign_id,
+        "zodiac_sign_name": zodiac_table.sign_name(zodiac_sign_id),
+    }
+
+
+def user_read_dicts(rows: Iterable[Sequence[Any]]) -> List[Dict[str, Any]]:
+    return [user_read_dict(row) for row in rows]
+
+
+def dump_user_reads(rows: Iterable[Sequence[Any]]) -> bytes:
+    """Encodes rows as the items of a JSON array, without the surrounding brackets."""
+    return orjson.dumps(user_read_dicts(rows))[1:-1]
+
+
+def json_response(content: Any, **kwargs) -> ORJSONResponse:
+    """
+    Returns already-shaped content encoded by orjson. A Response returned from an endpoint
+    bypasses `response_model` validation and serialization, so the content must match the
+    declared model; the model still documents the endpoint in OpenAPI.
+    """
+    return ORJSONResponse(content, **kwargs)
@@ -0,0 +1,109 @@
+import os
+from typing import Any, Dict, NamedTuple, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+class StorageProfile(NamedTuple):
+    """
+    SQLite connection settings applied to every new connection, plus pool sizing.
+    A `None` pragma keeps SQLite's built-in default.
+    """
+    name: str
+    journal_mode: Optional[str] = None
+    synchronous: Optional[str] = None
+    mmap_size: Optional[int] = None      # bytes
+    cache_size: Optional[int] = None     # negative values are KiB, positive values are pages
+    busy_timeout_ms: Optional[int] = None
+    temp_store: Optional[str] = None
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30.0
+
+    def pragmas(self) -> Dict[str, Any]:
+        values = {
+            "journal_mode": self.journal_mode,
+            "synchronous": self.synchronous,
+            "mmap_size": self.mmap_size,
+            "cache_size": self.cache_size,
+            "busy_timeout": self.busy_timeout_ms,
+            "temp_store": self.temp_store,
+        }
+        return {pragma: value for pragma, value in values.items() if value is not None}
+
+    def pool_options(self) -> Dict[str, Any]:
+        return {"pool_size": self.pool_size, "max_overflow": self.max_overflow, "pool_timeout": self.pool_timeout}
+
+
+STORAGE_PROFILES: Dict[str, StorageProfile] = {
+    # SQLite defaults: rollback journal, synchronous=FULL, no mmap
+    "default": StorageProfile(name="default"),
+    # Readers never block the writer; NORMAL only fsyncs at checkpoints, which is safe in WAL mode
+    "wal": StorageProfile(
+        name="wal",
+        journal_mode="WAL",
+        synchronous="NORMAL",
+        mmap_size=256 * 1024 * 1024,
+        cache_size=-64 * 1024,
+        busy_timeout_ms=5000,
+        temp_store="MEMORY",
+        pool_size=10,
+        max_overflow=20,
+    ),
+    # Like "wal", but every commit is fsynced (survives power loss, not only process crashes)
+    "wal-durable": StorageProfile(
+        name="wal-durable",
+        journal_mode="WAL",
+        synchronous="FULL",
+        mmap_size=256 * 1024 * 1024,
+        cache_size=-64 * 1024,
+        busy_timeout_ms=5000,
+        temp_store="MEMORY",
+        pool_size=10,
+        max_overflow=20,
+    ),
+    # For offline seeding and imports only: no fsyncs at all
+    "bulk-load": StorageProfile(
+        name="bulk-load",
+        journal_mode="WAL",
+        synchronous="OFF",
+        mmap_size=256 * 1024 * 1024,
+        cache_size=-256 * 1024,
+        busy_timeout_ms=30000,
+        temp_store="MEMORY",
+        pool_size=2,
+        max_overflow=0,
+    ),
+}
+
+DEFAULT_STORAGE_PROFILE = "wal"
+
+
+def get_storage_profile(name: Optional[str] = None) -> StorageProfile:
+    """Returns the named profile, or the one selected by ASTRODATE_DB_PROFILE."""
+    profile_name = name or os.environ.get("ASTRODATE_DB_PROFILE", DEFAULT_STORAGE_PROFILE)
+    try:
+        return STORAGE_PROFILES[profile_name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown storage profile '{profile_name}'. Available: {', '.join(STORAGE_PROFILES)}"
+        ) from None
+
+
+def apply_storage_profile(engine: Engine, profile: StorageProfile) -> None:
+    """
+    Registers a connect hook that applies the profile's pragmas to each new connection.
+    For async engines pass `async_engine.sync_engine`.
+    """
+    pragmas = profile.pragmas()
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma, value in pragmas.items():
+                cursor.execute(f"PRAGMA {pragma}={value}")
+        finally:
+            cursor.close()
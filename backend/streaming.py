@@ -0,0 +1,87 @@
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import orjson
+from fastapi.responses import Response, StreamingResponse
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from async_crud import get_profiles
+from database import async_engine
+from pagination import encode_cursor
+
+# Rows fetched (and serialized) per round trip when streaming an unbounded list
+STREAM_CHUNK_SIZE = 500
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Fetches up to `limit` (key, user id) pairs with a key greater than `after_key`, ordered by key
+KeysetPageFetcher = Callable[[AsyncSession, Optional[int], int], Awaitable[List[Tuple[int, int]]]]
+# Fetches up to `limit` user ids greater than `after_id`, ordered by id
+UserIdPageFetcher = Callable[[AsyncSession, Optional[int], int], Awaitable[List[int]]]
+
+
+def keyed_by_user_id(fetch_ids: UserIdPageFetcher) -> KeysetPageFetcher:
+    """Adapts a fetcher of plain user ids, where every id is its own keyset key."""
+    async def fetch_page(db: AsyncSession, after_id: Optional[int], limit: int) -> List[Tuple[int, int]]:
+        return [(user_id, user_id) for user_id in await fetch_ids(db, after_id, limit)]
+    return fetch_page
+
+
+async def _serialize_chunk(db: AsyncSession, rows: Iterable[Tuple[int, int]]) -> bytes:
+    """Hydrates a chunk of user ids from the profile cache and encodes them without brackets."""
+    profiles = await get_profiles(db, [user_id for _, user_id in rows])
+    return orjson.dumps(profiles)[1:-1]
+
+async def _json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Wraps serialized item runs into a JSON array, emitting one piece per chunk."""
+    yield b"["
+    first = True
+    async for items in chunks:
+        if not items:
+            continue
+        yield items if first else b"," + items
+        first = False
+    yield b"]"
+
+
+async def stream_user_list(
+    db: AsyncSession,
+    fetch_page: KeysetPageFetcher,
+    after_key: Optional[int],
+    limit: Optional[int],
+) -> Response:
+    """
+    Streams users as a JSON array of `UserRead` objects, hydrated from the profile cache.
+
+    With a `limit`, one page (plus one look-ahead row) is read and the cursor of the
+    next page is sent in the X-Next-Cursor header. Without a limit, the whole list is
+    read in keyset chunks on a dedicated session while the response is being sent,
+    so memory stays bounded by the chunk size.
+    """
+    headers: Dict[str, str] = {}
+
+    if limit is not None:
+        rows = await fetch_page(db, after_key, limit + 1)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1][0])
+
+        # Hydrated before returning: the request's session is closed once the body is sent
+        body = b"[" + await _serialize_chunk(db, rows) + b"]"
+        return Response(body, media_type="application/json", headers=headers)
+
+    async def all_chunks() -> AsyncIterator[bytes]:
+        # The request's session may already be closed while the body is sent
+        async with AsyncSession(async_engine) as session:
+            key = after_key
+            while True:
+                rows = await fetch_page(session, key, STREAM_CHUNK_SIZE)
+                if not rows:
+                    return
+                yield await _serialize_chunk(session, rows)
+                if len(rows) < STREAM_CHUNK_SIZE:
+                    return
+                key = rows[-1][0]
+                # Drop identity-map references so memory does not grow with the list
+                session.expunge_all()
+
+    return StreamingResponse(_json_array(all_chunks()), media_type="application/json", headers=headers)
@@ -0,0 +1,367 @@
+"""
+Optional write-behind mode for swipes (`ASTRODATE_SWIPE_WRITE_MODE=write-behind`).
+
+In the default `direct` mode every swipe commits its own transaction and waits for the SQLite
+write lock. In write-behind mode a swipe is acknowledged as soon as it is appended to a journal
+file and fsynced, and a single writer task stores the queued swipes in batched transactions:
+- Journal appends are group-committed too. All swipes that arrive while an fsync is running
+  share the next one.
+- A batch is written once `ASTRODATE_SWIPE_BATCH_SIZE` swipes are queued, or when the oldest
+  one has waited `ASTRODATE_SWIPE_MAX_DELAY_MS`.
+- Mutual matches are detected by the writer, inside the batch transaction, after all swipes of
+  the batch are inserted. Two likes in the same batch, or a like in the batch and one in the
+  database, both count. The response already reports a mutual match if the other like is
+  stored or queued.
+- The inbox counters of the liked users are updated in the same transaction, from the rows
+  the batch actually inserted.
+- On shutdown the queue is drained. After a crash the journal is replayed on the next start.
+  Replaying is idempotent, because the first swipe on a user wins.
+
+Queued swipes are missing from the like and match lists until their batch is written, at most
+the maximum delay later. The response has no `match_id` for a swipe that is still queued.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, IO, List, NamedTuple, Optional, Tuple
+
+import orjson
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single journal, no locking between processes
+    fcntl = None
+
+import async_crud as crud
+from crud import (
+    SwipeResult,
+    like_inbox_rows,
+    like_inbox_upsert_statement,
+    mutual_like_pairs_statement,
+    mutual_match_batch_insert_statement,
+    record_swipe_in_memory,
+    swipe_batch_insert_statement,
+    swipe_result_from_row,
+    swipe_result_statement,
+)
+from database import async_engine, async_write_lock
+from metrics import Gauge, Histogram, registry
+
+SWIPE_WRITE_MODES = ("direct", "write-behind")
+# `direct`: one transaction per swipe; `write-behind`: journal plus batched transactions
+SWIPE_WRITE_MODE = os.environ.get("ASTRODATE_SWIPE_WRITE_MODE", "direct").lower()
+# Maximum number of swipes written in one transaction
+SWIPE_BATCH_SIZE = int(os.environ.get("ASTRODATE_SWIPE_BATCH_SIZE", "256"))
+# Longest time a queued swipe waits for its batch to fill up
+SWIPE_MAX_DELAY_SECONDS = float(os.environ.get("ASTRODATE_SWIPE_MAX_DELAY_MS", "20")) / 1000
+# Directory of the journals; every worker process locks its own file in it
+SWIPE_JOURNAL_DIR = os.environ.get("ASTRODATE_SWIPE_JOURNAL_DIR", "./swipe_journal")
+# Upper bound for the number of journal files, i.e. of write-behind worker processes
+MAX_JOURNAL_SLOTS = 64
+# Swipes per INSERT statement; five bound parameters each, well below SQLite's variable limit
+INSERT_CHUNK_SIZE = 1000
+# Seconds to wait before retrying a batch whose transaction failed (e.g. a busy database)
+RETRY_DELAY_SECONDS = 0.5
+
+logger = logging.getLogger("astrodate.swipes")
+
+swipe_batch_size = registry.register(Histogram(
+    "astrodate_swipe_batch_size", "Swipes written per write-behind transaction.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024),
+))
+swipe_queue_depth = registry.register(Gauge(
+    "astrodate_swipe_queue_depth", "Swipes acknowledged but not yet written to the database."))
+
+
+class QueuedSwipe(NamedTuple):
+    user_id_from: int
+    user_id_to: int
+    is_like: bool
+    created_at: datetime
+
+    def to_journal_line(self) -> bytes:
+        return orjson.dumps([self.user_id_from, self.user_id_to, self.is_like, self.created_at]) + b"\n"
+
+    @classmethod
+    def from_journal_line(cls, line: bytes) -> "QueuedSwipe":
+        user_id_from, user_id_to, is_like, created_at = orjson.loads(line)
+        return cls(user_id_from, user_id_to, is_like, datetime.fromisoformat(created_at))
+
+
+class SwipeJournal:
+    """
+    Append-only file of acknowledged swipes. The file is emptied whenever every swipe in it
+    has been committed. Each process locks a free slot, so a journal left behind by a crashed
+    worker is replayed by the next process that takes its slot.
+    """
+
+    def __init__(self, directory: str = SWIPE_JOURNAL_DIR) -> None:
+        self.directory = directory
+        self.path: Optional[str] = None
+        self._file: Optional[IO[bytes]] = None
+        self._lock = threading.Lock()
+        # Swipes appended since the file was last emptied
+        self.written = 0
+
+    def open(self) -> List[QueuedSwipe]:
+        """Locks a journal file and returns the swipes a previous process left in it."""
+        os.makedirs(self.directory, exist_ok=True)
+        for slot in range(MAX_JOURNAL_SLOTS if fcntl is not None else 1):
+            path = os.path.join(self.directory, f"swipes-{slot}.jsonl")
+            handle = open(path, "a+b")
+            if fcntl is not None:
+                try:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    handle.close()
+                    continue
+            self.path, self._file = path, handle
+            break
+        else:
+            raise RuntimeError(f"All {MAX_JOURNAL_SLOTS} swipe journals in {self.directory} are in use")
+
+        handle.seek(0)
+        leftovers = []
+        for line in handle:
+            try:
+                leftovers.append(QueuedSwipe.from_journal_line(line))
+            except (ValueError, TypeError):
+                # The last line of a crashed process may be incomplete; it was never acknowledged
+                logger.warning("Skipping damaged line in %s", self.path)
+        self.written = len(leftovers)
+        return leftovers
+
+    def append(self, swipes: List[QueuedSwipe]) -> None:
+        assert self._file is not None
+        with self._lock:
+            self._file.write(b"".join(swipe.to_journal_line() for swipe in swipes))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.written += len(swipes)
+
+    def truncate_if_committed(self, committed: int) -> bool:
+        """Empties the file if all `committed` swipes are everything it holds."""
+        assert self._file is not None
+        with self._lock:
+            if self.written != committed:
+                return False
+            self._file.truncate(0)
+            os.fsync(self._file.fileno())
+            self.written = 0
+            return True
+
+    def close(self) -> None:
+        if self._file is not None:
+            # Closing the file also releases the lock
+            self._file.close()
+            self._file = None
+
+
+class SwipeQueue:
+    """
+    Write-behind queue for swipes. All state is only touched from the event loop, so no locks
+    are needed; file and database work runs in threads or on the async engine.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = SWIPE_BATCH_SIZE,
+        max_delay: float = SWIPE_MAX_DELAY_SECONDS,
+        journal: Optional[SwipeJournal] = None,
+    ) -> None:
+        self.batch_size = max(1, batch_size)
+        self.max_delay = max_delay
+        self.journal = journal or SwipeJournal()
+        # Swipes waiting for the journal, and journaled swipes waiting for the writer
+        self._journal_waiting: List[Tuple[QueuedSwipe, "asyncio.Future[None]"]] = []
+        self._journal_task: Optional["asyncio.Task[None]"] = None
+        self._queue: List[Tuple[QueuedSwipe, float]] = []
+        # Acknowledged swipes by (user_id_from, user_id_to) until they are committed; the
+        # first swipe on a user wins, like in the database
+        self._pending: Dict[Tuple[int, int], bool] = {}
+        # Committed keys are only dropped from `_pending` once no lookup that might have read
+        # the database before the commit is still running
+        self._lookups = 0
+        self._committed_keys: List[Tuple[int, int]] = []
+        self._committed = 0
+        self._queue_changed = asyncio.Event()
+        self._writer: Optional["asyncio.Task[None]"] = None
+        self._closing = False
+
+    @property
+    def running(self) -> bool:
+        return self._writer is not None
+
+    async def start(self) -> int:
+        """Opens the journal, writes the swipes left in it and starts the writer. Returns the replayed count."""
+        leftovers = await asyncio.to_thread(self.journal.open)
+        for start in range(0, len(leftovers), self.batch_size):
+            await self._commit(leftovers[start:start + self.batch_size])
+        if leftovers:
+            await asyncio.to_thread(self.journal.truncate_if_committed, len(leftovers))
+            logger.info("Replayed %d swipes from %s", len(leftovers), self.journal.path)
+        self._closing = False
+        self._writer = asyncio.create_task(self._run())
+        return len(leftovers)
+
+    async def close(self) -> None:
+        """Writes every queued swipe and releases the journal."""
+        if self._writer is None:
+            return
+        if self._journal_task is not None:
+            await self._journal_task
+        self._closing = True
+        self._queue_changed.set()
+        await self._writer
+        self._writer = None
+        await asyncio.to_thread(self.journal.close)
+
+    async def submit(self, db: AsyncSession, user_id_from: int, user_id_to: int, is_like: bool) -> Optional[SwipeResult]:
+        """
+        Counterpart of `async_crud.swipe`: returns once the swipe is journaled. Returns None if
+        the target user does not exist.
+        """
+        if await crud.get_profile(db, user_id_to) is None:
+            return None
+        key, reverse_key = (user_id_from, user_id_to), (user_id_to, user_id_from)
+
+        # Pending state is read before and after the database, so a swipe committed while the
+        # read runs is seen on one of the two sides
+        self._lookups += 1
+        try:
+            pending_before = (self._pending.get(key), self._pending.get(reverse_key))
+            connection = await db.connection()
+            row = (await connection.execute(swipe_result_statement(user_id_from, user_id_to))).first()
+        finally:
+            self._lookups -= 1
+            self._drop_committed_keys()
+        own_pending = self._pending.get(key, pending_before[0])
+        liked_back = bool(row is not None and row.liked_back) or pending_before[1] is True \
+            or self._pending.get(reverse_key) is True
+
+        if row is not None:
+            stored = swipe_result_from_row(row)
+            assert stored is not None
+            return stored._replace(is_mutual=stored.is_like and liked_back)
+        if own_pending is not None:
+            return SwipeResult(match_id=None, is_like=own_pending, is_mutual=own_pending and liked_back)
+
+        swipe = QueuedSwipe(user_id_from, user_id_to, is_like, datetime.utcnow())
+        self._pending[key] = is_like
+        await self._append_to_journal(swipe)
+        record_swipe_in_memory(user_id_from, user_id_to)
+        return SwipeResult(match_id=None, is_like=is_like, is_mutual=is_like and liked_back)
+
+    async def _append_to_journal(self, swipe: QueuedSwipe) -> None:
+        future = asyncio.get_running_loop().create_future()
+        self._journal_waiting.append((swipe, future))
+        if self._journal_task is None or self._journal_task.done():
+            self._journal_task = asyncio.create_task(self._flush_journal())
+        # The swipe is queued even if the request goes away while waiting
+        await asyncio.shield(future)
+
+    async def _flush_journal(self) -> None:
+        while self._journal_waiting:
+            waiting, self._journal_waiting = self._journal_waiting, []
+            swipes = [swipe for swipe, _ in waiting]
+            try:
+                await asyncio.to_thread(self.journal.append, swipes)
+            except OSError as error:
+                for swipe, future in waiting:
+                    self._pending.pop((swipe.user_id_from, swipe.user_id_to), None)
+                    future.set_exception(error)
+                continue
+            now = time.monotonic()
+            self._queue.extend((swipe, now) for swipe in swipes)
+            swipe_queue_depth.set(value=len(self._queue))
+            self._queue_changed.set()
+            for _, future in waiting:
+                future.set_result(None)
+
+    async def _run(self) -> None:
+        while True:
+            if not self._queue:
+                if self._closing:
+                    return
+                self._queue_changed.clear()
+                await self._queue_changed.wait()
+                continue
+            # Let the batch fill up until it is full or its oldest swipe has waited long enough
+            deadline = self._queue[0][1] + self.max_delay
+            while len(self._queue) < self.batch_size and not self._closing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._queue_changed.clear()
+                try:
+                    await asyncio.wait_for(self._queue_changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [swipe for swipe, _ in self._queue[:self.batch_size]]
+            try:
+                await self._commit(batch)
+            except Exception:
+                if self._closing:
+                    # Nothing is lost: the journal is replayed at the next start
+                    logger.exception("Writing %d queued swipes failed on shutdown, they stay in %s",
+                                     len(self._queue), self.journal.path)
+                    return
+                logger.exception("Writing %d queued swipes failed, retrying", len(batch))
+                await asyncio.sleep(RETRY_DELAY_SECONDS)
+                continue
+            del self._queue[:len(batch)]
+            swipe_queue_depth.set(value=len(self._queue))
+            swipe_batch_size.observe(len(batch))
+
+            self._committed += len(batch)
+            self._committed_keys.extend((swipe.user_id_from, swipe.user_id_to) for swipe in batch)
+            self._drop_committed_keys()
+            # Empty the journal once everything in it is in the database
+            if not self._queue and await asyncio.to_thread(self.journal.truncate_if_committed, self._committed):
+                self._committed = 0
+
+    async def _commit(self, batch: List[QueuedSwipe]) -> None:
+        """
+        Inserts a batch of swipes in one transaction, together with the mutual matches they
+        complete and the inbox counters of the liked users.
+        """
+        likes = [(swipe.user_id_from, swipe.user_id_to) for swipe in batch if swipe.is_like]
+        async with async_write_lock, async_engine.begin() as connection:
+            new_likes = []
+            for start in range(0, len(batch), INSERT_CHUNK_SIZE):
+                inserted = await connection.execute(swipe_batch_insert_statement(batch[start:start + INSERT_CHUNK_SIZE]))
+                new_likes.extend((match_id, user_id_to) for match_id, user_id_to, is_like in inserted.all() if is_like)
+            if new_likes:
+                await connection.execute(like_inbox_upsert_statement(), like_inbox_rows(new_likes))
+            if not likes:
+                return
+            mutual_pairs = {
+                tuple(sorted(pair)) for pair in (await connection.execute(mutual_like_pairs_statement(likes))).all()
+            }
+            if mutual_pairs:
+                now = datetime.utcnow()
+                await connection.execute(mutual_match_batch_insert_statement(), [
+                    {"user_id_low": low, "user_id_high": high, "created_at": now} for low, high in sorted(mutual_pairs)
+                ])
+
+    def _drop_committed_keys(self) -> None:
+        if self._lookups or not self._committed_keys:
+            return
+        for key in self._committed_keys:
+            self._pending.pop(key, None)
+        self._committed_keys.clear()
+
+
+def write_behind_enabled() -> bool:
+    if SWIPE_WRITE_MODE not in SWIPE_WRITE_MODES:
+        raise ValueError(f"Unknown swipe write mode {SWIPE_WRITE_MODE!r}, expected one of: {', '.join(SWIPE_WRITE_MODES)}")
+    return SWIPE_WRITE_MODE == "write-behind"
+
+
+# Shared instance; only started in write-behind mode
+swipe_queue = SwipeQueue()
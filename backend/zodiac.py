@@ -0,0 +1,103 @@
+import threading
+from array import array
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from models import ZodiacSign
+
+# First day-of-year index of every month in a leap year, so Feb 29 has its own slot
+_MONTH_OFFSETS = (0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335)
+_DAYS_IN_LEAP_YEAR = 366
+# Marker for days that no sign covers
+_NO_SIGN = 0
+
+
+def day_of_year_index(birth_date: date) -> int:
+    """Maps a date to 0..365, using the leap-year calendar for every year."""
+    return _MONTH_OFFSETS[birth_date.month - 1] + birth_date.day - 1
+
+
+class ZodiacTable:
+    """
+    Precomputed day-of-year → sign id table.
+
+    It is built once from the `ZodiacSign` rows and afterwards answers lookups without a
+    database session. ORM changes to `ZodiacSign` mark it stale; the next `ensure_built`
+    call rebuilds it.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._sign_ids = array("H", [_NO_SIGN] * _DAYS_IN_LEAP_YEAR)
+        self._names: Dict[int, str] = {}
+        self._current = False
+
+    @property
+    def is_current(self) -> bool:
+        return self._current
+
+    def invalidate(self) -> None:
+        self._current = False
+
+    def ensure_built(self, db: Session) -> None:
+        """(Re)builds the table from the database if it is missing or stale."""
+        if self._current:
+            return
+        # Read before taking the lock: through `run_sync` the query yields to the event loop,
+        # and a second coroutine on the same thread would block it on the held lock
+        signs = db.exec(select(ZodiacSign)).all()
+        with self._lock:
+            if not self._current:
+                self.build(signs)
+
+    def build(self, signs: Sequence[ZodiacSign]) -> None:
+        """Fills the table from sign rows, walking each sign's date range once."""
+        sign_ids = array("H", [_NO_SIGN] * _DAYS_IN_LEAP_YEAR)
+        for sign in signs:
+            if sign.id is None:
+                continue
+            day = date(2000, sign.start_month, sign.start_day)
+            end_index = day_of_year_index(date(2000, sign.end_month, sign.end_day))
+            # Ranges such as Capricorn wrap around the turn of the year
+            for _ in range(_DAYS_IN_LEAP_YEAR):
+                index = day_of_year_index(day)
+                sign_ids[index] = sign.id
+                if index == end_index:
+                    break
+                day = day + timedelta(days=1) if (day.month, day.day) != (12, 31) else date(2000, 1, 1)
+
+        self._sign_ids = sign_ids
+        self._names = {sign.id: sign.german_name for sign in signs if sign.id is not None}
+        self._current = True
+
+    def sign_id_for_date(self, birth_date: date) -> Optional[int]:
+        """Returns the sign id for a birth date in O(1)."""
+        sign_id = self._sign_ids[day_of_year_index(birth_date)]
+        return sign_id if sign_id != _NO_SIGN else None
+
+    def sign_ids_for_dates(self, birth_dates: Iterable[date]) -> List[Optional[int]]:
+        """Bulk lookup for many birth dates (e.g. seeding and imports)."""
+        sign_ids = self._sign_ids
+        offsets = _MONTH_OFFSETS
+        return [
+            sign_ids[offsets[birth_date.month - 1] + birth_date.day - 1] or None
+            for birth_date in birth_dates
+        ]
+
+    def sign_name(self, sign_id: Optional[int]) -> Optional[str]:
+        """Returns the German sign name for a sign id."""
+        return self._names.get(sign_id) if sign_id is not None else None
+
+
+# Shared instance; built at startup
+zodiac_table = ZodiacTable()
+
+
+@event.listens_for(ZodiacSign, "after_insert")
+@event.listens_for(ZodiacSign, "after_update")
+@event.listens_for(ZodiacSign, "after_delete")
+def _invalidate_zodiac_table(_mapper, _connection, _target: ZodiacSign) -> None:
+    zodiac_table.invalidate()
@@ -1,103 +1,395 @@
-import requests
+"""
+Lädt Profilbilder parallel herunter und speichert sie fortlaufend nummeriert (1.jpg, 2.jpg, ...).
+
+Mehrere Worker-Threads teilen sich eine `requests.Session` mit Connection-Pool, ein
+Token-Bucket begrenzt die Anfragerate über alle Threads hinweg. Fehlgeschlagene Anfragen
+(Netzwerkfehler, 429, 5xx) werden mit exponentiellem Backoff wiederholt; ein `Retry-After`
+des Servers bremst alle Worker gemeinsam.
+
+Das Zielverzeichnis wird nur einmal beim Start durchsucht, danach vergibt ein Zähler die
+Dateinummern. Fertige Bilder werden per `os.link` unter ihrer Nummer veröffentlicht; das
+schlägt fehl, wenn die Datei schon existiert (z.B. durch einen parallel laufenden Scraper),
+und es wird die nächste Nummer genommen. Halbfertige Dateien gibt es dadurch nie.
+
+Jeder Batch führt ein Journal (`.scraper_journal.jsonl` im Zielverzeichnis). Ein
+abgebrochener Batch (Strg+C, Netzwerkausfall) wird mit `--resume` fortgesetzt.
+
+Aufruf aus dem Repository-Verzeichnis:
+    python scraper.py 500 --workers 8 --rate 4
+    python scraper.py --resume
+    python scraper.py 20 --url http://127.0.0.1:8080/face.jpg --dir /tmp/bilder
+"""
+import argparse
+import json
 import os
+import random
+import sys
+import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
 
 # --- Konfiguration ---
-# Die URL von der das Bild heruntergeladen wird.
-IMAGE_URL = "https://thispersondoesnotexist.com/"
+# Die URL von der das Bild heruntergeladen wird (für Tests auf einen lokalen Server umstellbar).
+IMAGE_URL = os.environ.get("ASTRODATE_SCRAPER_URL", "https://thispersondoesnotexist.com/")
 # Das Verzeichnis, in dem die Bilder gespeichert werden sollen.
 IMAGE_DIR = os.path.join("backend", "userImages")
+# Anzahl paralleler Downloads
+DEFAULT_WORKERS = 4
+# Höchstens so viele Anfragen pro Sekunde (über alle Worker); 0 = unbegrenzt
+DEFAULT_RATE = 2.0
+# Wiederholungen pro Bild, bevor der Batch abgebrochen wird
+DEFAULT_RETRIES = 5
+# Wartezeit vor der ersten Wiederholung in Sekunden; verdoppelt sich pro Versuch
+BACKOFF_BASE = 0.5
+# Obergrenze für eine einzelne Wartezeit (auch für Retry-After)
+BACKOFF_MAX = 60.0
+# Timeout für Verbindungsaufbau und Lesen in Sekunden
+REQUEST_TIMEOUT = (5, 30)
+# Statuscodes, bei denen sich eine Wiederholung lohnt
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# Journal des laufenden Batches (liegt im Zielverzeichnis)
+JOURNAL_NAME = ".scraper_journal.jsonl"
 # --- Ende der Konfiguration ---
 
-def find_next_filename():
+# JPEG-Dateien beginnen immer mit diesen Bytes
+JPEG_MAGIC = b"\xff\xd8\xff"
+
+
+class DownloadError(Exception):
+    """Ein Bild konnte auch nach allen Wiederholungen nicht geladen werden."""
+
+
+class RateLimiter:
     """
-    Findet den nächsten verfügbaren Dateinamen im Zielverzeichnis.
-    Die Dateinamen sind fortlaufend nummeriert (1.jpg, 2.jpg, ...).
+    Token-Bucket, den sich alle Worker teilen. `acquire` blockiert, bis die nächste Anfrage
+    erlaubt ist; `defer` verschiebt alle weiteren Anfragen (für Retry-After).
     """
-    # Sicherstellen, dass das Verzeichnis existiert
-    os.makedirs(IMAGE_DIR, exist_ok=True)
-    
-    # Bestehende .jpg-Dateien im Verzeichnis finden
-    existing_files = [f for f in os.listdir(IMAGE_DIR) if f.endswith('.jpg')]
-    
-    # Die höchste existierende Nummer finden
-    highest_number = 0
-    for f in existing_files:
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.burst = burst
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            # Ungenutzte Slots verfallen bis auf `burst` Stück
+            slot = max(self._next_slot, now - (self.burst - 1) * self.interval)
+            self._next_slot = slot + self.interval
+        # Außerhalb des Locks schlafen, damit die anderen Worker ihren Slot reservieren können
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def defer(self, seconds: float) -> None:
+        with self._lock:
+            self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+
+def highest_existing_number(image_dir: str) -> int:
+    """Durchsucht das Verzeichnis einmalig nach der höchsten vergebenen Bildnummer."""
+    highest = 0
+    with os.scandir(image_dir) as entries:
+        for entry in entries:
+            stem, extension = os.path.splitext(entry.name)
+            if extension == ".jpg" and stem.isdigit():
+                highest = max(highest, int(stem))
+    return highest
+
+
+class FileNumberAllocator:
+    """Vergibt Dateinummern ohne erneutes Durchsuchen des Verzeichnisses."""
+
+    def __init__(self, image_dir: str) -> None:
+        self.image_dir = image_dir
+        self._next_number = highest_existing_number(image_dir) + 1
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> int:
+        with self._lock:
+            number = self._next_number
+            self._next_number += 1
+            return number
+
+    def publish(self, temporary_path: str) -> str:
+        """
+        Legt die fertige temporäre Datei unter der nächsten freien Nummer ab und gibt den
+        Dateinamen zurück. `os.link` ist atomar und überschreibt nie eine vorhandene Datei.
+        """
         try:
-            # Dateiname ohne Erweiterung extrahieren und in eine Zahl umwandeln
-            number = int(f.split('.')[0])
-            if number > highest_number:
-                highest_number = number
-        except ValueError:
-            # Ignoriert Dateien, die nicht dem erwarteten nummerierten Format entsprechen
-            continue
-            
-    # Die nächste Nummer ist die höchste existierende + 1
-    next_file_number = highest_number + 1
-    
-    return os.path.join(IMAGE_DIR, f"{next_file_number}.jpg")
-
-def download_image(file_path):
+            while True:
+                filename = f"{self._reserve()}.jpg"
+                try:
+                    os.link(temporary_path, os.path.join(self.image_dir, filename))
+                    return filename
+                except FileExistsError:
+                    # Nummer wurde von einem anderen Prozess belegt
+                    continue
+        finally:
+            os.remove(temporary_path)
+
+
+class BatchJournal:
     """
-    Lädt ein einzelnes Bild von der IMAGE_URL herunter und speichert es unter dem angegebenen file_path.
+    Append-only Journal eines Batches: die erste Zeile beschreibt den Auftrag, danach folgt
+    pro gespeichertem Bild eine Zeile. Ein Eintrag kostet unabhängig von der Batchgröße
+    nur ein Anhängen an die Datei.
     """
+
+    def __init__(self, path: str, requested: int, url: str, completed: int = 0) -> None:
+        self.path = path
+        self.requested = requested
+        self.url = url
+        self.completed = completed
+        self._lock = threading.Lock()
+        self._handle = open(path, "a", encoding="utf-8")
+
+    @classmethod
+    def start(cls, path: str, requested: int, url: str) -> "BatchJournal":
+        with open(path, "w", encoding="utf-8") as handle:
+            handle.write(json.dumps({"requested": requested, "url": url}) + "\n")
+        return cls(path, requested, url)
+
+    @classmethod
+    def resume(cls, path: str) -> Optional["BatchJournal"]:
+        """Öffnet ein unvollständiges Journal; None, wenn es keinen offenen Batch gibt."""
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as handle:
+            header = json.loads(handle.readline() or "{}")
+            completed = sum(1 for line in handle if line.strip())
+        if "requested" not in header or completed >= header["requested"]:
+            return None
+        return cls(path, header["requested"], header.get("url") or IMAGE_URL, completed)
+
+    @property
+    def remaining(self) -> int:
+        return max(self.requested - self.completed, 0)
+
+    def record(self, filename: str) -> int:
+        with self._lock:
+            self._handle.write(filename + "\n")
+            self._handle.flush()
+            self.completed += 1
+            return self.completed
+
+    def close(self) -> None:
+        self._handle.close()
+        # Abgeschlossene Batches brauchen kein Journal mehr
+        if self.completed >= self.requested:
+            os.remove(self.path)
+
+
+def create_session(workers: int) -> requests.Session:
+    """Session mit einem Connection-Pool, der für alle Worker reicht (Keep-Alive statt Neuaufbau)."""
+    session = requests.Session()
+    session.headers["User-Agent"] = "Mozilla/5.0"
+    # Wiederholungen übernimmt `fetch_image`, damit auch sie durch den Rate-Limiter laufen
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _retry_after_seconds(response: requests.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
     try:
-        print(f"Lade Bild herunter von: {IMAGE_URL}")
-        # Eine GET-Anfrage an die URL senden. Der User-Agent wird gesetzt, um Blockierungen zu vermeiden.
-        response = requests.get(IMAGE_URL, headers={'User-Agent': 'Mozilla/5.0'})
-        # Überprüft, ob die Anfrage erfolgreich war (Statuscode 200)
-        response.raise_for_status()
-
-        # Das Bild im Binärmodus in die Zieldatei schreiben
-        with open(file_path, 'wb') as f:
-            f.write(response.content)
-        
-        print(f"Bild erfolgreich als '{file_path}' gespeichert.")
-        return True
-
-    except requests.exceptions.RequestException as e:
-        # Fängt Fehler ab, die bei der Netzwerkanfrage auftreten können
-        print(f"Fehler beim Herunterladen des Bildes: {e}")
-        return False
-
-def main():
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def fetch_image(session: requests.Session, url: str, limiter: RateLimiter, retries: int,
+                stop: threading.Event) -> bytes:
+    """Lädt ein Bild; wiederholt bei Netzwerkfehlern, 429 und 5xx mit exponentiellem Backoff."""
+    for attempt in range(retries + 1):
+        if stop.is_set():
+            raise DownloadError("Batch wurde abgebrochen.")
+        limiter.acquire()
+        retry_after = None
+        try:
+            response = session.get(url, timeout=REQUEST_TIMEOUT)
+            if response.status_code == 200 and response.content.startswith(JPEG_MAGIC):
+                return response.content
+            if response.status_code == 200:
+                reason = "Antwort ist kein JPEG-Bild"
+            elif response.status_code in RETRY_STATUS:
+                reason = f"HTTP {response.status_code}"
+                retry_after = _retry_after_seconds(response)
+            else:
+                # Andere Fehler (404, 403, ...) werden durch Wiederholen nicht besser
+                raise DownloadError(f"HTTP {response.status_code} von {url}")
+        except requests.exceptions.RequestException as error:
+            reason = type(error).__name__
+
+        if attempt == retries:
+            raise DownloadError(f"{reason} nach {retries + 1} Versuchen")
+        if retry_after is not None:
+            delay = min(retry_after, BACKOFF_MAX)
+            # Der Server hat um eine Pause gebeten: sie gilt für alle Worker
+            limiter.defer(delay)
+        else:
+            # Jitter verhindert, dass alle Worker gleichzeitig erneut anfragen
+            delay = min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX) * random.uniform(0.5, 1.0)
+        print(f"  {reason}, neuer Versuch in {delay:.1f} s", file=sys.stderr)
+        stop.wait(delay)
+    raise DownloadError("Keine Versuche erlaubt.")
+
+
+def download_batch(journal: BatchJournal, url: str = IMAGE_URL, image_dir: str = IMAGE_DIR,
+                   workers: int = DEFAULT_WORKERS, rate: float = DEFAULT_RATE,
+                   retries: int = DEFAULT_RETRIES, session: Optional[requests.Session] = None) -> int:
     """
-    Die Hauptfunktion des Skripts. Frägt den Benutzer, wie viele Bilder heruntergeladen werden sollen,
-    und führt den Download-Prozess in einer Schleife aus.
+    Lädt die im Journal noch offenen Bilder mit `workers` Threads herunter und gibt die Zahl
+    der in diesem Lauf gespeicherten Bilder zurück. Scheitert ein Bild endgültig, werden keine
+    neuen Downloads mehr begonnen; der Batch bleibt im Journal fortsetzbar.
     """
+    allocator = FileNumberAllocator(image_dir)
+    limiter = RateLimiter(rate, burst=workers)
+    session = session or create_session(workers)
+    stop = threading.Event()
+    claim_lock = threading.Lock()
+    open_slots = journal.remaining
+    saved = 0
+    errors = []
+
+    def claim() -> bool:
+        nonlocal open_slots
+        with claim_lock:
+            if stop.is_set() or open_slots <= 0:
+                return False
+            open_slots -= 1
+            return True
+
+    def worker() -> None:
+        nonlocal saved
+        while claim():
+            try:
+                content = fetch_image(session, url, limiter, retries, stop)
+            except DownloadError as error:
+                if not stop.is_set():
+                    errors.append(error)
+                    stop.set()
+                return
+            temporary = os.path.join(image_dir, f".{uuid.uuid4().hex}.part")
+            with open(temporary, "wb") as handle:
+                handle.write(content)
+            filename = allocator.publish(temporary)
+            completed = journal.record(filename)
+            with claim_lock:
+                saved += 1
+            print(f"[{completed}/{journal.requested}] Bild gespeichert als '{os.path.join(image_dir, filename)}'")
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scraper")
+    futures = [executor.submit(worker) for _ in range(min(workers, journal.remaining))]
     try:
-        # Den Benutzer fragen, wie viele Bilder heruntergeladen werden sollen
-        num_images_to_download = int(input("Wie viele Bilder möchten Sie herunterladen? "))
-        if num_images_to_download <= 0:
-            print("Bitte geben Sie eine positive Zahl ein.")
-            return
+        for future in futures:
+            future.result()
+    except KeyboardInterrupt:
+        # Laufende Downloads noch fertigstellen, damit das Journal konsistent bleibt
+        print("\nAbbruch angefordert, warte auf laufende Downloads...", file=sys.stderr)
+        stop.set()
+        raise
+    finally:
+        executor.shutdown(wait=True)
+    if errors:
+        print(f"Fehler beim Herunterladen des Bildes: {errors[0]}", file=sys.stderr)
+    return saved
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Lädt Profilbilder parallel herunter.")
+    parser.add_argument("count", type=int, nargs="?", help="Anzahl der Bilder (ohne Angabe wird nachgefragt)")
+    parser.add_argument("--resume", action="store_true", help="Einen abgebrochenen Batch fortsetzen")
+    parser.add_argument("--url", default=None, help=f"Bildquelle (Standard: {IMAGE_URL})")
+    parser.add_argument("--dir", default=IMAGE_DIR, help="Zielverzeichnis")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Parallele Downloads")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="Max. Anfragen pro Sekunde (0 = unbegrenzt)")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help="Wiederholungen pro Bild")
+    return parser.parse_args(argv)
+
+
+def ask_for_count() -> Optional[int]:
+    """Fragt den Benutzer interaktiv, wie viele Bilder heruntergeladen werden sollen."""
+    try:
+        count = int(input("Wie viele Bilder möchten Sie herunterladen? "))
     except ValueError:
         print("Ungültige Eingabe. Bitte geben Sie eine Zahl ein.")
-        return
-
-    print(f"\nStarte den Download von {num_images_to_download} Bildern...")
-    
-    downloaded_count = 0
-    for i in range(num_images_to_download):
-        print(f"\n--- Bild {i+1}/{num_images_to_download} ---")
-        
-        # Den nächsten freien Dateinamen ermitteln
-        file_path = find_next_filename()
-        
-        # Das Bild herunterladen
-        if download_image(file_path):
-            downloaded_count += 1
-            # Eine kleine Pause einlegen, um den Server nicht zu überlasten
-            time.sleep(1)
-        else:
-            # Bei einem Fehler den Vorgang abbrechen
-            print("Download abgebrochen aufgrund eines Fehlers.")
-            break
-            
-    print(f"\nDownload abgeschlossen. {downloaded_count} von {num_images_to_download} Bildern erfolgreich heruntergeladen.")
+        return None
+    if count <= 0:
+        print("Bitte geben Sie eine positive Zahl ein.")
+        return None
+    return count
+
+
+def main(argv=None) -> int:
+    """
+    Die Hauptfunktion des Skripts. Startet einen neuen Batch oder setzt einen abgebrochenen
+    fort und führt die Downloads parallel aus.
+    """
+    args = parse_args(argv)
+    if args.workers <= 0:
+        print("--workers muss mindestens 1 sein.", file=sys.stderr)
+        return 2
+    os.makedirs(args.dir, exist_ok=True)
+    journal_path = os.path.join(args.dir, JOURNAL_NAME)
+    pending = BatchJournal.resume(journal_path)
+
+    if args.resume:
+        if pending is None:
+            print("Kein abgebrochener Batch gefunden.")
+            return 0
+        journal = pending
+        url = args.url or pending.url
+        print(f"Setze Batch fort: {journal.completed} von {journal.requested} Bildern bereits vorhanden.")
+    else:
+        if pending is not None:
+            print(f"Hinweis: Ein abgebrochener Batch ({pending.completed}/{pending.requested}) wird verworfen; "
+                  "mit --resume ließe er sich fortsetzen.", file=sys.stderr)
+            pending.close()
+        count = args.count if args.count is not None else ask_for_count()
+        if count is None or count <= 0:
+            return 2
+        url = args.url or IMAGE_URL
+        journal = BatchJournal.start(journal_path, count, url)
+
+    print(f"\nStarte den Download von {journal.remaining} Bildern von {url} "
+          f"({args.workers} Worker, max. {args.rate:g} Anfragen/s)...")
+    started = time.perf_counter()
+    saved = 0
+    try:
+        saved = download_batch(journal, url, args.dir, args.workers, args.rate, args.retries)
+    except KeyboardInterrupt:
+        print(f"Abgebrochen. Fortsetzen mit: python scraper.py --resume --dir {args.dir}", file=sys.stderr)
+        return 130
+    finally:
+        journal.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"\nDownload abgeschlossen. {journal.completed} von {journal.requested} Bildern vorhanden "
+          f"({saved} in {elapsed:.1f} s, {saved / elapsed if elapsed else 0:.1f} Bilder/s).")
+    if journal.remaining:
+        print(f"Download abgebrochen aufgrund eines Fehlers. Fortsetzen mit: python scraper.py --resume --dir {args.dir}")
+        return 1
+    return 0
 
 
 # Dieser Block stellt sicher, dass die main()-Funktion nur ausgeführt wird,
 # wenn das Skript direkt gestartet wird (nicht wenn es als Modul importiert wird).
 if __name__ == "__main__":
-    main()
+    sys.exit(main())